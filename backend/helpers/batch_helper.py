@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import UploadFile
+
+from .doc_helper import get_result
+from .language_helper import get_extractive_summary
+from .ollama_helper import get_nb_tokens
+from .tracing_helper import start_span
+
+logger = logging.getLogger(__name__)
+
+
+# Documents of a batch in each stage at once, the Azure containers and Ollama are shared with interactive users
+BATCH_OCR_CONCURRENCY = int(os.getenv("BATCH_OCR_CONCURRENCY", "4"))
+BATCH_SUMMARY_CONCURRENCY = int(os.getenv("BATCH_SUMMARY_CONCURRENCY", "2"))
+SUMMARY_SENTENCES = 10
+
+
+async def _analyze(
+        index: int,
+        file: UploadFile,
+        summarize: bool,
+        ocr_slots: asyncio.Semaphore,
+        summary_slots: asyncio.Semaphore
+    ) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"index": index, "file_name": file.filename}
+    try:
+        async with ocr_slots:
+            file.file.seek(0)
+            result["text"] = await asyncio.to_thread(get_result, file.file)
+        result["nb_tokens"] = get_nb_tokens(result["text"])
+        if summarize and result["text"]:
+            async with summary_slots:
+                result["summary"] = await asyncio.to_thread(
+                    get_extractive_summary, result["text"], SUMMARY_SENTENCES
+                )
+    except Exception as e:
+        logger.error(f"Failed to analyze {file.filename}: {e}")
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def analyze_documents(files: List[UploadFile], summarize: bool = True) -> AsyncIterator[str]:
+    """
+    Extract, and optionally summarize, every file of a batch concurrently.
+    Each stage is bounded by its own semaphore, so a document can be
+    summarized while the next ones are still in OCR. One NDJSON line is
+    yielded per file as soon as it is done, in completion order, and a
+    failed file is reported on its line without stopping the others.
+    """
+    ocr_slots = asyncio.Semaphore(BATCH_OCR_CONCURRENCY)
+    summary_slots = asyncio.Semaphore(BATCH_SUMMARY_CONCURRENCY)
+    # Not a with block, the generator is resumed in other contexts while it streams
+    batch_span = start_span("batch.analyze", files=len(files), summarize=summarize)
+    tasks = [
+        asyncio.create_task(_analyze(index, file, summarize, ocr_slots, summary_slots))
+        for index, file in enumerate(files)
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield json.dumps(await task) + "\n"
+    finally:
+        # Stops the remaining files when the client went away
+        for task in tasks:
+            task.cancel()
+        batch_span.end()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import threading
+import contextvars
+
+from typing import AsyncIterator, Callable, Dict, Iterator, List
+
+from fastapi import Request
+
+from .metrics_helper import GENERATIONS_CANCELLED
+
+logger = logging.getLogger(__name__)
+
+
+DISCONNECT_POLL_SECONDS = 0.5  # How often a stream waiting for its first token checks the client is still there
+
+_END = object()
+
+
+class CancelRegistry:
+    """
+    Cancellation flags of the generations in flight, keyed by request id.
+    The generating thread checks its flag between tokens, POST /cancel/{request_id}
+    or a client disconnect sets it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: Dict[str, threading.Event] = {}
+
+    def register(self, request_id: str) -> threading.Event:
+        event = threading.Event()
+        with self._lock:
+            # A retried request reuses its id, the previous attempt is stopped
+            previous = self._events.get(request_id)
+            if previous is not None:
+                previous.set()
+            self._events[request_id] = event
+        return event
+
+    def unregister(self, request_id: str, event: threading.Event) -> None:
+        with self._lock:
+            if self._events.get(request_id) is event:
+                del self._events[request_id]
+
+    def cancel(self, request_id: str) -> bool:
+        """Set the flag of a generation in flight, False if it already finished or never existed"""
+        with self._lock:
+            event = self._events.get(request_id)
+        if event is None or event.is_set():
+            return False
+        event.set()
+        GENERATIONS_CANCELLED.inc(reason="request")
+        return True
+
+    def active(self) -> List[str]:
+        with self._lock:
+            return list(self._events)
+
+
+cancel_registry = CancelRegistry()
+
+
+async def stream_until_disconnected(
+        request: Request,
+        produce: Callable[[], Iterator[str]],
+        cancelled: threading.Event
+    ) -> AsyncIterator[str]:
+    """
+    Run the blocking generator in a worker thread and yield its lines as they come.
+
+    The worker checks the cancellation flag before each line, so the generation
+    stops at the next token once the flag is set: by the caller, when the client
+    disconnects or when the response is closed for any other reason.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def put(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            pass  # The event loop is closed, nobody is reading anymore
+
+    def worker() -> None:
+        lines = produce()
+        try:
+            for line in lines:
+                if cancelled.is_set():
+                    break
+                put(line)
+        except Exception as e:
+            put(e)
+        finally:
+            # Stops the generation: closes the Ollama stream and releases the scheduler slot
+            lines.close()
+            put(_END)
+
+    # The worker keeps the trace context of the request
+    loop.run_in_executor(None, contextvars.copy_context().run, worker)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), DISCONNECT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                # Nothing generated yet, the request may be waiting for a scheduler slot
+                if await request.is_disconnected():
+                    GENERATIONS_CANCELLED.inc(reason="disconnect")
+                    return
+                continue
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    except (asyncio.CancelledError, OSError, GeneratorExit):
+        # The response was cancelled or failed to send, the client went away
+        GENERATIONS_CANCELLED.inc(reason="disconnect")
+        raise
+    finally:
+        cancelled.set()
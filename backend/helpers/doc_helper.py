@@ -1,11 +1,32 @@
 # backend/utils.py
 
 import os
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from azure.core.credentials import AzureKeyCredential
-from dotenv import load_dotenv
 
-def get_result(file_content):
+from bisect import bisect_left, bisect_right
+
+from .metrics_helper import OCR_SECONDS
+from .tracing_helper import span
+from .governor_helper import document_intelligence_governor, retry_after_seconds
+
+
+def _observe_response(pipeline_response):
+    """Called by the Azure SDK for every HTTP attempt, its retry policy already waits for Retry-After"""
+    response = pipeline_response.http_response
+    if response.status_code in (429, 503):
+        document_intelligence_governor.on_overload(retry_after_seconds(response.headers))
+
+
+def analyze_document(file_content, model_id="prebuilt-read"):
+    """
+    Run a Document Intelligence model on a document and return the SDK result.
+    file_content is bytes or a binary file, a file is streamed to Azure
+    without being read into memory.
+    """
+    # The Azure SDK takes a few hundred milliseconds to import, only pay for it on the first upload
+    from azure.ai.formrecognizer import DocumentAnalysisClient
+    from azure.core.credentials import AzureKeyCredential
+    from dotenv import load_dotenv
+
     load_dotenv()
     
     endpoint = os.getenv("AZURE_DOCUMENT_ANALYSIS_ENDPOINT")
@@ -14,12 +35,57 @@ def get_result(file_content):
 
     azure_document_intelligence_client = DocumentAnalysisClient(
         endpoint=endpoint, 
-        credential=AzureKeyCredential(key)
+        credential=AzureKeyCredential(key),
+        raw_response_hook=_observe_response
     )
-    poller = azure_document_intelligence_client.begin_analyze_document("prebuilt-read", file_content)
-    result = poller.result()
+    # The slot is held until the analysis is done, the container's capacity is in documents
+    with document_intelligence_governor.slot():
+        with OCR_SECONDS.time(model=model_id), span("azure.document_intelligence.analyze", model=model_id):
+            poller = azure_document_intelligence_client.begin_analyze_document(model_id, file_content)
+            return poller.result()
+
+
+def get_result(file_content):
+    """Extract the paragraphs of a document with the read model"""
+    return "\n".join(get_paragraphs(analyze_document(file_content, "prebuilt-read")))
+
 
-    return "\n".join(get_paragraphs(result))
+def get_layout(file_content):
+    """
+    Extract a document with the layout model as JSON: its pages with their
+    lines and words, its tables as rows and its handwriting flags. The text
+    is in reading order with each table rendered row by row where it appears,
+    paragraphs holds the text outside the tables so the tables can be
+    chunked on their own.
+    """
+    result = analyze_document(file_content, "prebuilt-layout")
+    with span("doc_helper.layout", pages=len(result.pages)):
+        handwritten = SpanIndex(
+            span for style in (result.styles or []) if style.is_handwritten for span in style.spans
+        )
+        tables = [get_table(index, table) for index, table in enumerate(result.tables or [])]
+        table_spans = SpanIndex(span for table in (result.tables or []) for span in table.spans)
+
+        # Paragraphs and tables interleaved by their position in the document
+        blocks = [
+            (paragraph.spans[0].offset if paragraph.spans else 0, paragraph.content)
+            for paragraph in (result.paragraphs or [])
+            if not any(table_spans.covers(span) for span in paragraph.spans)
+        ]
+        paragraphs = [content for _, content in blocks]
+        blocks.extend(
+            (table.spans[0].offset if table.spans else 0, tables[index]["text"])
+            for index, table in enumerate(result.tables or [])
+        )
+        blocks.sort(key=lambda block: block[0])
+
+        return {
+            "text": "\n".join(content for _, content in blocks),
+            "paragraphs": paragraphs,
+            "tables": tables,
+            "pages": [get_page(page, handwritten) for page in result.pages],
+            "handwritten": has_handwritten_content(result),
+        }
 
 
 def get_paragraphs(result):
@@ -38,12 +104,110 @@ def _in_span(word, spans):
     return False
 
 
-def get_words(page, line):
-    result = []
-    for word in page.words:
-        if _in_span(word, line.spans):
-            result.append(word)
-    return result
+class WordIndex:
+    """
+    Words of a page sorted by offset. The words of a span are found by
+    bisecting to its first word, so mapping all the lines of a page costs
+    O((lines + words) log words) instead of scanning every word per line.
+    """
+
+    def __init__(self, words):
+        self.words = sorted(words, key=lambda word: word.span.offset)
+        self.offsets = [word.span.offset for word in self.words]
+
+    def words_in(self, spans):
+        result = []
+        for span in spans:
+            end = span.offset + span.length
+            for i in range(bisect_left(self.offsets, span.offset), len(self.words)):
+                word = self.words[i]
+                if word.span.offset >= end:
+                    break
+                if word.span.offset + word.span.length <= end:
+                    result.append(word)
+        return result
+
+
+class SpanIndex:
+    """Disjoint spans sorted by offset, answers whether a span lies within one of them"""
+
+    def __init__(self, spans):
+        self.spans = sorted(((span.offset, span.offset + span.length) for span in spans))
+        self.offsets = [start for start, _ in self.spans]
+
+    def covers(self, span):
+        i = bisect_right(self.offsets, span.offset) - 1
+        return i >= 0 and span.offset + span.length <= self.spans[i][1]
+
+    def overlaps(self, spans):
+        for span in spans:
+            i = bisect_right(self.offsets, span.offset + span.length - 1) - 1
+            if i >= 0 and self.spans[i][1] > span.offset:
+                return True
+        return False
+
+
+def get_words(page, line, index=None):
+    """Words of a line, pass the page's WordIndex when mapping several lines"""
+    return (index or WordIndex(page.words)).words_in(line.spans)
+
+
+def _polygon(polygon):
+    return [[point.x, point.y] for point in polygon or []]
+
+
+def get_page(page, handwritten=None):
+    """A page as JSON, each line with its words and whether it is handwritten"""
+    index = WordIndex(page.words or [])
+    return {
+        "page_number": page.page_number,
+        "width": page.width,
+        "height": page.height,
+        "unit": page.unit,
+        "lines": [
+            {
+                "content": line.content,
+                "polygon": _polygon(line.polygon),
+                "handwritten": bool(handwritten and handwritten.overlaps(line.spans)),
+                "words": [
+                    {"content": word.content, "confidence": word.confidence}
+                    for word in index.words_in(line.spans)
+                ],
+            }
+            for line in (page.lines or [])
+        ],
+        "selection_marks": [
+            {"state": mark.state, "confidence": mark.confidence, "polygon": _polygon(mark.polygon)}
+            for mark in (page.selection_marks or [])
+        ],
+    }
+
+
+def table_rows(table):
+    """Cell contents as a row_count x column_count grid, a merged cell fills its first position"""
+    rows = [["" for _ in range(table.column_count)] for _ in range(table.row_count)]
+    for cell in table.cells:
+        rows[cell.row_index][cell.column_index] = cell.content
+    return rows
+
+
+def table_text(rows):
+    """One line per row, the cells separated by pipes"""
+    return "\n".join(" | ".join(cell.replace("\n", " ") for cell in row) for row in rows)
+
+
+def get_table(table_idx, table):
+    rows = table_rows(table)
+    header_rows = sorted({cell.row_index for cell in table.cells if cell.kind == "columnHeader"})
+    return {
+        "index": table_idx,
+        "row_count": table.row_count,
+        "column_count": table.column_count,
+        "header_rows": header_rows,
+        "page_numbers": sorted({region.page_number for region in (table.bounding_regions or [])}),
+        "rows": rows,
+        "text": table_text(rows),
+    }
 
 
 def has_handwritten_content(result):
@@ -64,8 +228,9 @@ def analyze_page_layout(page):
 def analyze_lines(page):
     lines_info = []
     if page.lines:
+        index = WordIndex(page.words)
         for line_idx, line in enumerate(page.lines):
-            words = get_words(page, line)
+            words = get_words(page, line, index)
             lines_info.append(
                 f"\n- Line # {line_idx} has word count {len(words)} and text '{line.content}' "
                 f"within bounding polygon '{line.polygon}'"
@@ -89,8 +254,9 @@ def analyze_page(page):
     ]
 
     if page.lines:
+        index = WordIndex(page.words)
         for line_idx, line in enumerate(page.lines):
-            words = get_words(page, line)
+            words = get_words(page, line, index)
             page_analysis.append(
                 f"...Line # {line_idx} has word count {len(words)} and text '{line.content}' "
                 f"within bounding polygon '{line.polygon}'"
@@ -129,4 +295,4 @@ def analyze_table(table_idx, table):
                     f"...content on page {region.page_number} is within bounding polygon '{region.polygon}'"
                 )
 
-    return "\n.join(table_analysis)"
\ No newline at end of file
+    return "\n".join(table_analysis)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .ollama_helper import EMBEDDING_MODEL, get_keep_alive
+from .scheduler_helper import ollama_scheduler, Priority
+from .metrics_helper import EMBEDDING_SECONDS, EMBEDDING_BATCH_SIZE
+from .tracing_helper import span, start_span, get_trace_context
+
+logger = logging.getLogger(__name__)
+
+
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))  # How long to wait for more texts
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))  # Texts sent in one embed call
+
+
+def _ollama_embed(model_name: str, texts: List[str]) -> List[List[float]]:
+    import ollama
+
+    with ollama_scheduler.slot(model_name, Priority.EMBEDDING):
+        response = ollama.embed(model=model_name, input=texts, keep_alive=get_keep_alive())
+    return response["embeddings"]
+
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests from concurrent callers and sends them to Ollama
+    as a single batched call, then hands each vector back to the waiting caller.
+
+    A batch is flushed when it reaches max_batch_size texts or when window_ms
+    have passed since its first text arrived, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        window_ms: float = EMBED_BATCH_WINDOW_MS,
+        max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+        embed_fn: Callable[[str, List[str]], List[List[float]]] = _ollama_embed
+    ):
+        self.model_name = model_name
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.embed_fn = embed_fn
+        # (text, future, trace context of the caller)
+        self._pending: "queue.Queue[Tuple[str, Future, Optional[tuple]]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"embed-{model_name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str]) -> List[Future]:
+        futures = []
+        trace_context = get_trace_context()
+        for text in texts:
+            future = Future()
+            self._pending.put((text, future, trace_context))
+            futures.append(future)
+        return futures
+
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """Embed the texts, blocking until every vector is available"""
+        return [future.result(timeout=timeout) for future in self.submit(texts)]
+
+    def _collect(self) -> List[Tuple[str, Future, Optional[tuple]]]:
+        batch = [self._pending.get()]
+        end = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = end - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._pending.get(timeout=remaining))
+                else:
+                    # The window is over, only take what is already waiting
+                    batch.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [text for text, _, _ in batch]
+            EMBEDDING_BATCH_SIZE.observe(len(texts))
+            # The batch runs outside the callers' context, so each caller's trace gets its own span
+            spans = [
+                start_span("ollama.embed", parent=context, model=self.model_name, batch_size=len(texts))
+                for context in {context for _, _, context in batch if context}
+            ]
+            error = None
+            try:
+                with EMBEDDING_SECONDS.time():
+                    embeddings = self.embed_fn(self.model_name, texts)
+                if len(embeddings) != len(texts):
+                    # zip would leave the callers without a vector waiting forever
+                    raise ValueError(f"Got {len(embeddings)} embeddings for {len(texts)} texts")
+                for (_, future, _), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                error = e
+                logger.error(f"Embedding batch of {len(texts)} texts failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for batch_span in spans:
+                    batch_span.end(error)
+
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(model_name: str = EMBEDDING_MODEL) -> EmbeddingBatcher:
+    with _batchers_lock:
+        if model_name not in _batchers:
+            _batchers[model_name] = EmbeddingBatcher(model_name)
+        return _batchers[model_name]
+
+
+def get_embeddings(texts: List[str], model_name: Optional[str] = None) -> List[List[float]]:
+    with span("embedding.wait", texts=len(texts)):
+        return get_embedding_batcher(model_name or EMBEDDING_MODEL).embed(texts)
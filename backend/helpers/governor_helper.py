@@ -0,0 +1,175 @@
+import os
+import time
+import random
+import logging
+import threading
+
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+from .metrics_helper import AZURE_CONCURRENCY_LIMIT, AZURE_QUEUE_DEPTH, AZURE_OVERLOADS
+
+logger = logging.getLogger(__name__)
+
+
+# Requests in flight per container, the limit moves between the min and the max
+DOCUMENT_INTELLIGENCE_MAX_CONCURRENCY = int(os.getenv("DOCUMENT_INTELLIGENCE_MAX_CONCURRENCY", "8"))
+LANGUAGE_MAX_CONCURRENCY = int(os.getenv("LANGUAGE_MAX_CONCURRENCY", "8"))
+AZURE_MIN_CONCURRENCY = int(os.getenv("AZURE_MIN_CONCURRENCY", "1"))
+DECREASE_FACTOR = 0.5  # Multiplicative decrease of the limit on overload
+DEFAULT_RETRY_AFTER = 1.0  # Seconds, when a 429 or 503 does not say how long to wait
+MAX_RETRY_AFTER = 30.0  # Upper bound on a Retry-After wait
+BACKOFF_BASE = 0.5  # Seconds, first backoff of a retried poll, doubled on each attempt
+
+
+def retry_after_seconds(headers: Mapping[str, str], default: float = DEFAULT_RETRY_AFTER) -> float:
+    """Delay asked by the server in retry-after-ms or Retry-After (seconds or HTTP date)"""
+    if headers.get("retry-after-ms"):
+        try:
+            return min(float(headers["retry-after-ms"]) / 1000, MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    value = headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return min(float(value), MAX_RETRY_AFTER)
+    except ValueError:
+        pass
+    try:
+        return min(max(0.0, parsedate_to_datetime(value).timestamp() - time.time()), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return default
+
+
+def jittered(seconds: float, spread: float = 0.2) -> float:
+    """seconds +/- spread, so clients started together do not stay in step"""
+    return seconds * random.uniform(1 - spread, 1 + spread)
+
+
+def backoff(attempt: int, base: float = BACKOFF_BASE, cap: float = MAX_RETRY_AFTER) -> float:
+    """Exponential backoff with full jitter for the attempt-th retry, starting at 0"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ConcurrencyGovernor:
+    """
+    Client-side AIMD limit on the requests in flight to one container.
+
+    Work over the limit waits in a FIFO queue. The limit grows by one after
+    a limit's worth of successes while it is the bottleneck (additive increase),
+    and is halved when the container answers 429 or 503 (multiplicative
+    decrease). A Retry-After also holds back new requests until it expires,
+    so throughput follows the container's capacity instead of overloading it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        min_limit: int = AZURE_MIN_CONCURRENCY,
+        initial_limit: Optional[int] = None,
+        decrease_factor: float = DECREASE_FACTOR
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.decrease_factor = decrease_factor
+        self._limit = float(initial_limit or max(self.min_limit, self.max_limit // 2))
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queue = 0
+        self._next_ticket = 0
+        self._serving = 0  # Lowest ticket not admitted yet, serves the queue in order
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._overloads = 0
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _publish(self) -> None:
+        AZURE_CONCURRENCY_LIMIT.set(self.limit, container=self.name)
+        AZURE_QUEUE_DEPTH.set(self._queue, container=self.name)
+
+    def acquire(self) -> bool:
+        """Wait for a slot, returns True when the limit was the bottleneck"""
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._queue += 1
+            self._publish()
+            saturated = False
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if ticket == self._serving and self._in_flight < self.limit and pause <= 0:
+                    break
+                saturated = True
+                self._cond.wait(timeout=pause if pause > 0 else None)
+            self._serving += 1
+            self._queue -= 1
+            self._in_flight += 1
+            self._publish()
+            self._cond.notify_all()
+            return saturated or self._in_flight >= self.limit
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the container's slots, successes grow the limit"""
+        saturated = self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+        if saturated:
+            self.on_success()
+
+    def on_success(self) -> None:
+        with self._cond:
+            if self._limit < self.max_limit:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._publish()
+                self._cond.notify_all()
+
+    def on_overload(self, retry_after: float = DEFAULT_RETRY_AFTER) -> None:
+        """The container refused a request: halve the limit and pause until Retry-After"""
+        now = time.monotonic()
+        with self._cond:
+            self._overloads += 1
+            self._paused_until = max(self._paused_until, now + retry_after)
+            # The requests in flight when it happened see the same overload, decrease once per episode
+            if now - self._last_decrease > retry_after:
+                self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                self._last_decrease = now
+                logger.warning(f"{self.name} overloaded, concurrency limit lowered to {self.limit}")
+            self._publish()
+        AZURE_OVERLOADS.inc(container=self.name)
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self._in_flight,
+                "queued": self._queue,
+                "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                "overloads": self._overloads,
+            }
+
+
+document_intelligence_governor = ConcurrencyGovernor("document_intelligence", DOCUMENT_INTELLIGENCE_MAX_CONCURRENCY)
+language_governor = ConcurrencyGovernor("language", LANGUAGE_MAX_CONCURRENCY)
+GOVERNORS = {governor.name: governor for governor in (document_intelligence_governor, language_governor)}
+
+
+def get_governors_snapshot() -> Dict[str, Dict]:
+    return {name: governor.snapshot() for name, governor in GOVERNORS.items()}
@@ -6,20 +6,28 @@ import requests
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 
+from .metrics_helper import LANGUAGE_JOB_QUEUE_SECONDS, LANGUAGE_JOB_POLL_SECONDS, SUMMARIZATION_SECONDS
+from .tracing_helper import span
+from .governor_helper import language_governor, retry_after_seconds, jittered, backoff
+
 
 load_dotenv()
 API_ENDPOINT = os.environ.get('LANGUAGE_ENDPOINT')
 API_KEY = os.environ.get('LANGUAGE_KEY')
+POLL_INTERVAL = 2  # Seconds between job status checks
+MAX_ATTEMPTS = 5  # Per submit or poll request refused by the container
 
 
 def get_extractive_summary(document, num_sentences):
-    response = start_analyze_text_job(document, num_sentences)
-    job_id = parse_http_header(response.headers, response.status_code)
-    if job_id:
-        job_result = fetch_job_result(job_id)
-        return extract_paragraph_from_result(job_result)
-    else:
-        raise Exception("Failed to retrieve job ID")
+    # The slot is held until the job is done, the container's capacity is in jobs
+    with SUMMARIZATION_SECONDS.time(kind="extractive"), language_governor.slot():
+        response = start_analyze_text_job(document, num_sentences)
+        job_id = parse_http_header(response.headers, response.status_code)
+        if job_id:
+            job_result = fetch_job_result(job_id)
+            return extract_paragraph_from_result(job_result)
+        else:
+            raise Exception("Failed to retrieve job ID")
     
 
 def extract_job_id(operation_location):
@@ -34,8 +42,30 @@ def get_analyze_text_job(job_id):
         "Content-Type": "application/json",
         "Ocp-Apim-Subscription-Key": API_KEY
     }
-    response = requests.get(url, headers=headers)
-    return response.json()
+    with span("azure.language.poll", job_id=job_id) as poll:
+        # Polling is idempotent, transient failures are retried with jittered backoff
+        for attempt in range(MAX_ATTEMPTS):
+            delay = backoff(attempt)
+            try:
+                response = requests.get(url, headers=headers)
+            except requests.RequestException as e:
+                error = e
+            else:
+                if response.ok:
+                    job_result = response.json()
+                    poll.set_attribute("status", job_result.get('status'))
+                    poll.set_attribute("attempts", attempt + 1)
+                    return job_result
+                error = Exception(f"Job status request failed with HTTP {response.status_code}")
+                if response.status_code in (429, 503):
+                    retry_after = retry_after_seconds(response.headers)
+                    language_governor.on_overload(retry_after)
+                    delay = max(delay, jittered(retry_after))
+                elif response.status_code < 500:
+                    raise error
+            if attempt < MAX_ATTEMPTS - 1:
+                time.sleep(delay)
+        raise error
 
 
 def parse_http_header(headers, status_code):
@@ -46,14 +76,26 @@ def parse_http_header(headers, status_code):
 
 
 def fetch_job_result(job_id):
+    with span("azure.language.fetch_job_result", job_id=job_id):
+        return _poll_job_result(job_id)
+
+
+def _poll_job_result(job_id):
+    start = time.perf_counter()
+    queued = True
     while True:
         job_result = get_analyze_text_job(job_id)
         status = job_result.get('status')
+        if queued and status != 'notStarted':
+            # The job left the container's queue
+            LANGUAGE_JOB_QUEUE_SECONDS.observe(time.perf_counter() - start)
+            queued = False
         if status == 'succeeded':
+            LANGUAGE_JOB_POLL_SECONDS.observe(time.perf_counter() - start)
             return job_result
         elif status in ['failed', 'cancelled']:
             raise Exception(f"Job {status}")
-        time.sleep(2)
+        time.sleep(jittered(POLL_INTERVAL))
 
 
 def extract_paragraph_from_result(job_result):
@@ -93,5 +135,16 @@ def start_analyze_text_job(document, num_sentences):
             }
         ]
     }
-    response = requests.post(url, headers=headers, json=data)
+    with span("azure.language.submit", characters=len(document)) as submit:
+        # A refused job was not created, submitting it again is safe
+        for attempt in range(MAX_ATTEMPTS):
+            response = requests.post(url, headers=headers, json=data)
+            if response.status_code not in (429, 503):
+                break
+            retry_after = retry_after_seconds(response.headers)
+            language_governor.on_overload(retry_after)
+            if attempt < MAX_ATTEMPTS - 1:
+                time.sleep(jittered(retry_after))
+        submit.set_attribute("http.status_code", response.status_code)
+        submit.set_attribute("attempts", attempt + 1)
     return response
@@ -0,0 +1,195 @@
+import time
+import bisect
+import threading
+
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from starlette.routing import Match
+
+# Buckets in seconds, from sub-millisecond vector queries to multi-minute OCR jobs
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 100, 200)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    bucket_labels = _format_labels(key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+_registry: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# Pipeline stages
+OCR_SECONDS = Histogram("knowledge_ocr_seconds", "Document Intelligence analysis time for /analyze/")
+LANGUAGE_JOB_QUEUE_SECONDS = Histogram(
+    "knowledge_language_job_queue_seconds", "Time a Language job waited before it started running"
+)
+LANGUAGE_JOB_POLL_SECONDS = Histogram(
+    "knowledge_language_job_poll_seconds", "Time spent polling a Language job until it completed"
+)
+SUMMARIZATION_SECONDS = Histogram("knowledge_summarization_seconds", "End-to-end summarization time")
+EMBEDDING_SECONDS = Histogram("knowledge_embedding_seconds", "Duration of one batched embedding call")
+EMBEDDING_BATCH_SIZE = Histogram(
+    "knowledge_embedding_batch_size", "Number of texts per batched embedding call", SIZE_BUCKETS
+)
+VECTOR_QUERY_SECONDS = Histogram(
+    "knowledge_vector_query_seconds", "Vector store retrieval time reported by the frontend"
+)
+TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "knowledge_time_to_first_token_seconds", "Time until the first generated token"
+)
+TOKENS_PER_SECOND = Histogram(
+    "knowledge_tokens_per_second", "Generation speed reported by Ollama", THROUGHPUT_BUCKETS
+)
+
+# Events
+CACHE_HITS = Counter("knowledge_cache_hits_total", "Cache hits")
+CACHE_MISSES = Counter("knowledge_cache_misses_total", "Cache misses")
+RETRIES = Counter("knowledge_retries_total", "Retried model operations")
+MODEL_FALLBACKS = Counter("knowledge_model_fallbacks_total", "Switches to a fallback model")
+GENERATIONS_CANCELLED = Counter("knowledge_generations_cancelled_total", "Generations stopped before the end")
+AZURE_OVERLOADS = Counter("knowledge_azure_overloads_total", "Requests refused by an Azure container (429 or 503)")
+
+# Load
+IN_FLIGHT_REQUESTS = Gauge("knowledge_in_flight_requests", "Requests currently being served")
+AZURE_CONCURRENCY_LIMIT = Gauge("knowledge_azure_concurrency_limit", "Requests allowed in flight per Azure container")
+AZURE_QUEUE_DEPTH = Gauge("knowledge_azure_queue_depth", "Requests waiting for an Azure container slot")
+DOCUMENT_STORE_BYTES = Gauge("knowledge_document_store_bytes", "Text held by the server-side document store")
+
+
+def endpoint_label(scope) -> str:
+    """
+    The route template of the request, like /cancel/{request_id}, so ids in the
+    path do not explode the label set. Paths matching no route share "other".
+    """
+    for route in getattr(scope.get("app"), "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "other"
+
+
+class InFlightMiddleware:
+    """
+    Pure ASGI middleware tracking in-flight requests per endpoint.
+    Unlike BaseHTTPMiddleware it does not buffer streaming responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = endpoint_label(scope)
+        IN_FLIGHT_REQUESTS.inc(endpoint=endpoint)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            IN_FLIGHT_REQUESTS.dec(endpoint=endpoint)
@@ -1,11 +1,20 @@
+import os
 import re
-import ollama
+import json
 import time
 import logging
 
-from typing import List, Any, Tuple, Optional, Generator, Dict
+from typing import TYPE_CHECKING, List, Any, Tuple, Optional, Generator, Dict
 from collections.abc import Iterator
-from ollama._types import ChatResponse
+
+if TYPE_CHECKING:
+    from ollama._types import ChatResponse
+
+from .metrics_helper import CACHE_HITS, CACHE_MISSES, RETRIES, MODEL_FALLBACKS
+from .metrics_helper import TIME_TO_FIRST_TOKEN_SECONDS, TOKENS_PER_SECOND
+from .tracing_helper import span, start_span
+from .options_helper import options_planner, KV_BYTES_PER_TOKEN
+from .system_helper import get_memory_info
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,15 +22,53 @@ logger = logging.getLogger(__name__)
 
 
 EMBEDDING_MODEL = "nomic-embed-text:latest"
-# Fallback models in order of preference (smaller models first for memory efficiency)
-PREFERRED_MODELS = ["llama3.2:1b", "gemma2:2b", "phi3:latest"]
 EXCLUDED_MODELS = {EMBEDDING_MODEL} 
+# Model selection, the largest model that fits in the available memory with this share left free
+MEMORY_HEADROOM = float(os.getenv("OLLAMA_MEMORY_HEADROOM", "0.2"))
+RUNNER_OVERHEAD_BYTES = 256 * 1024 ** 2  # Compute buffers and runner process of a loaded model
+MODEL_LIST_TTL = 60  # Seconds the footprints from ollama.list() are reused
+# Bits per weight of the GGUF quantizations, for models whose file size is not reported
+BITS_PER_WEIGHT = {
+    "F32": 32, "F16": 16, "BF16": 16, "Q8_0": 8.5, "Q6_K": 6.56, "Q5_K_M": 5.69, "Q5_0": 5.5,
+    "Q4_K_M": 4.85, "Q4_K_S": 4.58, "Q4_0": 4.55, "Q3_K_M": 3.91, "Q2_K": 3.35,
+}
 # Text Processing
 SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " ", ""]
 # Model Configuration
 TOKEN_THRESHOLD = 2500  # For deciding when to use map-reduce summarization
+QUESTIONS_NUM_PREDICT = 192  # Three questions and the JSON around them, about 50 tokens each
+SUMMARY_NUM_PREDICT = 300  # Output length of each partial and of the final summary
+ANSWER_NUM_PREDICT = 1000  # Longest answer, shortened when the context leaves less room
 MAX_RETRIES = 3  # Number of retries for model operations
 RETRY_DELAY = 1  # Delay between retries in seconds
+# Warm-up Configuration
+GENERATION_MODEL = os.getenv("OLLAMA_GENERATION_MODEL")  # Falls back to the best available model
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # How long Ollama keeps models loaded
+OLLAMA_PIN_MODELS = os.getenv("OLLAMA_PIN_MODELS", "false").lower() == "true"  # Never unload models
+
+QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {"type": "array", "items": {"type": "string"}, "minItems": 3, "maxItems": 3}
+    },
+    "required": ["questions"]
+}
+_JSON_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+_footprints: Dict[str, Any] = {"expires": 0.0, "models": {}}
+
+
+def get_keep_alive():
+    """
+    Returns the keep_alive value sent with every Ollama request.
+    Ollama resets a model's expiry on each request, so the same value has to be
+    passed everywhere, otherwise a pinned model would be unpinned by the next call.
+    """
+    if OLLAMA_PIN_MODELS:
+        return -1
+    if OLLAMA_KEEP_ALIVE.lstrip('-').isdigit():
+        return int(OLLAMA_KEEP_ALIVE)
+    return OLLAMA_KEEP_ALIVE
 
 
 def get_nb_tokens(text: str) -> int:
@@ -38,7 +85,14 @@ def get_nb_tokens(text: str) -> int:
     special_chars = len(re.findall(r'[@#$%^&*()<>{}\[\]~`_\-+=|\\]', text))
     numbers = len(re.findall(r'\d+', text))
 
-    return str(len(words) + punctuation + special_chars + numbers)
+    return len(words) + punctuation + special_chars + numbers
+
+
+def plan_options(model_name: str, operation: str, messages: List[Dict[str, str]], max_predict: int) -> Dict[str, int]:
+    """num_ctx, num_predict, num_batch and num_thread sized for these messages on this host"""
+    prompt_tokens = sum(get_nb_tokens(message['content']) for message in messages)
+    prompt_chars = sum(len(message['content']) for message in messages)
+    return options_planner.plan(model_name, operation, prompt_tokens, max_predict, prompt_chars)
 
 
 def get_available_models() -> List[str]:
@@ -49,6 +103,8 @@ def get_available_models() -> List[str]:
     the EXCLUDED_MODELS set from our configuration. This combines efficiency
     (filtering during extraction) with maintainability (centralized configuration).
     """
+    import ollama
+
     try:
         items: List[Tuple[str, Any]] = ollama.list()
 
@@ -67,29 +123,108 @@ def get_available_models() -> List[str]:
         return []
 
 
-def get_best_available_model() -> Optional[str]:
+def parse_parameter_size(value: Optional[str]) -> Optional[float]:
+    """Parameter count from the "3.8B" or "137M" of the model details"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMBT]?)\s*', value or '', re.IGNORECASE)
+    if not match:
+        return None
+    return float(match.group(1)) * {'': 1, 'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}[match.group(2).upper()]
+
+
+def get_model_footprints() -> Dict[str, Dict[str, Any]]:
+    """
+    Parameter count, quantization and weight size of the generation models,
+    from the details of ollama.list(), ollama.show() for the ones it lacks.
     """
-    Get the best available model for text generation, prioritizing smaller models
-    for better memory efficiency in resource-constrained environments.
+    import ollama
+
+    now = time.monotonic()
+    if now < _footprints["expires"]:
+        CACHE_HITS.inc(cache="model_list")
+        return _footprints["models"]
+    CACHE_MISSES.inc(cache="model_list")
+
+    footprints = {}
+    for model in ollama.list().models:
+        if model.model in EXCLUDED_MODELS:
+            continue
+        details = model.details
+        if details is None or not details.parameter_size:
+            details = ollama.show(model.model).details
+        parameters = parse_parameter_size(details.parameter_size if details else None)
+        quantization = (details.quantization_level if details else None) or ""
+        weights = model.size
+        if not weights and parameters:
+            weights = int(parameters * BITS_PER_WEIGHT.get(quantization.upper(), 16) / 8)
+        footprints[model.model] = {
+            "parameters": parameters,
+            "quantization": quantization,
+            "weights_bytes": weights or 0,
+        }
+    _footprints.update(expires=now + MODEL_LIST_TTL, models=footprints)
+    return footprints
+
+
+def get_loaded_models() -> Dict[str, int]:
+    """Models Ollama holds in memory, with their size KV cache included"""
+    import ollama
+
+    return {model.model: model.size for model in ollama.ps().models}
+
+
+def required_memory(footprint: Dict[str, Any], model_name: str) -> int:
+    """Memory a model takes once loaded: its weights, the KV cache of its context and the runner"""
+    num_ctx = options_planner.runner_options(model_name)["num_ctx"]
+    return footprint["weights_bytes"] + num_ctx * KV_BYTES_PER_TOKEN + RUNNER_OVERHEAD_BYTES
+
+
+def get_best_available_model(exclude: Tuple[str, ...] = ()) -> Optional[str]:
+    """
+    Get the best available model for text generation: a model already loaded
+    by Ollama if there is one, otherwise the largest model that fits in the
+    available memory with MEMORY_HEADROOM left free, from the model details,
+    without loading anything. When none fits, the smallest one.
+    
+    Args:
+        exclude: Models to leave out, like one that just failed to load
     
     Returns:
         The name of the best available model, or None if no models are available
     """
     try:
-        available_models = get_available_models()
-        if not available_models:
+        footprints = {name: f for name, f in get_model_footprints().items() if name not in exclude}
+        if not footprints:
             logger.warning("No models available")
             return None
-            
-        # Check for preferred models in order of preference (smallest first)
-        for preferred_model in PREFERRED_MODELS:
-            if preferred_model in available_models:
-                logger.info(f"Using preferred model: {preferred_model}")
-                return preferred_model
-        
-        # If no preferred models are available, use the first available model
-        model = available_models[0]
-        logger.info(f"Using fallback model: {model}")
+
+        def largest(names):
+            return max(names, key=lambda name: (footprints[name]["parameters"] or 0, footprints[name]["weights_bytes"]))
+
+        # A resident model answers right away and takes no more memory
+        loaded = [name for name in get_loaded_models() if name in footprints]
+        if loaded:
+            model = largest(loaded)
+            logger.info(f"Using model {model}, already loaded")
+            return model
+
+        smallest = min(footprints, key=lambda name: footprints[name]["weights_bytes"])
+        memory = get_memory_info()
+        if memory is None:
+            logger.info(f"Using model {smallest}, the smallest, the available memory is unknown")
+            return smallest
+
+        budget = memory["available"] * (1 - MEMORY_HEADROOM)
+        fitting = [name for name, footprint in footprints.items() if required_memory(footprint, name) <= budget]
+        if not fitting:
+            logger.warning(
+                f"No model fits in {memory['available'] / 1024 ** 3:.1f} GB available, using the smallest: {smallest}"
+            )
+            return smallest
+        model = largest(fitting)
+        logger.info(
+            f"Using model {model}, {required_memory(footprints[model], model) / 1024 ** 3:.1f} GB of "
+            f"{memory['available'] / 1024 ** 3:.1f} GB available"
+        )
         return model
         
     except Exception as e:
@@ -99,30 +234,61 @@ def get_best_available_model() -> Optional[str]:
 
 def test_model_memory(model_name: str) -> bool:
     """
-    Test if a model can be loaded and used without memory issues.
+    Check, without loading it, that a model is loaded or fits in the available memory.
     
     Args:
-        model_name: Name of the model to test
+        model_name: Name of the model to check
         
     Returns:
-        True if the model works, False if there are memory issues
+        True if the model can be used, False if it would not fit
     """
     try:
-        # Simple test with minimal prompt
-        response = ollama.chat(
+        if model_name in get_loaded_models():
+            return True
+        footprint = get_model_footprints().get(model_name)
+        memory = get_memory_info()
+    except Exception as e:
+        # Ollama tells for itself when it cannot load the model
+        logger.warning(f"Could not check the memory needed by {model_name}: {e}")
+        return True
+    if footprint is None or memory is None:
+        return True
+    needed = required_memory(footprint, model_name)
+    if needed > memory["available"]:
+        logger.warning(
+            f"Model {model_name} needs {needed / 1024 ** 3:.1f} GB, "
+            f"{memory['available'] / 1024 ** 3:.1f} GB available"
+        )
+        return False
+    return True
+
+
+def preload_model(model_name: str) -> None:
+    """
+    Load a generation model into memory without generating anything.
+    Ollama loads the model when it receives a request with an empty prompt.
+    """
+    import ollama
+
+    with span("ollama.preload", model=model_name):
+        ollama.generate(
             model=model_name,
-            messages=[{'role': 'user', 'content': 'Hi'}],
-            options={'num_predict': 1}  # Limit to 1 token to minimize memory usage
+            prompt="",
+            # Ollama reloads a model requested with other context, batch or thread settings
+            options=options_planner.runner_options(model_name),
+            keep_alive=get_keep_alive()
         )
-        return True
-    except Exception as e:
-        error_msg = str(e).lower()
-        if 'memory' in error_msg or 'gpu' in error_msg or 'unable to load' in error_msg:
-            logger.warning(f"Model {model_name} has memory issues: {e}")
-            return False
-        # Re-raise other types of errors
-        raise e
-    
+
+
+def preload_embedding_model(model_name: str = EMBEDDING_MODEL) -> None:
+    """
+    Load the embedding model into memory so the first upload does not pay for it.
+    """
+    import ollama
+
+    with span("ollama.preload", model=model_name):
+        ollama.embed(model=model_name, input="warm-up", keep_alive=get_keep_alive())
+
 
 def split_text(text: str, chunk_size: int = 2000) -> List[str]:
         """
@@ -158,11 +324,50 @@ def split_text(text: str, chunk_size: int = 2000) -> List[str]:
         return chunks
 
 
+def parse_questions(content: str) -> List[str]:
+    """
+    Questions complete so far in the partial JSON output {"questions": ["...", "...
+    A question is only returned once its closing quote has been generated.
+    """
+    start = content.find('[')
+    if start == -1:
+        return []
+    questions = [json.loads(f'"{match}"').strip() for match in _JSON_STRING.findall(content, start)]
+    return [question for question in questions if question]
+
+
+def build_questions_messages(summary: str) -> List[Dict[str, str]]:
+    """
+    Builds the chat messages asking for three questions about the summarized document.
+    """
+    return [{
+        'role': 'user',
+        'content': f"""Based on this document, create three specific and insightful questions
+            that can be answered.
+
+            ---
+
+            Summary: {summary}
+
+            Requirements:
+            - Generate exactly three questions
+            - Questions should require detailed answers from the full text provided
+            - Focus on the most important aspects of the document
+            - Make questions specific rather than general
+            - The questions are supposed to be different from each other
+
+            Answer in JSON with a "questions" array."""
+    }]
+
+
 def generate_questions(model_name: str, summary: str) -> List[str]:
     """
     Generates insightful questions based on the document summary.
     Returns exactly three questions that can be answered using the full document.
     """
+    import ollama
+
+    operation = "generate_questions"
     # Use fallback model if the provided model is None or has issues
     if not model_name:
         model_name = get_best_available_model()
@@ -174,61 +379,48 @@ def generate_questions(model_name: str, summary: str) -> List[str]:
             # Test model memory first
             if not test_model_memory(model_name):
                 logger.warning(f"Model {model_name} failed memory test, trying fallback")
-                model_name = get_best_available_model()
+                MODEL_FALLBACKS.inc(operation=operation)
+                model_name = get_best_available_model(exclude=(model_name,))
                 if not model_name:
                     raise Exception("No suitable model available after memory test")
                 continue
                     
-            prompt = f"""Based on this document, create three specific and insightful questions
-            that can be answered.
-
-            ---
-
-            Summary: {summary}
-
-            Requirements:
-            - Generate exactly three questions
-            - Questions should require detailed answers from the full text provided
-            - Focus on the most important aspects of the document
-            - Make questions specific rather than general
-            - The questions are supposed to be different from each other
-
-            Questions:"""
+            messages = build_questions_messages(summary)
 
-            response = ollama.chat(
+            start = time.perf_counter()
+            stream = ollama.chat(
                 model=model_name,
-                messages=[{'role': 'user', 'content': prompt}],
+                messages=messages,
+                stream=True,
+                format=QUESTIONS_SCHEMA,  # Constrained decoding, the output is always parseable
                 options={
-                    'num_predict': 500,  # Limit output length to save memory
+                    **plan_options(model_name, operation, messages, QUESTIONS_NUM_PREDICT),
                     'temperature': 0.7,   # Balanced creativity
                     'top_p': 0.9         # Focus on most likely tokens
-                }
+                },
+                keep_alive=get_keep_alive()
             )
 
-            # Extract questions from response
-            questions = [
-                line.strip() for line in response['message']['content'].splitlines()
-                if line.strip() and line.strip().endswith('?')
+            content = ""
+            questions: List[str] = []
+            chunks = _observe_stream(stream, start, operation, model_name)
+            try:
+                for chunk in chunks:
+                    content += chunk['message']['content']
+                    questions = parse_questions(content)
+                    if len(questions) >= 3:
+                        # Closing the stream makes Ollama stop generating the closing tokens
+                        break
+            finally:
+                chunks.close()
+
+            # Pad with generic questions if the output was cut before the third one
+            generic_questions = [
+                "What are the main points discussed in this document?",
+                "What are the key findings or conclusions?",
+                "What implications or recommendations are presented?"
             ]
-
-            # Ensure exactly three questions
-            if len(questions) >= 3:
-                return questions[:3]
-            elif len(questions) > 0:
-                # Pad with generic questions if we don't have enough
-                generic_questions = [
-                    "What are the main points discussed in this document?",
-                    "What are the key findings or conclusions?",
-                    "What implications or recommendations are presented?"
-                ]
-                return (questions + generic_questions)[:3]
-            else:
-                # If no questions were extracted, return generic ones
-                return [
-                    "What are the main topics covered in this document?",
-                    "What are the key insights or findings?",
-                    "What are the important takeaways?"
-                ]
+            return (questions + generic_questions)[:3]
 
         except Exception as e:
             error_msg = str(e).lower()
@@ -237,34 +429,213 @@ def generate_questions(model_name: str, summary: str) -> List[str]:
             # Check for memory-related errors
             if 'memory' in error_msg or 'gpu' in error_msg or 'unable to load' in error_msg:
                 logger.warning(f"Memory issue detected with {model_name}, trying fallback model")
-                # Try to get a different model
-                available_models = get_available_models()
-                if available_models:
-                    # Remove the problematic model and try the next one
-                    if model_name in available_models:
-                        available_models.remove(model_name)
-                    if available_models:
-                        model_name = available_models[0]
-                        logger.info(f"Switching to fallback model: {model_name}")
-                        continue
+                # The best of the other models for the memory available
+                fallback_model = get_best_available_model(exclude=(model_name,))
+                if fallback_model:
+                    model_name = fallback_model
+                    logger.info(f"Switching to fallback model: {model_name}")
+                    MODEL_FALLBACKS.inc(operation=operation)
+                    continue
                         
             # For the last attempt, raise the exception
             if attempt == MAX_RETRIES - 1:
                 raise Exception(f"Error generating questions after {MAX_RETRIES} attempts: {e}")
             
             # Wait before retry
+            RETRIES.inc(operation=operation)
             time.sleep(RETRY_DELAY)
     
     # This should never be reached, but just in case
     raise Exception("Failed to generate questions after all attempts")
     
 
+SUMMARY_PROMPTS = {
+    "document": "Summarize the following document in a few concise paragraphs.",
+    "part": "The following text is one part of a longer document. Summarize it in a few concise "
+            "sentences, keeping the names, figures and conclusions it contains.",
+    "combine": "The following texts are summaries of consecutive parts of one document. Combine them "
+               "into a single coherent summary of the whole document, without repeating yourself.",
+}
+
+
+def build_summary_messages(text: str, kind: str = "document") -> List[Dict[str, str]]:
+    """
+    Builds the chat messages asking for a summary of the text, see SUMMARY_PROMPTS for the kinds.
+    """
+    return [{
+        'role': 'user',
+        'content': f"""{SUMMARY_PROMPTS[kind]}
+
+    ---
+
+    {text}
+
+    ---
+
+    Summary:"""
+    }]
+
+
+def generate_summary(model_name: str, text: str, kind: str = "document") -> str:
+    """
+    Abstractive summary of a text that fits in one prompt.
+    kind is "document" for a whole short document, "part" for one chunk
+    of a longer one and "combine" to merge partial summaries.
+    """
+    import ollama
+
+    operation = f"summarize_{kind}"
+    if not model_name:
+        model_name = get_best_available_model()
+        if not model_name:
+            raise Exception("No suitable model available for summarization")
+
+    messages = build_summary_messages(text, kind)
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            with span("ollama.chat", model=model_name, operation=operation):
+                response = ollama.chat(
+                    model=model_name,
+                    messages=messages,
+                    options={
+                        **plan_options(model_name, operation, messages, SUMMARY_NUM_PREDICT),
+                        'temperature': 0.3,  # Stay close to the text
+                        'top_p': 0.9
+                    },
+                    keep_alive=get_keep_alive()
+                )
+            return response['message']['content'].strip()
+
+        except Exception as e:
+            logger.error(f"Attempt {attempt + 1} failed for model {model_name}: {e}")
+            if attempt == MAX_RETRIES - 1:
+                raise Exception(f"Error generating summary after {MAX_RETRIES} attempts: {e}")
+            RETRIES.inc(operation=operation)
+            time.sleep(RETRY_DELAY)
+
+    raise Exception("Failed to generate summary after all attempts")
+
+
+def generate_summary_stream(model_name: str, text: str, kind: str = "document") -> Iterator[str]:
+    """
+    generate_summary streamed, yields the text as the model writes it.
+    A call failing before its first token is retried like generate_summary,
+    one failing later is not, the caller already passed its beginning on.
+    """
+    import ollama
+
+    operation = f"summarize_{kind}"
+    if not model_name:
+        model_name = get_best_available_model()
+        if not model_name:
+            raise Exception("No suitable model available for summarization")
+
+    messages = build_summary_messages(text, kind)
+
+    for attempt in range(MAX_RETRIES):
+        started = False
+        try:
+            start = time.perf_counter()
+            stream = ollama.chat(
+                model=model_name,
+                messages=messages,
+                stream=True,
+                options={
+                    **plan_options(model_name, operation, messages, SUMMARY_NUM_PREDICT),
+                    'temperature': 0.3,  # Stay close to the text
+                    'top_p': 0.9
+                },
+                keep_alive=get_keep_alive()
+            )
+            for chunk in _observe_stream(stream, start, operation, model_name):
+                content = chunk['message']['content']
+                if not started:
+                    # Same text as generate_summary, which strips the answer
+                    content = content.lstrip()
+                if content:
+                    started = True
+                    yield content
+            return
+
+        except Exception as e:
+            logger.error(f"Attempt {attempt + 1} failed for model {model_name}: {e}")
+            if started or attempt == MAX_RETRIES - 1:
+                raise Exception(f"Error generating summary after {attempt + 1} attempts: {e}")
+            RETRIES.inc(operation=operation)
+            time.sleep(RETRY_DELAY)
+
+
+def build_answer_messages(question: str, relevant_chunks: List[str]) -> List[Dict[str, str]]:
+    """
+    Builds the chat messages asking the model to answer from the retrieved chunks only.
+    """
+    context = "\n\n".join(
+        f"[Context {i}]: {chunk}" for i, chunk in enumerate(relevant_chunks, 1)
+    )
+
+    return [{
+        'role': 'user',
+        'content': f"""Answer the following question using ONLY the provided context.
+                If the answer cannot be fully determined from the context, acknowledge this
+                and explain what can be determined from the available information.
+
+                Question: {question}
+
+                Relevant context:
+                {context}
+
+                Answer:"""
+    }]
+
+
+def _observe_stream(
+        stream: Iterator["ChatResponse"],
+        start: float,
+        operation: str,
+        model_name: str
+    ) -> Iterator["ChatResponse"]:
+    """
+    Pass the stream through while recording the time to first token
+    and the generation speed reported in the final chunk. The span covers
+    the whole stream, it ends when the stream is exhausted or closed.
+    """
+    chat_span = start_span("ollama.chat", model=model_name, operation=operation, stream=True)
+    first_token = True
+    try:
+        for chunk in stream:
+            if first_token and chunk['message']['content']:
+                ttft = time.perf_counter() - start
+                TIME_TO_FIRST_TOKEN_SECONDS.observe(ttft, operation=operation)
+                chat_span.set_attribute("time_to_first_token_ms", round(ttft * 1000, 1))
+                first_token = False
+            if chunk.get('done') and chunk.get('eval_count') and chunk.get('eval_duration'):
+                # eval_duration is reported in nanoseconds
+                TOKENS_PER_SECOND.observe(chunk['eval_count'] / chunk['eval_duration'] * 1e9, operation=operation)
+                chat_span.set_attribute("eval_count", chunk['eval_count'])
+            yield chunk
+    except GeneratorExit:
+        # Closed early on purpose: enough questions read, cancelled or the client went away
+        raise
+    except BaseException as e:
+        chat_span.end(e)
+        raise
+    finally:
+        # Closes the HTTP response when the caller stops early, Ollama then stops generating
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+        chat_span.end()
+
+
 def generate_answer(
         question: str,
         relevant_chunks: List[str],
         model_name: str
-    ) -> Iterator[ChatResponse]:
-    
+    ) -> Iterator["ChatResponse"]:
+    import ollama
+
+    operation = "generate_answer"
     # Use fallback model if the provided model is None or has issues
     if not model_name:
         model_name = get_best_available_model()
@@ -276,42 +647,28 @@ def generate_answer(
             # Test model memory first
             if not test_model_memory(model_name):
                 logger.warning(f"Model {model_name} failed memory test, trying fallback")
-                model_name = get_best_available_model()
+                MODEL_FALLBACKS.inc(operation=operation)
+                model_name = get_best_available_model(exclude=(model_name,))
                 if not model_name:
                     raise Exception("No suitable model available after memory test")
                 continue
             
-            context_parts = []
-            for i, chunk in enumerate(relevant_chunks, 1):
-                context_parts.append(f"[Context {i}]: {chunk}")
-            context = "\n\n".join(context_parts)
-
-            messages = [{
-                'role': 'user',
-                'content': f"""Answer the following question using ONLY the provided context.
-                If the answer cannot be fully determined from the context, acknowledge this
-                and explain what can be determined from the available information.
-
-                Question: {question}
-
-                Relevant context:
-                {context}
-
-                Answer:"""
-            }]
+            messages = build_answer_messages(question, relevant_chunks)
 
+            start = time.perf_counter()
             response = ollama.chat(
                 model=model_name, 
                 messages=messages, 
                 stream=True,
                 options={
-                    'num_predict': 1000,  # Limit output length to save memory
+                    **plan_options(model_name, operation, messages, ANSWER_NUM_PREDICT),
                     'temperature': 0.3,    # Lower temperature for more focused answers
                     'top_p': 0.9          # Focus on most likely tokens
-                }
+                },
+                keep_alive=get_keep_alive()
             )
 
-            return response
+            return _observe_stream(response, start, operation, model_name)
             
         except Exception as e:
             error_msg = str(e).lower()
@@ -320,22 +677,20 @@ def generate_answer(
             # Check for memory-related errors
             if 'memory' in error_msg or 'gpu' in error_msg or 'unable to load' in error_msg:
                 logger.warning(f"Memory issue detected with {model_name}, trying fallback model")
-                # Try to get a different model
-                available_models = get_available_models()
-                if available_models:
-                    # Remove the problematic model and try the next one
-                    if model_name in available_models:
-                        available_models.remove(model_name)
-                    if available_models:
-                        model_name = available_models[0]
-                        logger.info(f"Switching to fallback model: {model_name}")
-                        continue
+                # The best of the other models for the memory available
+                fallback_model = get_best_available_model(exclude=(model_name,))
+                if fallback_model:
+                    model_name = fallback_model
+                    logger.info(f"Switching to fallback model: {model_name}")
+                    MODEL_FALLBACKS.inc(operation=operation)
+                    continue
                         
             # For the last attempt, raise the exception
             if attempt == MAX_RETRIES - 1:
                 raise Exception(f"Error generating answer after {MAX_RETRIES} attempts: {e}")
             
             # Wait before retry
+            RETRIES.inc(operation=operation)
             time.sleep(RETRY_DELAY)
     
     # This should never be reached, but just in case
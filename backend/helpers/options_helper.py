@@ -0,0 +1,131 @@
+import os
+import math
+import logging
+import threading
+
+from typing import Dict, Optional
+
+from .system_helper import get_cpu_info, get_memory_info
+
+logger = logging.getLogger(__name__)
+
+
+# Ollama reloads a model whenever num_ctx, num_batch or num_thread change between two requests,
+# so these are chosen per model and host, and a model's context only grows, by powers of two
+MIN_NUM_CTX = int(os.getenv("OLLAMA_MIN_NUM_CTX", "2048"))
+MAX_NUM_CTX = int(os.getenv("OLLAMA_MAX_NUM_CTX", "16384"))
+OLLAMA_NUM_THREAD = os.getenv("OLLAMA_NUM_THREAD")  # Physical cores when unset
+# f16 KV cache of an 8B model with grouped-query attention, the 1B-3B models take a quarter to a half
+KV_BYTES_PER_TOKEN = int(os.getenv("OLLAMA_KV_BYTES_PER_TOKEN", str(128 * 1024)))
+KV_MEMORY_FRACTION = 0.25  # Share of the available memory a model's KV cache may take
+TOKEN_ESTIMATE_FACTOR = 1.25  # get_nb_tokens counts words, the model tokenizers split some of them
+CHARS_PER_TOKEN = 4  # BPE tokenizers on English, catches long words get_nb_tokens undercounts
+PROMPT_OVERHEAD_TOKENS = 64  # Chat template and role markers around the messages
+MIN_NUM_PREDICT = 32
+LARGE_BATCH_MIN_MEMORY = 8 * 1024 ** 3  # Hosts with less memory evaluate prompts in smaller batches
+NUM_BATCH = 512  # Ollama's default
+SMALL_NUM_BATCH = 256
+
+
+def _next_power_of_two(n: int) -> int:
+    return 1 << max(0, math.ceil(math.log2(max(1, n))))
+
+
+def _previous_power_of_two(n: int) -> int:
+    return 1 << max(0, int(math.log2(max(1, n))))
+
+
+class OptionsPlanner:
+    """
+    Sizes the Ollama options of each request from its prompt and the host:
+
+    - num_ctx fits the prompt and the answer, instead of Ollama's default that
+      wastes KV memory on short prompts and silently truncates long ones,
+      capped by the memory available for the KV cache;
+    - num_predict is what is left of the context after the prompt, up to the
+      operation's limit;
+    - num_thread is the number of physical cores, hyper-threads slow
+      generation down;
+    - num_batch is Ollama's default, halved on hosts with little memory.
+    """
+
+    def __init__(self, cpu: Optional[Dict[str, int]] = None, memory: Optional[Dict[str, int]] = None):
+        self.cpu = cpu or get_cpu_info()
+        self._memory = memory
+        total = (memory or get_memory_info() or {}).get("total")
+        self.num_thread = int(OLLAMA_NUM_THREAD) if OLLAMA_NUM_THREAD else self.cpu["physical"]
+        self.num_batch = SMALL_NUM_BATCH if total and total < LARGE_BATCH_MIN_MEMORY else NUM_BATCH
+        self._lock = threading.Lock()
+        self._contexts: Dict[str, int] = {}
+
+    def max_context(self) -> int:
+        """Largest context whose KV cache fits in its share of the available memory"""
+        memory = self._memory or get_memory_info()
+        if memory is None:
+            return MAX_NUM_CTX
+        tokens = int(memory["available"] * KV_MEMORY_FRACTION / KV_BYTES_PER_TOKEN)
+        return max(MIN_NUM_CTX, min(MAX_NUM_CTX, _previous_power_of_two(tokens)))
+
+    def runner_options(self, model_name: str) -> Dict[str, int]:
+        """Options loading the model as the next requests will use it, for preloads and probes"""
+        with self._lock:
+            num_ctx = self._contexts.setdefault(model_name, MIN_NUM_CTX)
+        return {"num_ctx": num_ctx, "num_batch": min(self.num_batch, num_ctx), "num_thread": self.num_thread}
+
+    def plan(
+        self, model_name: str, operation: str, prompt_tokens: int, max_predict: int, prompt_chars: int = 0
+    ) -> Dict[str, int]:
+        """
+        Options for one request. prompt_tokens is the get_nb_tokens estimate of
+        the messages and prompt_chars their length, the larger of the two token
+        estimates is used. max_predict is the longest output the operation needs.
+        """
+        prompt = max(
+            math.ceil(prompt_tokens * TOKEN_ESTIMATE_FACTOR), math.ceil(prompt_chars / CHARS_PER_TOKEN)
+        ) + PROMPT_OVERHEAD_TOKENS
+        needed = prompt + max_predict
+        with self._lock:
+            current = self._contexts.get(model_name)
+            if current is not None and needed <= current:
+                num_ctx, reason = current, "reused"
+            else:
+                limit = self.max_context()
+                num_ctx = max(_next_power_of_two(needed), MIN_NUM_CTX, current or 0)
+                reason = "grown" if current is not None else "sized"
+                if num_ctx > limit:
+                    num_ctx, reason = max(limit, current or 0), "capped by memory"
+                self._contexts[model_name] = num_ctx
+
+        num_predict = min(max_predict, num_ctx - prompt)
+        if num_predict < MIN_NUM_PREDICT:
+            # Ollama keeps the end of a prompt that does not fit, the beginning is lost
+            logger.warning(
+                f"{operation} prompt of ~{prompt} tokens does not fit the {num_ctx} tokens context of "
+                f"{model_name}, it will be truncated"
+            )
+            num_predict = MIN_NUM_PREDICT
+        options = {
+            "num_ctx": num_ctx,
+            "num_predict": num_predict,
+            "num_batch": min(self.num_batch, num_ctx),
+            "num_thread": self.num_thread,
+        }
+        logger.info(
+            f"Options for {operation} on {model_name}: prompt ~{prompt} tokens, context {reason}, "
+            + ", ".join(f"{key}={value}" for key, value in options.items())
+        )
+        return options
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            contexts = dict(self._contexts)
+        return {
+            "num_thread": self.num_thread,
+            "num_batch": self.num_batch,
+            "max_context": self.max_context(),
+            "contexts": contexts,
+            "cpu": self.cpu,
+        }
+
+
+options_planner = OptionsPlanner()
@@ -0,0 +1,238 @@
+import os
+import math
+import time
+import logging
+import threading
+
+from enum import IntEnum
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+MAX_CONCURRENCY_PER_MODEL = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1"))  # Parallel requests per model
+MAX_TOTAL_CONCURRENCY = int(os.getenv("OLLAMA_MAX_TOTAL_CONCURRENCY", "2"))  # Parallel requests across all models
+MAX_QUEUE_DEPTH = int(os.getenv("OLLAMA_MAX_QUEUE_DEPTH", "16"))  # Waiting requests per model and priority
+MAX_QUEUE_WAIT = float(os.getenv("OLLAMA_MAX_QUEUE_WAIT", "300"))  # Seconds a request may wait for a slot
+CANCEL_POLL_SECONDS = 0.5  # How often a waiting request checks whether it was cancelled
+DEFAULT_SERVICE_TIME = 5.0  # Seconds, used for Retry-After before any request completed
+SERVICE_TIME_SMOOTHING = 0.2  # Weight of the latest request in the moving average
+
+
+class Priority(IntEnum):
+    """Priority classes for Ollama requests, lower values are served first"""
+    INTERACTIVE = 0
+    EMBEDDING = 1
+    QUESTIONS = 2
+    PREFETCH = 3
+
+
+# Background work is shed earlier than interactive work when the queue fills up
+QUEUE_LIMITS = {
+    Priority.INTERACTIVE: MAX_QUEUE_DEPTH * 2,
+    Priority.EMBEDDING: MAX_QUEUE_DEPTH * 2,
+    Priority.QUESTIONS: MAX_QUEUE_DEPTH,
+    Priority.PREFETCH: max(1, MAX_QUEUE_DEPTH // 4),
+}
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a request cannot be queued because the queue is full"""
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SchedulerCancelledError(Exception):
+    """Raised when a request is cancelled while it waits for a slot"""
+
+
+class _Ticket:
+    __slots__ = ("model", "priority", "session_id", "granted")
+
+    def __init__(self, model: str, priority: Priority, session_id: str):
+        self.model = model
+        self.priority = priority
+        self.session_id = session_id
+        self.granted = False
+
+
+class OllamaScheduler:
+    """
+    Admission control in front of the Ollama calls.
+
+    Requests wait for a slot of their model, slots are granted by priority class and,
+    within a class, round-robin across sessions so one busy session cannot starve
+    the others. When a class queue is full the request is rejected right away
+    with an estimate of when to retry.
+    """
+
+    def __init__(
+        self,
+        max_concurrency_per_model: int = MAX_CONCURRENCY_PER_MODEL,
+        max_total_concurrency: int = MAX_TOTAL_CONCURRENCY,
+        queue_limits: Optional[Dict[Priority, int]] = None
+    ):
+        self.max_concurrency_per_model = max_concurrency_per_model
+        self.max_total_concurrency = max_total_concurrency
+        self.queue_limits = queue_limits or QUEUE_LIMITS
+        self._cond = threading.Condition()
+        self._running: Dict[str, int] = {}
+        self._total_running = 0
+        # model -> priority -> session -> waiting tickets
+        self._queues: Dict[str, Dict[Priority, OrderedDict]] = {}
+        self._service_time: Dict[str, float] = {}
+
+    def _queue_length(self, model: str, priority: Priority) -> int:
+        sessions = self._queues.get(model, {}).get(priority, {})
+        return sum(len(tickets) for tickets in sessions.values())
+
+    def _retry_after(self, model: str) -> int:
+        waiting = sum(self._queue_length(model, priority) for priority in Priority)
+        service_time = self._service_time.get(model, DEFAULT_SERVICE_TIME)
+        return max(1, math.ceil(waiting * service_time / self.max_concurrency_per_model))
+
+    def _has_capacity(self, model: str) -> bool:
+        return (
+            self._running.get(model, 0) < self.max_concurrency_per_model
+            and self._total_running < self.max_total_concurrency
+        )
+
+    def _dispatch(self) -> None:
+        """Grant free slots to the waiting tickets, called with the lock held"""
+        granted = True
+        while granted and self._total_running < self.max_total_concurrency:
+            granted = False
+            candidates = []
+            for model, queues in self._queues.items():
+                if not self._has_capacity(model):
+                    continue
+                for priority, sessions in queues.items():
+                    if sessions:
+                        candidates.append((priority, model))
+            if not candidates:
+                break
+
+            priority, model = min(candidates)
+            sessions = self._queues[model][priority]
+            # Round-robin: serve the first session, then move it to the back
+            session_id, tickets = next(iter(sessions.items()))
+            ticket = tickets.popleft()
+            sessions.pop(session_id)
+            if tickets:
+                sessions[session_id] = tickets
+
+            ticket.granted = True
+            self._running[model] = self._running.get(model, 0) + 1
+            self._total_running += 1
+            granted = True
+
+        self._cond.notify_all()
+
+    def _check_admission(self, model: str, priority: Priority) -> None:
+        """Reject the request when its class queue is full, called with the lock held"""
+        queue_full = self._queue_length(model, priority) >= self.queue_limits[priority]
+        if queue_full and not self._has_capacity(model):
+            retry_after = self._retry_after(model)
+            logger.warning(f"Queue full for {model} ({priority.name}), retry after {retry_after}s")
+            raise SchedulerBusyError(
+                f"Too many pending {priority.name.lower()} requests for model {model}",
+                retry_after
+            )
+
+    def check_admission(self, model: Optional[str], priority: Priority) -> None:
+        """
+        Raise SchedulerBusyError when a request would be rejected now, without
+        queuing it. Lets a streamed endpoint answer 429 before it sends its status.
+        """
+        with self._cond:
+            self._check_admission(model or "default", priority)
+
+    def _withdraw(self, ticket: _Ticket) -> None:
+        """Remove a ticket that is still waiting from its queue, called with the lock held"""
+        sessions = self._queues[ticket.model][ticket.priority]
+        tickets = sessions[ticket.session_id]
+        tickets.remove(ticket)
+        if not tickets:
+            del sessions[ticket.session_id]
+
+    def acquire(
+        self,
+        model: str,
+        priority: Priority,
+        session_id: Optional[str] = None,
+        cancelled: Optional[threading.Event] = None,
+        timeout: Optional[float] = MAX_QUEUE_WAIT
+    ) -> None:
+        """
+        Wait for a slot of the model. The request leaves the queue when it is
+        cancelled (SchedulerCancelledError) or still waiting after timeout
+        seconds (SchedulerBusyError), so a client that went away does not keep
+        its place.
+        """
+        with self._cond:
+            self._check_admission(model, priority)
+
+            ticket = _Ticket(model, priority, session_id or "anonymous")
+            sessions = self._queues.setdefault(model, {}).setdefault(priority, OrderedDict())
+            sessions.setdefault(ticket.session_id, deque()).append(ticket)
+            self._dispatch()
+
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not ticket.granted:
+                if cancelled is not None and cancelled.is_set():
+                    self._withdraw(ticket)
+                    raise SchedulerCancelledError(f"Request for model {model} cancelled while queued")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._withdraw(ticket)
+                    retry_after = self._retry_after(model)
+                    logger.warning(f"Request for {model} ({priority.name}) waited {timeout}s for a slot")
+                    raise SchedulerBusyError(f"No slot of model {model} freed up in {timeout:g}s", retry_after)
+                wait = CANCEL_POLL_SECONDS if cancelled is not None else None
+                if remaining is not None:
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def release(self, model: str, elapsed: Optional[float] = None) -> None:
+        with self._cond:
+            self._running[model] -= 1
+            self._total_running -= 1
+            if elapsed is not None:
+                previous = self._service_time.get(model, elapsed)
+                self._service_time[model] = (
+                    SERVICE_TIME_SMOOTHING * elapsed + (1 - SERVICE_TIME_SMOOTHING) * previous
+                )
+            self._dispatch()
+
+    @contextmanager
+    def slot(
+        self,
+        model: Optional[str],
+        priority: Priority,
+        session_id: Optional[str] = None,
+        cancelled: Optional[threading.Event] = None
+    ):
+        """Hold one of the model's slots for the duration of the block"""
+        model = model or "default"
+        self.acquire(model, priority, session_id, cancelled)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(model, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._cond:
+            return {
+                model: {
+                    "running": self._running.get(model, 0),
+                    "queued": {priority.name.lower(): self._queue_length(model, priority) for priority in Priority},
+                }
+                for model in set(self._running) | set(self._queues)
+            }
+
+
+ollama_scheduler = OllamaScheduler()
@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import logging
+import threading
+import importlib.abc
+import importlib.util
+
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "false").lower() in ("1", "true", "yes")
+
+_process_start = time.perf_counter()
+_phases: Dict[str, float] = {}
+_imports: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Delegates to the real loader, timing the execution of the module"""
+
+    def __init__(self, loader, name: str):
+        self._loader = loader
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Point the module back to its real loader, resource readers rely on it
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            _record_import(self._name, start, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Times the import of each top-level package, including the packages it
+    imports itself, like the cumulative column of python -X importtime.
+    """
+
+    def __init__(self):
+        self._resolving = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if "." in name or getattr(self._resolving, "name", None) == name:
+            return None
+        self._resolving.name = name
+        try:
+            spec = importlib.util.find_spec(name)
+        finally:
+            self._resolving.name = None
+        if spec is None or spec.loader is None or spec.origin in ("built-in", "frozen"):
+            return None
+        spec.loader = _TimedLoader(spec.loader, name)
+        return spec
+
+
+def _record_import(name: str, start: float, seconds: float) -> None:
+    with _lock:
+        _imports.append({
+            "module": name,
+            "seconds": round(seconds, 4),
+            "at": round(start - _process_start, 4),
+            "deferred": "app_ready" in _phases,
+        })
+
+
+def install() -> None:
+    """Start timing imports, effective only when STARTUP_PROFILE is set"""
+    if STARTUP_PROFILE and not any(isinstance(f, _ImportTimer) for f in sys.meta_path):
+        sys.meta_path.insert(0, _ImportTimer())
+
+
+def mark(phase: str) -> None:
+    """Record the time since process start at which a startup phase completed"""
+    _phases.setdefault(phase, round(time.perf_counter() - _process_start, 4))
+
+
+def get_startup_profile() -> Dict[str, Any]:
+    with _lock:
+        imports = sorted(_imports, key=lambda i: i["seconds"], reverse=True)
+    return {"profiling": STARTUP_PROFILE, "phases": dict(_phases), "imports": imports}
+
+
+def log_startup_profile(top: Optional[int] = 15) -> None:
+    profile = get_startup_profile()
+    lines = [f"{phase:<20} {seconds:8.3f}s" for phase, seconds in profile["phases"].items()]
+    lines += [
+        f"import {i['module']:<24} {i['seconds']:8.3f}s{' (deferred)' if i['deferred'] else ''}"
+        for i in profile["imports"][:top]
+    ]
+    logger.info("Startup profile:\n" + "\n".join(lines))
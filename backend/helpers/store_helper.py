@@ -0,0 +1,140 @@
+import os
+import gzip
+import hashlib
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .ollama_helper import get_nb_tokens
+from .metrics_helper import DOCUMENT_STORE_BYTES, CACHE_HITS, CACHE_MISSES
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+# Extracted texts kept for the endpoints that take a document_id, the least recently used go first
+DOCUMENT_STORE_MAX_BYTES = int(os.getenv("DOCUMENT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = 1024  # Smaller bodies are sent as they are
+GZIP_LEVEL = 1  # 3.5x smaller on text at a fifth of the default level's time
+ZSTD_LEVEL = 3
+
+
+class DocumentNotFoundError(KeyError):
+    """The document id is unknown, or its text was evicted or lost with a restart"""
+
+    def __init__(self, document_id: str):
+        super().__init__(document_id)
+        self.document_id = document_id
+
+    def __str__(self) -> str:
+        return f"Unknown document {self.document_id}, send its content instead"
+
+
+class DocumentStore:
+    """
+    Texts extracted by /analyze/, keyed by a hash of their content, so the
+    later steps (token estimate, summaries) reference a document by its id
+    instead of posting its text again. Uploading the same text twice gives
+    the same id. The store is bounded by the size of the texts it holds.
+    """
+
+    def __init__(self, max_bytes: int = DOCUMENT_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._documents: "OrderedDict[str, Dict]" = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def document_id(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def put(self, text: str) -> str:
+        document_id = self.document_id(text)
+        size = len(text.encode())
+        with self._lock:
+            if document_id in self._documents:
+                self._documents.move_to_end(document_id)
+                return document_id
+            self._documents[document_id] = {"text": text, "bytes": size, "nb_tokens": None}
+            self._bytes += size
+            # The newest document is kept even when it is larger than the store on its own
+            while self._bytes > self.max_bytes and len(self._documents) > 1:
+                evicted, entry = self._documents.popitem(last=False)
+                self._bytes -= entry["bytes"]
+                logger.info(f"Evicted document {evicted} ({entry['bytes']} bytes) from the store")
+            DOCUMENT_STORE_BYTES.set(self._bytes)
+        return document_id
+
+    def _entry(self, document_id: str) -> Dict:
+        with self._lock:
+            entry = self._documents.get(document_id)
+            if entry is None:
+                raise DocumentNotFoundError(document_id)
+            self._documents.move_to_end(document_id)
+            return entry
+
+    def get(self, document_id: str) -> str:
+        return self._entry(document_id)["text"]
+
+    def nb_tokens(self, document_id: str) -> int:
+        """Token estimate of the document, computed once"""
+        entry = self._entry(document_id)
+        if entry["nb_tokens"] is None:
+            CACHE_MISSES.inc(cache="document_tokens")
+            entry["nb_tokens"] = get_nb_tokens(entry["text"])
+        else:
+            CACHE_HITS.inc(cache="document_tokens")
+        return entry["nb_tokens"]
+
+    def delete(self, document_id: str) -> bool:
+        with self._lock:
+            entry = self._documents.pop(document_id, None)
+            if entry is None:
+                return False
+            self._bytes -= entry["bytes"]
+            DOCUMENT_STORE_BYTES.set(self._bytes)
+            return True
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
+document_store = DocumentStore()
+
+
+def resolve_text(content: Optional[str], document_id: Optional[str]) -> str:
+    """The text posted with the request, or the stored one it references"""
+    if content is not None:
+        return content
+    if document_id is None:
+        raise ValueError("Either content or document_id is required")
+    return document_store.get(document_id)
+
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def encode_body(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a response body with the best encoding the client accepts:
+    zstd when the zstandard package is installed, else gzip.
+    Returns the body and its Content-Encoding, None when it is sent as is.
+    """
+    if len(body) < COMPRESS_MIN_BYTES or not accept_encoding:
+        return body, None
+    if zstandard is not None and _accepts(accept_encoding, "zstd"):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), "zstd"
+    if _accepts(accept_encoding, "gzip"):
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
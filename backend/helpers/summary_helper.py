@@ -0,0 +1,137 @@
+import os
+import re
+import json
+import time
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .ollama_helper import TOKEN_THRESHOLD, generate_summary, generate_summary_stream, get_nb_tokens, split_text
+from .scheduler_helper import ollama_scheduler, Priority
+from .tracing_helper import start_span
+
+logger = logging.getLogger(__name__)
+
+
+# Chunks summarized at once for one document. Each call still takes a scheduler slot,
+# so the effective parallelism is the lowest of this, OLLAMA_MAX_CONCURRENCY and OLLAMA_NUM_PARALLEL
+LLM_SUMMARY_CONCURRENCY = int(os.getenv("LLM_SUMMARY_CONCURRENCY", "4"))
+# Characters per chunk of the map step, about 1500 tokens so a chunk and its prompt fit a 4k context
+LLM_SUMMARY_CHUNK_CHARS = int(os.getenv("LLM_SUMMARY_CHUNK_CHARS", "6000"))
+# End of a sentence, with its closing quotes or brackets, or of a line like a list item
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+
+
+def _event(event: str, **fields: Any) -> str:
+    return json.dumps({"event": event, **fields}) + "\n"
+
+
+def split_sentences(pieces: Iterable[str]) -> Iterator[str]:
+    """
+    Sentences of a text streamed in pieces, each one yielded once the space
+    after it arrived, with that space so that they add up to the text.
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        end = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            # A match running to the end of the buffer may go on in the next piece
+            if match.end() < len(buffer):
+                yield buffer[end:match.end()]
+                end = match.end()
+        buffer = buffer[end:]
+    if buffer:
+        yield buffer
+
+
+def group_summaries(summaries: List[str], max_tokens: int = TOKEN_THRESHOLD) -> List[List[str]]:
+    """
+    Consecutive summaries packed into groups of at most max_tokens, each group
+    is combined by one call of the reduce step. Every group holds at least two
+    summaries, so each level of the reduce is shorter than the one before.
+    """
+    groups: List[List[str]] = []
+    size = 0
+    for summary in summaries:
+        tokens = get_nb_tokens(summary)
+        if groups and (size + tokens <= max_tokens or len(groups[-1]) < 2):
+            groups[-1].append(summary)
+            size += tokens
+        else:
+            groups.append([summary])
+            size = tokens
+    # A summary left alone at the end joins the previous group
+    if len(groups) > 1 and len(groups[-1]) == 1:
+        groups[-2].extend(groups.pop())
+    return groups
+
+
+def summarize_document(
+        text: str,
+        model_name: str,
+        session_id: Optional[str] = None,
+        concurrency: int = LLM_SUMMARY_CONCURRENCY
+    ) -> Iterator[str]:
+    """
+    Map-reduce abstractive summary with the local model, streamed as NDJSON events.
+
+    A document under TOKEN_THRESHOLD is summarized in one call. A longer one is
+    split, its chunks are summarized concurrently (map), then the partial
+    summaries are combined group by group, level after level, until one group
+    is left (reduce). A "plan" event gives the number of chunks, a "partial"
+    event is sent as each call of the map and of the reduce completes. The
+    last call, which writes the summary, is streamed: a "sentence" event is
+    sent as each of its sentences is written. A "summary" event ends the
+    stream, or an "error" event when a call failed.
+    """
+    start = time.perf_counter()
+    nb_tokens = get_nb_tokens(text)
+    chunks = split_text(text, LLM_SUMMARY_CHUNK_CHARS) if nb_tokens > TOKEN_THRESHOLD else [text]
+    # Not a with block, the generator is resumed in other contexts while it streams
+    summary_span = start_span("summary.map_reduce", model=model_name, tokens=nb_tokens, chunks=len(chunks))
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="summary")
+
+    def summarize(part: str, kind: str) -> str:
+        with ollama_scheduler.slot(model_name, Priority.QUESTIONS, session_id):
+            return generate_summary(model_name, part, kind)
+
+    def summarize_stream(part: str, kind: str) -> Iterator[str]:
+        # The slot is held until the last token
+        with ollama_scheduler.slot(model_name, Priority.QUESTIONS, session_id):
+            yield from generate_summary_stream(model_name, part, kind)
+
+    try:
+        yield _event("plan", chunks=len(chunks), nb_tokens=nb_tokens)
+        parts, level, kind = chunks, 0, "part" if len(chunks) > 1 else "document"
+        while len(parts) > 1:
+            futures = {executor.submit(summarize, part, kind): index for index, part in enumerate(parts)}
+            results: List[Optional[str]] = [None] * len(parts)
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                results[index] = future.result()
+                yield _event(
+                    "partial", level=level, index=index, done=done,
+                    total=len(parts), summary=results[index]
+                )
+            parts = ["\n\n".join(group) for group in group_summaries(results)]
+            level, kind = level + 1, "combine"
+
+        summary = ""
+        for index, sentence in enumerate(split_sentences(summarize_stream(parts[0], kind))):
+            if index == 0:
+                summary_span.set_attribute("first_sentence_seconds", round(time.perf_counter() - start, 3))
+            summary += sentence
+            yield _event("sentence", index=index, text=sentence)
+        summary = summary.strip()
+        summary_span.set_attribute("seconds", round(time.perf_counter() - start, 3))
+        yield _event("summary", summary=summary, seconds=round(time.perf_counter() - start, 3))
+    except Exception as e:
+        logger.error(f"Summarization failed: {e}")
+        summary_span.end(e)
+        yield _event("error", detail=str(e))
+    finally:
+        # Stops the chunks not started yet when the client went away
+        executor.shutdown(wait=False, cancel_futures=True)
+        summary_span.end()
@@ -0,0 +1,59 @@
+import os
+import logging
+
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+CPUINFO_PATH = "/proc/cpuinfo"
+MEMINFO_PATH = "/proc/meminfo"
+
+
+def get_cpu_info(path: str = CPUINFO_PATH) -> Dict[str, int]:
+    """
+    Logical CPUs the process may run on and physical cores behind them.
+    Hyper-threads share the execution units of a core, so the physical
+    count is what matrix-heavy work like token generation scales with.
+    Falls back to the logical count where /proc/cpuinfo is missing.
+    """
+    try:
+        logical = len(os.sched_getaffinity(0))
+    except AttributeError:
+        logical = os.cpu_count() or 1
+
+    cores, physical_id = set(), "0"
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    cores.add((physical_id, value.strip()))
+    except OSError:
+        pass
+    # An affinity mask or a container may restrict the process to fewer CPUs than the host has
+    physical = min(len(cores), logical) if cores else logical
+    return {"logical": logical, "physical": max(1, physical)}
+
+
+def get_memory_info(path: str = MEMINFO_PATH) -> Optional[Dict[str, int]]:
+    """Total and available memory in bytes, None where /proc/meminfo is missing"""
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("MemTotal", "MemAvailable", "MemFree"):
+                    values[key] = int(value.split()[0]) * 1024  # Reported in kB
+    except (OSError, ValueError, IndexError):
+        return None
+    if "MemTotal" not in values:
+        return None
+    return {
+        "total": values["MemTotal"],
+        # MemAvailable counts the page cache the kernel can reclaim, kernels before 3.14 lack it
+        "available": values.get("MemAvailable", values.get("MemFree", values["MemTotal"])),
+    }
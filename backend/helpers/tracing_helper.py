@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import queue
+import secrets
+import logging
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()  # none, jsonl or otlp
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = "knowledge-backend"
+TRACE_FLUSH_INTERVAL = 1.0  # Seconds between exports, spans are written off the request path
+TRACING_ENABLED = TRACE_EXPORTER in ("jsonl", "otlp")
+
+# (trace_id, span_id) of the span currently running in this context
+_current_context: contextvars.ContextVar = contextvars.ContextVar("trace_context", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Parse a W3C traceparent header into (trace_id, parent_span_id)"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def get_trace_context() -> Optional[Tuple[str, str]]:
+    return _current_context.get()
+
+
+def set_trace_context(context: Optional[Tuple[str, str]]) -> contextvars.Token:
+    return _current_context.set(context)
+
+
+def reset_trace_context(token: contextvars.Token) -> None:
+    _current_context.reset(token)
+
+
+class Span:
+    """A timed operation, exported when it ends"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional[Tuple[str, str]] = None):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id, self.parent_span_id = parent if parent else (new_trace_id(), None)
+        self.span_id = new_span_id()
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def context(self) -> Tuple[str, str]:
+        return self.trace_id, self.span_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "service": TRACE_SERVICE_NAME,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled so instrumentation costs nothing"""
+    context = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_span(name: str, parent: Optional[Tuple[str, str]] = None, **attributes):
+    """
+    Start a span without making it current, the caller has to end() it.
+    Used for work that outlives a with block, like a streamed generation.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return Span(name, attributes, parent or _current_context.get())
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the block as a child of the current span"""
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+
+    current = Span(name, attributes, _current_context.get())
+    token = _current_context.set(current.context)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        _current_context.reset(token)
+        current.end()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Encode span records, the lines of the JSONL export, as an OTLP/HTTP JSON
+    export request. The frontend has the same encoder for its spans.
+    """
+    services: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        services.setdefault(s["service"], []).append(s)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+            "scopeSpans": [{
+                "scope": {"name": "knowledge"},
+                "spans": [{
+                    "traceId": s["trace_id"],
+                    "spanId": s["span_id"],
+                    "parentSpanId": s["parent_span_id"] or "",
+                    "name": s["name"],
+                    "kind": 1,
+                    "startTimeUnixNano": str(s["start_time_unix_nano"]),
+                    "endTimeUnixNano": str(s["end_time_unix_nano"]),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                    "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+                } for s in records],
+            }],
+        } for service, records in services.items()]
+    }
+
+
+class _SpanExporter:
+    """Writes finished spans from a background thread"""
+
+    def __init__(self):
+        self._spans: "queue.Queue[Span]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, finished: Span) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+        self._spans.put(finished)
+
+    def _drain(self) -> List[Span]:
+        spans = [self._spans.get()]
+        deadline = time.monotonic() + TRACE_FLUSH_INTERVAL
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                spans.append(self._spans.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return spans
+
+    def _write(self, spans: List[Span]) -> None:
+        records = [s.to_dict() for s in spans]
+        try:
+            if TRACE_EXPORTER == "otlp":
+                requests.post(TRACE_OTLP_ENDPOINT, json=to_otlp(records), timeout=5)
+            else:
+                with open(TRACE_JSONL_PATH, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(s, default=str) + "\n" for s in records)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+    def _run(self) -> None:
+        while True:
+            self._write(self._drain())
+
+
+_exporter = _SpanExporter()
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening a root span per request. The trace is continued
+    from the W3C traceparent header sent by the frontend, or started here.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        parent = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        attributes = {"http.method": scope["method"], "http.path": scope["path"]}
+        action = headers.get(b"x-trace-action")
+        if action:
+            attributes["user.action"] = action.decode("latin-1")
+
+        root = Span(f"{scope['method']} {scope['path']}", attributes, parent)
+        token = _current_context.set(root.context)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException as e:
+            root.end(e)
+            raise
+        finally:
+            _current_context.reset(token)
+            root.end()
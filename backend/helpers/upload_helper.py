@@ -0,0 +1,68 @@
+import os
+import json
+import logging
+
+from typing import Dict
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+# Uploads larger than this are rejected with 413, the default is the Document Intelligence limit
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+# A batch holds many documents, it gets a cap of its own
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", str(4 * 1024 * 1024 * 1024)))
+UPLOAD_LIMITS = {"/analyze/": MAX_UPLOAD_BYTES, "/analyze_batch/": MAX_BATCH_UPLOAD_BYTES}
+
+
+def upload_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} bytes limit")
+
+
+class UploadLimitMiddleware:
+    """
+    Pure ASGI middleware capping the size of uploads. A declared Content-Length
+    over the cap is rejected before the body is read, a chunked body is
+    counted while it streams in and rejected once it goes over.
+
+    The multipart parser spools files past 1 MB to a temporary file, so with
+    the cap the memory and disk used by an upload are both bounded.
+    """
+
+    def __init__(self, app, limits: Dict[str, int] = UPLOAD_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and int(content_length) > max_bytes:
+            logger.warning(f"Rejected a {int(content_length)} bytes upload to {scope['path']}")
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"connection", b"close")],
+            })
+            body = json.dumps({"detail": upload_too_large(max_bytes).detail}).encode()
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # FastAPI re-raises HTTPException from body parsing, the client gets the 413
+                    raise upload_too_large(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,69 @@
+import os
+import time
+import logging
+import threading
+
+from typing import Dict, Any
+
+from .ollama_helper import GENERATION_MODEL, EMBEDDING_MODEL, OLLAMA_PIN_MODELS
+from .ollama_helper import get_best_available_model, get_keep_alive
+from .ollama_helper import preload_model, preload_embedding_model
+from .scheduler_helper import ollama_scheduler, Priority
+from .startup_helper import mark
+
+logger = logging.getLogger(__name__)
+
+
+WARMUP_ENABLED = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+
+_lock = threading.Lock()
+_readiness: Dict[str, Any] = {
+    "ready": not WARMUP_ENABLED,
+    "models": {},
+    "keep_alive": None,
+    "pinned": OLLAMA_PIN_MODELS,
+}
+
+
+def _preload(name: str, loader) -> None:
+    start = time.perf_counter()
+    try:
+        with ollama_scheduler.slot(name, Priority.PREFETCH):
+            loader(name)
+        status = {"loaded": True, "seconds": round(time.perf_counter() - start, 3)}
+        logger.info(f"Preloaded model {name} in {status['seconds']}s")
+    except Exception as e:
+        status = {"loaded": False, "error": str(e)}
+        logger.error(f"Failed to preload model {name}: {e}")
+    with _lock:
+        _readiness["models"][name] = status
+
+
+def warm_up_models() -> None:
+    """
+    Preload the generation and embedding models so the first user request
+    does not pay for loading them. The backend is marked ready once every
+    model was attempted, failures are reported but do not block readiness.
+    """
+    if not WARMUP_ENABLED:
+        return
+
+    with _lock:
+        _readiness["keep_alive"] = get_keep_alive()
+
+    generation_model = GENERATION_MODEL or get_best_available_model()
+    if generation_model:
+        _preload(generation_model, preload_model)
+    else:
+        logger.warning("No generation model available to preload")
+
+    _preload(EMBEDDING_MODEL, preload_embedding_model)
+
+    with _lock:
+        _readiness["ready"] = True
+    mark("models_ready")
+
+
+def get_readiness() -> Dict[str, Any]:
+    with _lock:
+        return {**_readiness, "models": dict(_readiness["models"])}
@@ -1,76 +1,298 @@
 # backend/main.py
 
 import os
+import json
+import uuid
 import asyncio
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from .helpers.doc_helper import get_result
+from contextlib import asynccontextmanager
+from typing import Iterator, List, Literal, Optional
+from .helpers import startup_helper
+startup_helper.install()  # Before the other imports, so they are timed when STARTUP_PROFILE is set
+from fastapi import FastAPI, UploadFile, File, Form, Header, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, model_validator
+from .helpers.doc_helper import get_result, get_layout
+from .helpers.batch_helper import analyze_documents
+from .helpers.summary_helper import summarize_document
 from .helpers.language_helper import get_extractive_summary
-from .helpers.ollama_helper import get_nb_tokens, get_available_models 
+from .helpers.ollama_helper import get_nb_tokens, get_available_models, get_best_available_model
 from .helpers.ollama_helper import generate_questions, generate_answer
+from .helpers.warmup_helper import warm_up_models, get_readiness
+from .helpers.scheduler_helper import ollama_scheduler, Priority, SchedulerBusyError, SchedulerCancelledError
+from .helpers.embedding_helper import get_embeddings
+from .helpers.metrics_helper import render_metrics, InFlightMiddleware, VECTOR_QUERY_SECONDS
+from .helpers.tracing_helper import TracingMiddleware
+from .helpers.upload_helper import UploadLimitMiddleware
+from .helpers.cancel_helper import cancel_registry, stream_until_disconnected
+from .helpers.governor_helper import get_governors_snapshot
+from .helpers.store_helper import document_store, resolve_text, encode_body, DocumentNotFoundError
+from .helpers.options_helper import options_planner
 
 
-app = FastAPI()  
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_helper.mark("app_ready")
+    if startup_helper.STARTUP_PROFILE:
+        startup_helper.log_startup_profile()
+    # Warm up in the background so the server accepts requests (and /ready) right away
+    warmup_task = asyncio.create_task(asyncio.to_thread(warm_up_models))
+    yield
+    if not warmup_task.done():
+        warmup_task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)  
+app.add_middleware(InFlightMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(UploadLimitMiddleware)
+startup_helper.mark("app_created")
+
+
+@app.exception_handler(SchedulerBusyError)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusyError):
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(DocumentNotFoundError)
+async def document_not_found_handler(request: Request, exc: DocumentNotFoundError):
+    # The client still has the text, it posts it as content instead
+    return JSONResponse({"detail": str(exc)}, status_code=404)
+
+
+def encoded_response(body: bytes, media_type: str, accept_encoding: Optional[str]) -> Response:
+    """Response compressed with gzip or zstd when the client accepts it"""
+    body, encoding = encode_body(body, accept_encoding)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
 
 
 class TextContent(BaseModel):
-    content: str
+    content: Optional[str] = None
+    document_id: Optional[str] = None  # A document stored by /analyze/, instead of posting its text again
+
+    @model_validator(mode="after")
+    def check_text(self):
+        if self.content is None and self.document_id is None:
+            raise ValueError("Either content or document_id is required")
+        return self
+
+    @property
+    def text(self) -> str:
+        return resolve_text(self.content, self.document_id)
 
 
-class SummaryContent(BaseModel):
-    content: str
+class SummaryContent(TextContent):
     model_name: str
 
 
+class EmbeddingContent(BaseModel):
+    texts: list
+    model_name: Optional[str] = None
+
+
 class QuestionContent(BaseModel):
     question: str
     relevant_chunks: list
     model_name: str
+    retrieval_seconds: Optional[float] = None  # Vector store query time measured by the frontend
+    stream: bool = False  # Stream the answer as NDJSON, stopped when the client disconnects
+    request_id: Optional[str] = None  # Lets the client stop the generation with /cancel/{request_id}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe, returns 503 until the configured models are preloaded"""
+    readiness = get_readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Pipeline metrics in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/analyze/")  
-async def analyze_document_content(file: UploadFile = File(...)):  
-    content = await file.read()
+def analyze_document_content(
+        file: UploadFile = File(...),
+        mode: Literal["read", "layout"] = Form("read")
+    ):  
+    """
+    Extract the text of a document. The layout mode also returns its pages,
+    lines with their words, tables as rows and handwriting flags.
+    The text is stored under the returned document_id, which the other
+    endpoints take in place of the text.
+    """
+    # The upload is spooled to a temporary file past 1 MB, it is streamed to Azure from there
+    file.file.seek(0)
+    result = {}
     try:
-        text = get_result(content)
+        if mode == "layout":
+            layout = get_layout(file.file)
+            result = {"text": layout["text"], "layout": layout}
+        else:
+            result = {"text": get_result(file.file)}
     except UnicodeDecodeError:
-        text = "Error reading file contents. Please upload a valid file."
-    return {"text": text}  
+        return {"text": "Error reading file contents. Please upload a valid file."}
+    document_id = document_store.put(result["text"])
+    result.update(document_id=document_id, nb_tokens=document_store.nb_tokens(document_id))
+    return result
+
+
+@app.get("/documents/{document_id}")
+def download_document(document_id: str, accept_encoding: Optional[str] = Header(None)):
+    """Full text of a stored document, compressed with zstd or gzip when the client accepts it"""
+    text = document_store.get(document_id)
+    return encoded_response(text.encode(), "text/plain; charset=utf-8", accept_encoding)
+
+
+@app.post("/analyze_batch/")
+async def analyze_batch(files: List[UploadFile] = File(...), summarize: bool = Form(True)):
+    """
+    Extract (and summarize) several documents concurrently,
+    one NDJSON line per file, streamed as each one finishes
+    """
+    return StreamingResponse(analyze_documents(files, summarize), media_type="application/x-ndjson")
 
 
 @app.post("/summarize/")
-async def chat(text_content: TextContent):
-    summary = get_extractive_summary(text_content.content, num_sentences=10)
+def chat(text_content: TextContent):
+    # Blocking, it may wait for a slot of the Language container then poll the job
+    summary = get_extractive_summary(text_content.text, num_sentences=10)
     return {"summary": summary}
 
 
+@app.post("/summarize_llm/")
+def summarize_llm(summary_content: SummaryContent, x_session_id: Optional[str] = Header(None)):
+    """
+    Abstractive summary with the local model, map-reduce over the chunks of long documents.
+    Progress, partial summaries and the sentences of the summary as they are written are
+    streamed as NDJSON events, the last one holds the summary.
+    """
+    return StreamingResponse(
+        summarize_document(summary_content.text, summary_content.model_name, x_session_id),
+        media_type="application/x-ndjson"
+    )
+
+
 @app.post("/estimate_tokens/")
 async def estimate_tokens(text_content: TextContent):
+    if text_content.content is None:
+        return {"nb_tokens": document_store.nb_tokens(text_content.document_id)}
     nb_tokens = get_nb_tokens(text_content.content)
     return {"nb_tokens": nb_tokens}
 
 
+@app.post("/embed/")
+def embed_texts(embedding_content: EmbeddingContent):
+    """Embed texts, batched with the concurrent requests of other callers"""
+    embeddings = get_embeddings(embedding_content.texts, embedding_content.model_name)
+    return {"embeddings": embeddings}
+
+
 @app.get("/get_models/")
 async def get_models():
     return {"available_models": get_available_models()}
 
 
 @app.get("/get_best_model/")
-async def get_best_model():
-    """Get the best available model for text generation with memory optimization"""
-    from helpers.ollama_helper import get_best_available_model
+def get_best_model():
+    """The loaded model, or the largest that fits in the available memory"""
     best_model = get_best_available_model()
     return {"best_model": best_model}
 
 
 @app.post("/generate_questions/")
-async def get_ollama_questions(summary_content: SummaryContent):
-    questions = generate_questions(summary_content.model_name, summary_content.content)
+def get_ollama_questions(summary_content: SummaryContent, x_session_id: Optional[str] = Header(None)):
+    with ollama_scheduler.slot(summary_content.model_name, Priority.QUESTIONS, x_session_id):
+        questions = generate_questions(summary_content.model_name, summary_content.text)
     return {"questions": questions}
 
 
+def answer_chunks(question_content: QuestionContent, session_id: Optional[str], cancelled) -> Iterator:
+    """The answer tokens, stopped at the next token once the request is cancelled"""
+    # The stream is consumed inside the slot so the model stays reserved until the answer is complete
+    try:
+        with ollama_scheduler.slot(question_content.model_name, Priority.INTERACTIVE, session_id, cancelled):
+            if cancelled.is_set():
+                return
+            stream = generate_answer(question_content.question, question_content.relevant_chunks, question_content.model_name)
+            try:
+                for chunk in stream:
+                    if cancelled.is_set():
+                        return
+                    yield chunk
+            finally:
+                # Closing the Ollama response makes it stop generating
+                stream.close()
+    except SchedulerCancelledError:
+        # Cancelled or disconnected while queued, the request left the queue without generating
+        return
+
+
 @app.post("/generate_answer/")
-async def get_ollama_answer(question_content: QuestionContent):
-    answer = generate_answer(question_content.question, question_content.relevant_chunks, question_content.model_name)
-    return {"answer": answer}
\ No newline at end of file
+def get_ollama_answer(question_content: QuestionContent, request: Request, x_session_id: Optional[str] = Header(None)):
+    if question_content.retrieval_seconds is not None:
+        VECTOR_QUERY_SECONDS.observe(question_content.retrieval_seconds)
+    request_id = question_content.request_id or str(uuid.uuid4())
+    cancelled = cancel_registry.register(request_id)
+
+    if not question_content.stream:
+        try:
+            answer = list(answer_chunks(question_content, x_session_id, cancelled))
+        finally:
+            cancel_registry.unregister(request_id, cancelled)
+        return {"answer": answer}
+
+    # Checked before the response starts, so a full queue is answered 429 with Retry-After
+    try:
+        ollama_scheduler.check_admission(question_content.model_name, Priority.INTERACTIVE)
+    except SchedulerBusyError:
+        cancel_registry.unregister(request_id, cancelled)
+        raise
+
+    def lines() -> Iterator[str]:
+        chunks = answer_chunks(question_content, x_session_id, cancelled)
+        try:
+            for chunk in chunks:
+                yield json.dumps({"message": {"content": chunk['message']['content']}, "done": chunk.get('done', False)}) + "\n"
+        except SchedulerBusyError as e:
+            # The queue filled up between the check and the slot, the status is already sent
+            yield json.dumps({"error": str(e), "retry_after": e.retry_after}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            chunks.close()
+            cancel_registry.unregister(request_id, cancelled)
+
+    return StreamingResponse(stream_until_disconnected(request, lines, cancelled), media_type="application/x-ndjson")
+
+
+@app.post("/cancel/{request_id}")
+async def cancel_generation(request_id: str):
+    """Stop a generation in flight, the answer streamed so far is kept by the client"""
+    return {"cancelled": cancel_registry.cancel(request_id)}
+
+
+@app.get("/scheduler/")
+async def scheduler_status():
+    # The options show the context each model is loaded with
+    return {"models": ollama_scheduler.snapshot(), "options": options_planner.snapshot()}
+
+
+@app.get("/governors/")
+async def governors_status():
+    """Concurrency limit, requests in flight and queue depth of each Azure container"""
+    return {"containers": get_governors_snapshot()}
+
+
+@app.get("/startup/")
+async def startup_profile():
+    """Time at which each startup phase completed and, with STARTUP_PROFILE set, the slowest imports"""
+    return startup_helper.get_startup_profile()
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""
+Offline micro-benchmarks for the CPU hot paths.
+
+Runs without Ollama, Azure containers or a GPU: models are replaced by the fixed
+inputs of benchmarks/corpora.py. Usage, from the repository root:
+
+    python -m benchmarks.bench_components --output bench.json
+    python -m benchmarks.bench_components --baseline bench.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import timeit
+import argparse
+import platform
+import statistics
+
+from datetime import datetime
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "frontend")]
+
+from benchmarks import corpora  # noqa: E402
+
+REPEAT = 5  # Timed rounds per benchmark, the median is reported
+MIN_ROUND_TIME = 0.2  # Seconds, each round loops the function at least this long
+CHROMA_SIZES = [1_000, 10_000, 100_000]
+CHROMA_QUERIES = 50
+DEFAULT_THRESHOLD = 0.2  # Slowdown ratio above which a benchmark is reported as a regression
+
+
+def measure(fn: Callable[[], object], repeat: int = REPEAT) -> Dict[str, float]:
+    """Time one call of fn, looping it so each round lasts at least MIN_ROUND_TIME"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < MIN_ROUND_TIME and number < 1_000_000:
+        number *= 10 if number < 10 else 2
+    rounds = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "median_s": statistics.median(rounds),
+        "min_s": min(rounds),
+        "mean_s": statistics.fmean(rounds),
+        "loops": number,
+        "rounds": repeat,
+    }
+
+
+def bench_text(results: Dict[str, Dict]) -> None:
+    from backend.helpers.ollama_helper import get_nb_tokens, split_text, build_answer_messages
+    from aiproviders.vector_store import RecursiveCharacterTextSplitter
+    from aiproviders.config import CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS
+    )
+    for name, text in corpora.make_corpora().items():
+        results[f"get_nb_tokens[{name}]"] = measure(lambda: get_nb_tokens(text))
+        results[f"split_text[{name}]"] = measure(lambda: split_text(text))
+        results[f"vector_store_splitter[{name}]"] = measure(lambda: splitter.split_text(text))
+
+    chunks = corpora.make_chunks(3, CHUNK_SIZE)
+    question = "What are the main risks identified in the deployment report?"
+    results["build_answer_messages[3x500]"] = measure(lambda: build_answer_messages(question, chunks))
+
+
+def bench_azure_parsing(results: Dict[str, Dict]) -> None:
+    from backend.helpers.doc_helper import get_words, get_page, WordIndex, _in_span
+    from backend.helpers.language_helper import extract_paragraph_from_result
+
+    page = corpora.make_ocr_page(nb_words=1000)
+
+    def map_lines():
+        # One index per page, as the layout extraction does
+        index = WordIndex(page.words)
+        return [get_words(page, line, index) for line in page.lines]
+
+    results["doc_helper.get_words[1000 words]"] = measure(map_lines)
+    results["doc_helper.get_page[1000 words]"] = measure(lambda: get_page(page))
+    word, spans = page.words[-1], page.lines[-1].spans
+    results["doc_helper._in_span"] = measure(lambda: _in_span(word, spans))
+
+    for nb_sentences in (10, 1000):
+        job_result = corpora.make_language_result(nb_sentences)
+        results[f"extract_paragraph_from_result[{nb_sentences}]"] = measure(
+            lambda: extract_paragraph_from_result(job_result)
+        )
+
+
+def bench_chroma(results: Dict[str, Dict], sizes: List[int]) -> None:
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.EphemeralClient(Settings(anonymized_telemetry=False))
+    max_batch = client.get_max_batch_size()
+    queries = corpora.make_embeddings(CHROMA_QUERIES, seed=corpora.SEED + 1)
+
+    for size in sizes:
+        collection = client.create_collection(f"bench_{size}_{uuid.uuid4().hex[:8]}")
+        embeddings = corpora.make_embeddings(size)
+        documents = corpora.make_chunks(size)
+        ids = [str(i) for i in range(size)]
+
+        start = time.perf_counter()
+        for i in range(0, size, max_batch):
+            collection.add(
+                ids=ids[i:i + max_batch],
+                embeddings=embeddings[i:i + max_batch],
+                documents=documents[i:i + max_batch]
+            )
+        elapsed = time.perf_counter() - start
+        # Ingestion is timed once, repeating it would measure a bigger index each round
+        results[f"chroma.add[{size}]"] = {"median_s": elapsed, "min_s": elapsed, "mean_s": elapsed, "loops": 1, "rounds": 1}
+
+        position = iter(range(10**9))
+        results[f"chroma.query[{size}]"] = measure(
+            lambda: collection.query(query_embeddings=[queries[next(position) % CHROMA_QUERIES]], n_results=3)
+        )
+        client.delete_collection(collection.name)
+
+
+def bench_numpy_index(results: Dict[str, Dict], sizes: List[int]) -> None:
+    from aiproviders.vector_index import NumpyIndex
+
+    queries = corpora.make_embeddings(CHROMA_QUERIES, seed=corpora.SEED + 1)
+    for dtype in ("float32", "float16", "int8"):
+        for size in sizes:
+            index = NumpyIndex(dtype)
+            index.add([str(i) for i in range(size)], corpora.make_embeddings(size), corpora.make_chunks(size))
+            position = iter(range(10**9))
+            results[f"numpy_index.query[{size},{dtype}]"] = measure(
+                lambda: index.query([queries[next(position) % CHROMA_QUERIES]], k=3)
+            )
+            results[f"numpy_index.query_batch[{size},{dtype},{CHROMA_QUERIES}q]"] = measure(
+                lambda: index.query(queries, k=3)
+            )
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Names of the benchmarks whose median got slower than the baseline by more than threshold"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_s"] / baseline[name]["median_s"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"{status:>10}  {name:<45} {ratio:6.2f}x baseline")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against the results of a previous run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before failing, 0.2 means 20%% slower")
+    parser.add_argument("--chroma-sizes", type=int, nargs="*", default=CHROMA_SIZES,
+                        help="Index sizes for the Chroma and NumPy index benchmarks, none to skip them")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+    bench_text(results)
+    bench_azure_parsing(results)
+    if args.chroma_sizes:
+        bench_chroma(results, args.chroma_sizes)
+        bench_numpy_index(results, args.chroma_sizes)
+
+    for name, result in results.items():
+        print(f"{name:<45} {result['median_s'] * 1e6:12.1f} us")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "seed": corpora.SEED,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
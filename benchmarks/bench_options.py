@@ -0,0 +1,148 @@
+"""
+Latency and memory of the planned Ollama options versus the fixed ones.
+
+Replays the requests of a session (document summary, summary of a part of a
+long document, questions, answers) against an Ollama server, once with the
+options the backend used to send (num_predict and sampling only, the context
+is Ollama's default) and once with the options of the planner
+(backend/helpers/options_helper.py). Reports per request type the median
+latency, the time spent loading the model, the prompt tokens Ollama kept
+(fewer than sent means the prompt was truncated) and the size of the loaded
+model, KV cache included, from /api/ps. Usage, from the repository root:
+
+    python -m benchmarks.bench_options --model llama3.2:1b --rounds 3
+    python -m benchmarks.bench_options --host http://localhost:11435   # loadtest/fake_ollama.py
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import corpora  # noqa: E402
+from backend.helpers.ollama_helper import (  # noqa: E402
+    build_answer_messages, build_questions_messages, build_summary_messages, get_nb_tokens, plan_options,
+    QUESTIONS_NUM_PREDICT, SUMMARY_NUM_PREDICT, ANSWER_NUM_PREDICT
+)
+from backend.helpers import options_helper  # noqa: E402
+
+DEFAULT_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+DEFAULT_MODEL = "llama3.2:1b"
+SUMMARY_CHUNK_CHARS = 6000  # LLM_SUMMARY_CHUNK_CHARS of the backend
+SHORT_DOCUMENT_CHARS = 12_000  # About TOKEN_THRESHOLD tokens, summarized in one prompt
+
+
+def make_requests() -> List[Tuple[str, List[Dict[str, str]], int]]:
+    """The (name, messages, num_predict) of one session, in the order the app sends them"""
+    documents = corpora.make_language_result(nb_sentences=10)["tasks"]["items"][0]["results"]["documents"]
+    summary = "".join(sentence["text"] for sentence in documents[0]["sentences"])
+    return [
+        ("summary_document", build_summary_messages(corpora.make_text(SHORT_DOCUMENT_CHARS), "document"),
+         SUMMARY_NUM_PREDICT),
+        ("summary_part", build_summary_messages(corpora.make_text(SUMMARY_CHUNK_CHARS, seed=1), "part"),
+         SUMMARY_NUM_PREDICT),
+        ("questions", build_questions_messages(summary), QUESTIONS_NUM_PREDICT),
+        ("answer", build_answer_messages("What are the main risks?", corpora.make_chunks(3)), ANSWER_NUM_PREDICT),
+    ]
+
+
+def fixed_options(model: str, name: str, messages: List[Dict[str, str]], num_predict: int) -> Dict:
+    """The options sent before the planner"""
+    return {"num_predict": num_predict}
+
+
+def planned_options(model: str, name: str, messages: List[Dict[str, str]], num_predict: int) -> Dict:
+    """The options of the backend planner"""
+    return plan_options(model, name, messages, num_predict)
+
+
+def loaded_size(client, model: str) -> int:
+    for loaded in client.ps()["models"]:
+        if loaded["model"] == model:
+            return loaded["size"]
+    return 0
+
+
+def run_mode(client, model: str, options: Callable[..., Dict], rounds: int) -> Dict[str, Dict]:
+    # Starts from an unloaded model, so both modes pay for the first load
+    client.generate(model=model, prompt="", keep_alive=0)
+    samples: Dict[str, List[Dict]] = {}
+    for _ in range(rounds):
+        for name, messages, num_predict in make_requests():
+            start = time.perf_counter()
+            response = client.chat(
+                model=model,
+                messages=messages,
+                options={**options(model, name, messages, num_predict), "temperature": 0.3, "top_p": 0.9},
+            )
+            samples.setdefault(name, []).append({
+                "seconds": time.perf_counter() - start,
+                "load_seconds": response["load_duration"] / 1e9 if response.get("load_duration") else 0.0,
+                "prompt_tokens_kept": response.get("prompt_eval_count") or 0,
+                "prompt_tokens_sent": sum(get_nb_tokens(message["content"]) for message in messages),
+            })
+    results = {
+        name: {
+            "median_s": statistics.median(s["seconds"] for s in runs),
+            "load_s": sum(s["load_seconds"] for s in runs),
+            "reloads": sum(1 for s in runs if s["load_seconds"] > 0),
+            "prompt_tokens_kept": statistics.median(s["prompt_tokens_kept"] for s in runs),
+            "prompt_tokens_estimate": runs[0]["prompt_tokens_sent"],
+        }
+        for name, runs in samples.items()
+    }
+    results["model_bytes"] = loaded_size(client, model)
+    return results
+
+
+def main() -> int:
+    import ollama
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--rounds", type=int, default=3, help="Sessions replayed per mode")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    client = ollama.Client(host=args.host)
+    modes = {"fixed": fixed_options, "planned": planned_options}
+    results = {mode: run_mode(client, args.model, options, args.rounds) for mode, options in modes.items()}
+
+    print(f"{'request':<18} {'mode':<8} {'median':>9} {'load':>8} {'reloads':>8} {'prompt kept/nb_tokens':>22}")
+    for name, _, _ in make_requests():
+        for mode in modes:
+            r = results[mode][name]
+            print(
+                f"{name:<18} {mode:<8} {r['median_s']:8.2f}s {r['load_s']:7.2f}s {r['reloads']:>8} "
+                f"{r['prompt_tokens_kept']:>10.0f}/{r['prompt_tokens_estimate']:<11}"
+            )
+    for mode in modes:
+        print(f"{mode} model size with its KV cache: {results[mode]['model_bytes'] / 1024 ** 2:,.0f} MB")
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "platform": platform.platform(),
+                "model": args.model,
+                "rounds": args.rounds,
+                "planner": options_helper.options_planner.snapshot(),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
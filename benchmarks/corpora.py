@@ -0,0 +1,132 @@
+"""
+Fixed benchmark inputs.
+
+Everything is generated from a fixed seed, so every run and every machine
+benchmarks exactly the same text, OCR pages, Language results and embeddings.
+"""
+import re
+import random
+
+from types import SimpleNamespace
+from typing import Dict, List
+
+SEED = 20241024
+EMBEDDING_DIM = 768
+
+_VOCABULARY = """
+analysis architecture azure budget capacity certificate cluster compliance configuration container
+contract customer dashboard database deadline deployment design device document edge employee
+engineer environment equipment estimate evaluation experience failure feature finance forecast
+hardware incident infrastructure inventory invoice latency leadership license maintenance manager
+memory migration model monitoring network offline operation outage partner performance pipeline
+platform policy procurement product project proposal quality quarter recovery regulation release
+report requirement resource revenue review risk roadmap schedule security sensor server service
+software solution specification storage strategy summary supplier support system team technology
+throughput timeline training update upgrade usage vendor version warranty workload the a of and to
+in for with on by from is are was were be has have will can should must not this that these those
+""".split()
+
+CORPUS_SIZES = {
+    "small": 2_000,
+    "medium": 50_000,
+    "large": 1_000_000,
+}
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(8, 25))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), str(rng.randint(1, 99999)))
+    if rng.random() < 0.2:
+        words.insert(rng.randrange(len(words)), f"({rng.choice(_VOCABULARY)})")
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?", "!", ";"])
+
+
+def make_text(characters: int, seed: int = SEED) -> str:
+    """Paragraphs of generated sentences, cut to the requested length"""
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < characters:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:characters]
+
+
+def make_corpora() -> Dict[str, str]:
+    return {name: make_text(size) for name, size in CORPUS_SIZES.items()}
+
+
+def make_ocr_page(nb_words: int = 1000, words_per_line: int = 10, seed: int = SEED) -> SimpleNamespace:
+    """A Document Intelligence page with words and lines referencing them through spans"""
+    rng = random.Random(seed)
+    words, lines, offset = [], [], 0
+    for line_start in range(0, nb_words, words_per_line):
+        line_offset = offset
+        line_words = []
+        for _ in range(min(words_per_line, nb_words - line_start)):
+            content = rng.choice(_VOCABULARY)
+            word = SimpleNamespace(
+                content=content,
+                span=SimpleNamespace(offset=offset, length=len(content)),
+                confidence=round(rng.uniform(0.8, 1.0), 3)
+            )
+            words.append(word)
+            line_words.append(content)
+            offset += len(content) + 1
+        content = " ".join(line_words)
+        lines.append(SimpleNamespace(
+            content=content,
+            spans=[SimpleNamespace(offset=line_offset, length=len(content))],
+            polygon=[]
+        ))
+    return SimpleNamespace(
+        page_number=1, width=8.5, height=11, unit="inch",
+        words=words, lines=lines, selection_marks=[]
+    )
+
+
+def make_language_result(nb_sentences: int = 10, seed: int = SEED) -> Dict:
+    """An extractive summarization job result as returned by the Language container"""
+    rng = random.Random(seed)
+    sentences = [{"text": _sentence(rng) + " ", "rankScore": rng.random()} for _ in range(nb_sentences)]
+    return {
+        "status": "succeeded",
+        "tasks": {"items": [{"results": {"documents": [{"id": "1", "sentences": sentences}]}}]}
+    }
+
+
+def make_chunks(count: int, chunk_size: int = 500, seed: int = SEED) -> List[str]:
+    text = make_text(count * chunk_size, seed)
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)][:count]
+
+
+def make_embeddings(count: int, dim: int = EMBEDDING_DIM, seed: int = SEED):
+    """Random unit vectors standing in for nomic-embed-text embeddings"""
+    import numpy as np
+
+    vectors = np.random.default_rng(seed).standard_normal((count, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_qa_set(nb_questions: int = 50, characters: int = 50_000, seed: int = SEED) -> Dict:
+    """
+    A question/answer-span set over a generated document, in the format read by
+    benchmarks/eval_retrieval.py. Each answer is a sentence of the document and its
+    question keeps a random part of that sentence's words, so it only checks that
+    the retrieval pipeline works: tune on a set written from real documents.
+    """
+    rng = random.Random(seed)
+    text = make_text(characters, seed)
+    sentences = [s.strip() for s in re.findall(r"[^.?!;\n]+[.?!;]", text) if len(s.split()) >= 8]
+    questions = []
+    for sentence in rng.sample(sentences, min(nb_questions, len(sentences))):
+        words = sentence.split()
+        kept = sorted(rng.sample(range(len(words)), max(4, len(words) // 2)))
+        questions.append({
+            "document": "generated",
+            "question": "What about " + " ".join(words[i] for i in kept).rstrip(".?!;") + "?",
+            "answer": sentence,
+        })
+    return {"documents": {"generated": text}, "questions": questions}
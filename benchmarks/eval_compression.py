@@ -0,0 +1,147 @@
+"""
+Memory saved versus recall lost by the compact embedding storage modes.
+
+Indexes the documents of a question/answer-span set (see eval_retrieval.py)
+with the NumPy index in every combination of precision (float32, float16,
+int8), Matryoshka dimensions and full-precision rerank, and reports the index
+memory next to the kNN recall against the full float32 vectors and the answer
+recall@k. Usage, from the repository root:
+
+    python -m benchmarks.eval_compression --qa-set qa.json --k 3
+    python -m benchmarks.eval_compression --dimensions 0 512 256 --rerank 0 20 --corpus-chunks 1000000
+
+Matryoshka truncation is only meaningful with nomic-embed-text (the default
+backend embedder); --embedder hashing exercises the code paths offline.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import statistics
+
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "frontend")]
+
+from benchmarks import corpora  # noqa: E402
+from benchmarks.eval_retrieval import (  # noqa: E402
+    DEFAULT_BACKEND, BackendEmbedder, HashingEmbedder, chunk_offsets, covers
+)
+
+
+def evaluate(qa_set: Dict, embed, args) -> List[Dict]:
+    from aiproviders.vector_index import NumpyIndex
+    from aiproviders.vector_store import RecursiveCharacterTextSplitter
+    from aiproviders.config import CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    documents = {}
+    for name, text in qa_set["documents"].items():
+        chunks = splitter.split_text(text)
+        documents[name] = (chunks, chunk_offsets(text, chunks), embed(chunks))
+    questions = qa_set["questions"]
+    question_embeddings = embed([q["question"] for q in questions])
+    dim = len(question_embeddings[0])
+
+    # The reference: exact search over the full float32 vectors
+    reference = {}
+    for name, (chunks, _, embeddings) in documents.items():
+        index = NumpyIndex()
+        index.add([str(i) for i in range(len(chunks))], embeddings, chunks)
+        reference[name] = index
+
+    runs = []
+    for precision, dimensions, rerank in itertools.product(args.precisions, args.dimensions, args.rerank):
+        dimensions = dimensions or None
+        if precision == "float32" and not dimensions and rerank:
+            continue  # Nothing to rerank, the stored vectors are the full ones
+        indexes, memory = {}, 0
+        for name, (chunks, _, embeddings) in documents.items():
+            index = NumpyIndex(precision, dimensions, rerank)
+            index.add([str(i) for i in range(len(chunks))], embeddings, chunks)
+            indexes[name] = index
+            memory += index.memory_bytes()
+        nb_chunks = sum(index.count() for index in indexes.values())
+
+        latencies, hits, found = [], 0, 0
+        for question, query_embedding in zip(questions, question_embeddings):
+            name = question["document"]
+            chunks, offsets, _ = documents[name]
+            start = time.perf_counter()
+            retrieved = indexes[name].query_indices([query_embedding], args.k)[0]
+            latencies.append(time.perf_counter() - start)
+
+            exact = reference[name].query_indices([query_embedding], args.k)[0]
+            found += len(set(retrieved) & set(exact)) / max(1, len(exact))
+            text = qa_set["documents"][name]
+            answer_start = question.get("answer_start", text.find(question["answer"]))
+            ranges = [offsets[i] for i in retrieved if offsets[i] is not None]
+            if answer_start >= 0 and covers(ranges, answer_start, answer_start + len(question["answer"])):
+                hits += 1
+
+        bytes_per_vector = memory / max(1, nb_chunks)
+        runs.append({
+            "precision": precision,
+            "dimensions": dimensions or dim,
+            "rerank": rerank,
+            "bytes_per_vector": bytes_per_vector,
+            "memory_saved": 1 - bytes_per_vector / (dim * 4),
+            "projected_bytes": int(bytes_per_vector * args.corpus_chunks),
+            "knn_recall": found / len(questions),
+            "recall": hits / len(questions),
+            "query_p50_ms": statistics.median(latencies) * 1e3,
+        })
+        for index in indexes.values():
+            index.clear()
+    return runs
+
+
+def print_runs(runs: List[Dict], corpus_chunks: int) -> None:
+    print(f"{'precision':>9} {'dims':>5} {'rerank':>6} {'B/vector':>9} {'saved':>6} "
+          f"{f'at {corpus_chunks:,}':>14} {'knn':>7} {'recall':>7} {'q p50':>8}")
+    for run in runs:
+        print(f"{run['precision']:>9} {run['dimensions']:>5} {run['rerank']:>6} {run['bytes_per_vector']:>9.0f} "
+              f"{run['memory_saved']:>6.0%} {run['projected_bytes'] / 2**20:>12.1f}MB "
+              f"{run['knn_recall']:>7.1%} {run['recall']:>7.1%} {run['query_p50_ms']:>6.2f}ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from aiproviders.config import EMBEDDING_MODEL, NUM_CHUNKS_TO_RETRIEVE
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qa-set", help="Question/answer-span set, a generated one when omitted")
+    parser.add_argument("--embedder", choices=["backend", "hashing"], default="backend")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--k", type=int, default=NUM_CHUNKS_TO_RETRIEVE)
+    parser.add_argument("--precisions", nargs="+", default=["float32", "float16", "int8"],
+                        choices=["float32", "float16", "int8"])
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[0, 512, 256],
+                        help="Matryoshka dimensions, 0 keeps them all")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 20],
+                        help="Candidates reranked with the full vectors, 0 disables the rerank")
+    parser.add_argument("--corpus-chunks", type=int, default=1_000_000,
+                        help="Corpus size for the projected memory column")
+    parser.add_argument("--output", help="Write the runs to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.qa_set:
+        with open(args.qa_set, encoding="utf-8") as f:
+            qa_set = json.load(f)
+    else:
+        qa_set = corpora.make_qa_set()
+    embed = HashingEmbedder() if args.embedder == "hashing" else BackendEmbedder(args.backend, args.model)
+
+    runs = evaluate(qa_set, embed, args)
+    print_runs(runs, args.corpus_chunks)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(runs, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
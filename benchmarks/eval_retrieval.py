@@ -0,0 +1,273 @@
+"""
+Recall versus latency sweep of the retrieval settings.
+
+Indexes the documents of a question/answer-span set for every combination of
+chunk size, chunk overlap, HNSW parameters and k, then reports recall@k next to
+ingest time, query latency and index memory, and marks the Pareto-optimal runs.
+The set is a JSON file:
+
+    {
+      "documents": {"report": "full text of the document ..."},
+      "questions": [{"document": "report", "question": "...", "answer": "span copied from the document"}]
+    }
+
+A question counts as recalled when the retrieved chunks cover its whole answer
+span. knn_recall is the share of the exact k nearest chunks the HNSW index
+returned, it isolates the accuracy lost to the approximate search. Usage, from the repository root (--embedder hashing runs without Ollama):
+
+    python -m benchmarks.eval_retrieval --qa-set qa.json --chunk-sizes 300 500 800 --k 3 5
+    python -m benchmarks.eval_retrieval --embedder hashing --m 8 16 32 --search-ef 10 50
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import hashlib
+import argparse
+import itertools
+import statistics
+
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "frontend")]
+
+from benchmarks import corpora  # noqa: E402
+
+DEFAULT_BACKEND = "http://localhost:8000"
+EMBED_BATCH_SIZE = 64
+HASHING_DIM = 768
+
+
+class BackendEmbedder:
+    """Embeddings from the backend /embed/ endpoint, the ones the app uses"""
+
+    def __init__(self, backend: str, model: str):
+        self.url = f"{backend}/embed/"
+        self.model = model
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        import requests
+
+        embeddings = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            response = requests.post(self.url, json={"texts": texts[i:i + EMBED_BATCH_SIZE], "model_name": self.model})
+            response.raise_for_status()
+            embeddings.extend(response.json()["embeddings"])
+        return embeddings
+
+
+class HashingEmbedder:
+    """Bag of hashed words, a model-free stand-in to exercise the sweep offline"""
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for text in texts:
+            vector = [0.0] * HASHING_DIM
+            words = [w for w in (w.strip(".,;:!?()") for w in text.lower().split()) if w]
+            # Punctuation-only chunks still get a unit vector, as a real model would give them
+            for word in words or [text]:
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % HASHING_DIM] += 1.0
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            embeddings.append([v / norm for v in vector])
+        return embeddings
+
+
+def chunk_offsets(text: str, chunks: List[str]) -> List[Optional[Tuple[int, int]]]:
+    """Character range of each chunk in the text, None when the splitter rewrote it"""
+    offsets, cursor = [], 0
+    for chunk in chunks:
+        start = text.find(chunk, cursor)
+        if start < 0:
+            start = text.find(chunk)
+        if start < 0:
+            offsets.append(None)
+            continue
+        offsets.append((start, start + len(chunk)))
+        cursor = start + 1
+    return offsets
+
+
+def covers(ranges: List[Tuple[int, int]], start: int, end: int) -> bool:
+    """Whether the union of the ranges contains [start, end)"""
+    position = start
+    for range_start, range_end in sorted(ranges):
+        if range_start > position:
+            break
+        position = max(position, range_end)
+        if position >= end:
+            return True
+    return position >= end
+
+
+def hnsw_index_bytes(count: int, dim: int, m: int) -> int:
+    """
+    Memory of an hnswlib index: vectors, 2*M links per node on the base layer and
+    M links on the upper layers, which hold 1/(M-1) of the nodes on average.
+    """
+    base_layer = dim * 4 + (2 * m) * 4 + 4 + 8
+    upper_layers = (m * 4 + 4) / max(1, m - 1)
+    return int(count * (base_layer + upper_layers))
+
+
+def exact_neighbors(embeddings: List[List[float]], query: List[float], k: int, space: str) -> List[int]:
+    """Brute-force k nearest chunks, the reference for the HNSW results"""
+    import numpy as np
+
+    vectors, query = np.asarray(embeddings, dtype=np.float32), np.asarray(query, dtype=np.float32)
+    if space == "l2":
+        distances = ((vectors - query) ** 2).sum(axis=1)
+    elif space == "cosine":
+        distances = 1 - vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+    else:
+        distances = 1 - vectors @ query
+    return np.argsort(distances, kind="stable")[:k].tolist()
+
+
+def pareto_front(runs: List[Dict]) -> None:
+    """Flag the runs no other run beats on recall, p95 query latency and memory at once"""
+    for run in runs:
+        run["pareto"] = not any(
+            other["recall"] >= run["recall"]
+            and other["query_p95_ms"] <= run["query_p95_ms"]
+            and other["index_bytes"] <= run["index_bytes"]
+            and (other["recall"], -other["query_p95_ms"], -other["index_bytes"])
+            != (run["recall"], -run["query_p95_ms"], -run["index_bytes"])
+            for other in runs
+        )
+
+
+def sweep(qa_set: Dict, embed, args) -> List[Dict]:
+    import chromadb
+    from chromadb.config import Settings
+    from aiproviders.vector_store import RecursiveCharacterTextSplitter, hnsw_metadata
+    from aiproviders.config import SEPARATORS
+
+    client = chromadb.EphemeralClient(Settings(anonymized_telemetry=False))
+    questions = qa_set["questions"]
+    question_embeddings = embed([q["question"] for q in questions])
+    runs = []
+
+    for chunk_size, overlap in itertools.product(args.chunk_sizes, args.overlaps):
+        if overlap >= chunk_size:
+            continue
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap, separators=SEPARATORS)
+        documents = {}
+        start = time.perf_counter()
+        for name, text in qa_set["documents"].items():
+            chunks = splitter.split_text(text)
+            documents[name] = (chunks, chunk_offsets(text, chunks))
+        split_s = time.perf_counter() - start
+
+        # Embeddings only depend on the chunking, they are shared by the HNSW runs
+        start = time.perf_counter()
+        embeddings = {name: embed(chunks) for name, (chunks, _) in documents.items()}
+        embed_s = time.perf_counter() - start
+        nb_chunks = sum(len(chunks) for chunks, _ in documents.values())
+        dim = len(question_embeddings[0])
+
+        for m, construction_ef, search_ef in itertools.product(args.m, args.construction_ef, args.search_ef):
+            # The app indexes one document at a time, so does the evaluation
+            collections, ingest_s = {}, 0.0
+            for name, (chunks, _) in documents.items():
+                collection = client.create_collection(
+                    f"eval_{uuid.uuid4().hex[:12]}",
+                    metadata=hnsw_metadata(args.space, m, construction_ef, search_ef)
+                )
+                start = time.perf_counter()
+                collection.add(ids=[str(i) for i in range(len(chunks))], embeddings=embeddings[name], documents=chunks)
+                ingest_s += time.perf_counter() - start
+                collections[name] = collection
+
+            for k in args.k:
+                latencies, hits, neighbors_found, neighbors_total = [], 0, 0, 0
+                for question, query_embedding in zip(questions, question_embeddings):
+                    collection = collections[question["document"]]
+                    chunks, offsets = documents[question["document"]]
+                    start = time.perf_counter()
+                    result = collection.query(query_embeddings=[query_embedding], n_results=min(k, len(chunks)))
+                    latencies.append(time.perf_counter() - start)
+
+                    retrieved = [int(i) for i in result["ids"][0]]
+                    exact = exact_neighbors(embeddings[question["document"]], query_embedding, len(retrieved), args.space)
+                    neighbors_found += len(set(retrieved) & set(exact))
+                    neighbors_total += len(exact)
+                    text = qa_set["documents"][question["document"]]
+                    answer_start = question.get("answer_start", text.find(question["answer"]))
+                    ranges = [offsets[i] for i in retrieved if offsets[i] is not None]
+                    if answer_start >= 0 and covers(ranges, answer_start, answer_start + len(question["answer"])):
+                        hits += 1
+                    elif answer_start < 0 and any(question["answer"] in chunks[i] for i in retrieved):
+                        hits += 1
+
+                latencies.sort()
+                runs.append({
+                    "chunk_size": chunk_size, "chunk_overlap": overlap, "k": k, "space": args.space,
+                    "M": m, "construction_ef": construction_ef, "search_ef": search_ef,
+                    "chunks": nb_chunks,
+                    "recall": hits / len(questions),
+                    "knn_recall": neighbors_found / max(1, neighbors_total),
+                    "split_s": split_s,
+                    "embed_s": embed_s,
+                    "ingest_s": ingest_s,
+                    "query_p50_ms": statistics.median(latencies) * 1e3,
+                    "query_p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1e3,
+                    "index_bytes": hnsw_index_bytes(nb_chunks, dim, m),
+                })
+
+            for collection in collections.values():
+                client.delete_collection(collection.name)
+    pareto_front(runs)
+    return runs
+
+
+def print_runs(runs: List[Dict]) -> None:
+    print(f"{'size':>5} {'ovl':>4} {'k':>3} {'M':>3} {'c_ef':>5} {'s_ef':>5} {'recall':>7} "
+          f"{'knn':>7} {'ingest':>8} {'q p50':>8} {'q p95':>8} {'index':>9}  pareto")
+    for run in sorted(runs, key=lambda r: (-r["recall"], r["query_p95_ms"])):
+        print(f"{run['chunk_size']:>5} {run['chunk_overlap']:>4} {run['k']:>3} {run['M']:>3} "
+              f"{run['construction_ef']:>5} {run['search_ef']:>5} {run['recall']:>7.1%} {run['knn_recall']:>7.1%} "
+              f"{run['ingest_s']:>7.3f}s {run['query_p50_ms']:>6.2f}ms {run['query_p95_ms']:>6.2f}ms "
+              f"{run['index_bytes'] / 2**20:>7.2f}MB  {'*' if run['pareto'] else ''}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from aiproviders.config import (
+        CHUNK_SIZE, CHUNK_OVERLAP, NUM_CHUNKS_TO_RETRIEVE, EMBEDDING_MODEL,
+        HNSW_SPACE, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qa-set", help="Question/answer-span set, a generated one when omitted")
+    parser.add_argument("--embedder", choices=["backend", "hashing"], default="backend")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[CHUNK_SIZE])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[CHUNK_OVERLAP])
+    parser.add_argument("--k", type=int, nargs="+", default=[NUM_CHUNKS_TO_RETRIEVE])
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"], default=HNSW_SPACE)
+    parser.add_argument("--m", type=int, nargs="+", default=[HNSW_M])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[HNSW_CONSTRUCTION_EF])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[HNSW_SEARCH_EF])
+    parser.add_argument("--output", help="Write the runs to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.qa_set:
+        with open(args.qa_set, encoding="utf-8") as f:
+            qa_set = json.load(f)
+    else:
+        qa_set = corpora.make_qa_set()
+    embed = HashingEmbedder() if args.embedder == "hashing" else BackendEmbedder(args.backend, args.model)
+
+    runs = sweep(qa_set, embed, args)
+    print_runs(runs)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(runs, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
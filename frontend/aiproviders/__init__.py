@@ -1,4 +1,12 @@
 from .document import DocumentProcessor
 from .ollama_service import OllamaService
 from .message import Message
-from .vector_store import VectorStore
\ No newline at end of file
+from .tracing import traced_action, trace_headers
+
+
+def __getattr__(name):
+    # The vector store pulls in numpy and the text splitter, it is imported on first use
+    if name == "VectorStore":
+        from .vector_store import VectorStore
+        return VectorStore
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
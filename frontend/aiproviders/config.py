@@ -1,3 +1,5 @@
+import os
+
 # RAG Configuration
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
@@ -6,8 +8,53 @@ EMBEDDING_MODEL = "nomic-embed-text:latest"
 EXCLUDED_MODELS = {EMBEDDING_MODEL}  # Use a set for efficient lookups
 CHROMA_PERSIST_DIRECTORY = "./.chroma"
 
+# Vector index (HNSW), fixed when the collection is created.
+# Tune them with: python -m benchmarks.eval_retrieval --help
+HNSW_SPACE = "l2"  # Distance: l2, cosine or ip
+HNSW_M = 16  # Links per node, more improves recall at the cost of memory and ingest time
+HNSW_CONSTRUCTION_EF = 100  # Candidate list size while building the graph
+HNSW_SEARCH_EF = 10  # Candidate list size while querying, must be at least k to find k neighbors
+
+# Vector search backend: "numpy" (exact, in-process), "chroma" (HNSW) or "auto",
+# which searches exactly up to NUMPY_MAX_CHUNKS chunks and switches to Chroma above
+VECTOR_BACKEND = "auto"
+NUMPY_MAX_CHUNKS = 20_000
+
+# Compact storage of the numpy index, see python -m benchmarks.eval_compression
+EMBEDDING_PRECISION = "float32"  # float32, float16 (half the memory) or int8 (a quarter, one scale per vector)
+EMBEDDING_DIMENSIONS = None  # Keep only the first 256 or 512 dimensions, nomic-embed-text is Matryoshka-trained
+RERANK_CANDIDATES = 20  # Compact scores pick this many chunks, reranked with the full vectors kept on disk
+VECTOR_CACHE_DIRECTORY = None  # Where the full vectors are memory-mapped, the system temp directory if None
+
+# Document Intelligence model: "read" (text only) or "layout", which also extracts the tables,
+# each indexed as chunks of whole rows instead of being split like running text
+OCR_MODE = "read"
+TABLE_CHUNK_SIZE = 1500  # Characters per table chunk, the header rows are repeated in each
+
+# Batch upload: documents chunked and embedded at once while the others are extracted
+BATCH_EMBED_CONCURRENCY = 4
+
+# Bulk ingestion (python frontend/ingest.py), written to a persistent collection of its own
+INGEST_COLLECTION = "library"
+INGEST_EMBED_BATCH = 256  # Chunks embedded per /embed/ request, across documents
+INGEST_MIN_CHARS_PER_PAGE = 20  # PDFs with less text than this per page are scans, sent to OCR
+
 # Text Processing
 SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " ", ""]
 
 # Model Configuration
-TOKEN_THRESHOLD = 2500  # For deciding when to use map-reduce summarization
\ No newline at end of file
+TOKEN_THRESHOLD = 2500  # For deciding when to use map-reduce summarization
+SUMMARY_MODES = {
+    "Extractive (Azure)": "azure",  # Key sentences picked by Azure Text Analytics
+    "Abstractive (local LLM)": "llm",  # Written by the selected Ollama model, map-reduce on long documents
+}
+READY_TIMEOUT = 300  # Seconds to wait for the backend to preload its models
+READY_POLL_INTERVAL = 1  # Seconds between readiness checks
+MAX_BUSY_RETRIES = 2  # Retries when the backend scheduler is saturated (HTTP 429)
+MAX_RETRY_AFTER = 10  # Upper bound in seconds on a Retry-After wait
+PIPELINE_POLL_INTERVAL = 0.5  # Seconds between refreshes of a page section waiting for its result
+
+# Tracing, spans are written where the backend writes them (see backend/helpers/tracing_helper.py)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()  # none, jsonl or otlp
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
@@ -1,56 +1,250 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Iterator, BinaryIO
 import io
-import PyPDF2
-import docx
+import os
+import json
+import time
+import secrets
+import threading
 from datetime import datetime
 from .message import Message
-from .vector_store import VectorStore
-from .config import NUM_CHUNKS_TO_RETRIEVE
+from .config import NUM_CHUNKS_TO_RETRIEVE, BATCH_EMBED_CONCURRENCY, OCR_MODE
+from .tracing import trace_headers
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# The form-data escaping of browsers (RFC 7578 section 4.2): a quote or a line
+# break in a name would end the header or inject another one
+_FORM_DATA_ESCAPES = str.maketrans({'"': "%22", "\r": "%0D", "\n": "%0A"})
+
+class MultipartUpload(io.RawIOBase):
+    """
+    A multipart/form-data body read straight from its files. requests sends it
+    with a Content-Length (from __len__) in blocks, instead of building the
+    whole body in memory as it does for files=.
+
+    files are (field, file name, content type, binary file) tuples,
+    fields are plain form fields sent before them.
+    """
+
+    def __init__(self, files: List[Tuple[str, str, str, BinaryIO]], fields: Optional[Dict[str, str]] = None):
+        self.boundary = secrets.token_hex(16)
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._parts: List[BinaryIO] = []
+        self._size = 0
+        for name, value in (fields or {}).items():
+            name = name.translate(_FORM_DATA_ESCAPES)
+            self._add(io.BytesIO(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            ))
+        for field, file_name, file_type, file in files:
+            field, file_name = field.translate(_FORM_DATA_ESCAPES), file_name.translate(_FORM_DATA_ESCAPES)
+            self._add(io.BytesIO((
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{field}"; filename="{file_name}"\r\n'
+                f"Content-Type: {file_type or 'application/octet-stream'}\r\n\r\n"
+            ).encode()))
+            self._add(file)
+            self._add(io.BytesIO(b"\r\n"))
+        self._add(io.BytesIO(f"--{self.boundary}--\r\n".encode()))
+        self._position = 0
+
+    def _add(self, part: BinaryIO) -> None:
+        part.seek(0, os.SEEK_END)
+        self._size += part.tell()
+        part.seek(0)
+        self._parts.append(part)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        # requests subtracts the position from the length to get the Content-Length
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        while self._parts:
+            data = self._parts[0].read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                self._position += len(data)
+                return len(data)
+            self._parts.pop(0)
+        return 0
+
 
 class DocumentProcessor:
     def __init__(self):
         # Keep all your existing initializations
         self.document_text: Optional[str] = None
+        # Id of the text stored by the backend, sent instead of the text itself
+        self.document_id: Optional[str] = None
         self.summary: Optional[str] = None
         self.suggested_questions: Optional[List[str]] = None
         self.messages: List[Message] = []
         self.token_count: Optional[int] = None
+        self.last_retrieval_seconds: Optional[float] = None
+        # Chunks added, removed and kept by the last upload
+        self.last_sync: Optional[Dict[str, int]] = None
+        # Per-file results of a batch upload, keyed by upload position, two files can share a name
+        self.documents: Dict[int, Dict] = {}
+        # Tables of the document, with OCR_MODE = "layout"
+        self.tables: List[Dict] = []
+        # (text, metadata, units) of the document extracted last, until its chunks are embedded
+        self._pending_index: Optional[Tuple[str, Dict, Optional[List[str]]]] = None
+        self._index_lock = threading.Lock()
+        # Chunks retrieved ahead of time for the suggested questions, keyed by (question, k)
+        self._prefetched: Dict[Tuple[str, int], List[str]] = {}
         
-        # Add vector store for RAG
-        self.vector_store = VectorStore()
+        # Vector store for RAG, created with the first document
+        self._vector_store = None
+
+    @property
+    def vector_store(self):
+        # Imported here, the vector store pulls in numpy and the text splitter
+        from .vector_store import VectorStore
+
+        if self._vector_store is None:
+            self._vector_store = VectorStore()
+        return self._vector_store
         
 
-    def extract_text_ocr(self, file_name: str, file_type: str, file_bytes: bytes) -> Optional[str]:
-        files = {'file': file_bytes}  
-        response = requests.post("http://localhost:8000/analyze/", files=files)
-        if response.status_code == 200:  
-            response = response.json()["text"]
-            return response
+    def analyze(self, file_name: str, file_type: str, file: BinaryIO, mode: str = "read") -> Optional[Dict]:
+        """
+        Text of the document with its id in the backend store and its token
+        estimate. The layout mode adds the pages and tables of the document.
+        """
+        # Streamed from the uploaded file, no copy of the document is made for the request
+        body = MultipartUpload([("file", file_name, file_type, file)], {"mode": mode})
+        headers = {**trace_headers(), "Content-Type": body.content_type}
+        response = requests.post("http://localhost:8000/analyze/", data=body, headers=headers)
+        if response.status_code == 200:
+            return response.json()
 
+    def extract_text_ocr(self, file_name: str, file_type: str, file: BinaryIO) -> Optional[str]:
+        result = self.analyze(file_name, file_type, file)
+        if result:
+            return result["text"]
 
-    def process_new_document(self, file_name: str, file_type: str, file_bytes: bytes) -> None:
+    def process_new_document(self, file_name: str, file_type: str, file: BinaryIO, index: bool = True) -> None:
+        """
+        Extract the document and embed its chunks. With index=False the
+        embedding is left to index_document, so the caller can run it
+        alongside the summary instead of before it.
+        """
         # Extract text and reset states as before
-        self.document_text = self.extract_text_ocr(file_name, file_type, file_bytes)
+        result = self.analyze(file_name, file_type, file, OCR_MODE) or {}
+        self.document_text = result.get("text")
+        self.document_id = result.get("document_id")
+        # Estimated by the backend with the extraction, no need to post the text back
+        self.token_count = result.get("nb_tokens")
+        units = None
+        if result.get("layout"):
+            # Imported here, the vector store pulls in numpy and the text splitter
+            from .vector_store import table_chunks
+
+            self.tables = result["layout"]["tables"]
+            # The running text is split, each table is indexed as chunks of whole rows
+            text = "\n".join(result["layout"]["paragraphs"])
+            units = [chunk for table in self.tables for chunk in table_chunks(table["rows"], table["header_rows"])]
+        else:
+            self.tables = []
+            text = self.document_text
         self.summary = None
         self.suggested_questions = None
         self.messages = []
-        self.token_count = None
+        self.last_sync = None
+        self._prefetched = {}
         
         # Add document to vector store if text was extracted successfully
         if self.document_text:
-            # Clear previous document's embeddings
-            self.vector_store.clear()
-            
-            # Add new document with metadata
-            self.vector_store.add_document(
-                self.document_text,
-                metadata={
-                    'source': file_name,
-                    'type': file_type,
-                    'timestamp': datetime.now().isoformat()
-                }
-            )
+            metadata = {
+                'source': file_name,
+                'type': file_type,
+                'timestamp': datetime.now().isoformat()
+            }
+            self._pending_index = (text, metadata, units)
+            if index:
+                self.index_document()
+        else:
+            self._pending_index = None
+
+    def index_document(self) -> Optional[Dict[str, int]]:
+        """
+        Embed the chunks of the document extracted last, once. A caller
+        arriving while another thread embeds them waits for it to finish.
+        """
+        with self._index_lock:
+            if self._pending_index is not None:
+                text, metadata, units = self._pending_index
+                # Replaces the previous document, only the chunks that changed are embedded
+                self.last_sync = self.vector_store.sync_document(text, metadata=metadata, units=units)
+                self._pending_index = None
+        return self.last_sync
+
+    def prefetch_chunks(self, queries: List[str], k: int = NUM_CHUNKS_TO_RETRIEVE) -> None:
+        """
+        Retrieve the chunks of likely questions in one batched request, so
+        asking one of them skips the embedding of the query.
+        """
+        queries = [query for query in queries if query and (query, k) not in self._prefetched]
+        if not queries:
+            return
+        self.index_document()
+        for query, chunks in zip(queries, self.vector_store.get_relevant_chunks_batch(queries, k)):
+            self._prefetched[(query, k)] = chunks
+
+    def process_batch(self, files: List[Tuple[str, str, BinaryIO]]) -> Iterator[Dict]:
+        """
+        Extract and summarize several files with one /analyze_batch/ request.
+        The backend streams one result per file as it finishes, each result is
+        yielded to the caller and its text embedded in the background right
+        away, so the index fills while the other files are still in OCR.
+        The files are then handled as one document, their texts and summaries
+        joined under their names.
+        """
+        self.document_text = None
+        self.document_id = None
+        self.summary = None
+        self.suggested_questions = None
+        self.messages = []
+        self.token_count = None
+        self.documents = {}
+        self.last_sync = None
+        self._pending_index = None
+        self._prefetched = {}
+        self.vector_store.clear()
+
+        body = MultipartUpload([("files", name, file_type, file) for name, file_type, file in files], {"summarize": "true"})
+        headers = {**trace_headers(), "Content-Type": body.content_type}
+        futures = []
+        with ThreadPoolExecutor(max_workers=BATCH_EMBED_CONCURRENCY) as executor:
+            with requests.post("http://localhost:8000/analyze_batch/", data=body, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    result = json.loads(line)
+                    self.documents[result["index"]] = result
+                    if result.get("text"):
+                        metadata = {
+                            'source': result["file_name"],
+                            'type': files[result["index"]][1],
+                            'timestamp': datetime.now().isoformat()
+                        }
+                        futures.append(executor.submit(self.vector_store.add_document, result["text"], metadata, False))
+                    yield result
+            for future in futures:
+                future.result()
+
+        # Upload order, not completion order
+        done = [self.documents[i] for i in range(len(files)) if self.documents.get(i, {}).get("text")]
+        if done:
+            self.document_text = "\n\n".join(f"# {d['file_name']}\n\n{d['text']}" for d in done)
+            self.summary = "\n\n".join(f"{d['file_name']}: {d['summary']}" for d in done if d.get("summary")) or None
+            self.token_count = sum(d.get("nb_tokens", 0) for d in done)
 
     def get_relevant_chunks(self, query: str, k: int = NUM_CHUNKS_TO_RETRIEVE) -> List[str]:
         """
@@ -60,12 +254,20 @@ class DocumentProcessor:
         if not self.document_text:
             raise ValueError("No document has been processed yet")
             
-        return self.vector_store.get_relevant_chunks(query, k)
+        start = time.perf_counter()
+        chunks = self._prefetched.get((query, k))
+        if chunks is None:
+            # Waits for the chunks of the document if they are still being embedded
+            self.index_document()
+            chunks = self.vector_store.get_relevant_chunks(query, k)
+        # Reported to the backend metrics with the answer request
+        self.last_retrieval_seconds = time.perf_counter() - start
+        return chunks
 
     def cleanup(self):
         """Clean up resources when shutting down the application"""
-        if hasattr(self, 'vector_store'):
-            self.vector_store.clear()
+        if self._vector_store is not None:
+            self._vector_store.clear()
 
     def health_check(self) -> bool:
         """Check if all components are healthy and operational"""
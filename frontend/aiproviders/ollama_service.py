@@ -1,9 +1,13 @@
+import time
+import json
 import requests
 
-from typing import List, Optional, Generator
+from typing import Any, Dict, List, Optional, Generator
 from dataclasses import dataclass, field
 
-from .config import TOKEN_THRESHOLD
+from .config import TOKEN_THRESHOLD, READY_TIMEOUT, READY_POLL_INTERVAL
+from .config import MAX_BUSY_RETRIES, MAX_RETRY_AFTER
+from .tracing import trace_headers
 
 
 @dataclass
@@ -19,15 +23,68 @@ class StreamResponse:
 
 
 class OllamaService:
-    def __init__(self):
+    def __init__(self, session_id: Optional[str] = None):
         self._available_models: Optional[List[str]] = None
         self.TOKEN_THRESHOLD = TOKEN_THRESHOLD
+        # Lets the backend scheduler share the models fairly between sessions
+        self.headers = {"X-Session-Id": session_id} if session_id else {}
 
-    def _estimate_tokens(self, text: str) -> int:
-        response = requests.post("http://localhost:8000/estimate_tokens/", json={"content": text})
+    def _post(self, url: str, payload: dict, stream: bool = False) -> requests.Response:
+        """
+        POST to the backend, waiting and retrying when the scheduler answers 429.
+        The last response is returned as is once the retries are exhausted.
+        """
+        for attempt in range(MAX_BUSY_RETRIES + 1):
+            response = requests.post(url, json=payload, headers={**self.headers, **trace_headers()}, stream=stream)
+            if response.status_code != 429 or attempt == MAX_BUSY_RETRIES:
+                return response
+            retry_after = int(response.headers.get("Retry-After", 1))
+            time.sleep(min(retry_after, MAX_RETRY_AFTER))
+        return response
+
+    def _post_document(
+        self, url: str, payload: dict, text: Optional[str], document_id: Optional[str], stream: bool = False
+    ) -> requests.Response:
+        """
+        POST a request about a document by its id, so the backend reads the text
+        it stored at extraction. When it no longer has it (evicted or restarted),
+        the text is posted instead.
+        """
+        if document_id:
+            response = self._post(url, {**payload, "document_id": document_id}, stream=stream)
+            if response.status_code != 404 or text is None:
+                return response
+            response.close()
+        return self._post(url, {**payload, "content": text}, stream=stream)
+
+    def is_ready(self) -> bool:
+        """Check whether the backend finished preloading its models"""
+        try:
+            return requests.get("http://localhost:8000/ready").status_code == 200
+        except requests.exceptions.ConnectionError:
+            return False
+
+    def wait_until_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+        """Block until the backend is ready or the timeout expires"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.is_ready():
+                return True
+            time.sleep(READY_POLL_INTERVAL)
+        return False
+
+    def estimate_tokens(self, text: str, document_id: Optional[str] = None) -> int:
+        """Token count of the document, estimated by the backend"""
+        response = self._post_document("http://localhost:8000/estimate_tokens/", {}, text, document_id)
         nb_tokens = int(response.json()["nb_tokens"])
         return nb_tokens
 
+    def extractive_summary(self, text: str, document_id: Optional[str] = None) -> str:
+        """Key sentences of the document picked by Azure Text Analytics"""
+        response = self._post_document("http://localhost:8000/summarize/", {}, text, document_id)
+        response.raise_for_status()
+        return str(response.json()["summary"])
+
     @property
     def available_models(self) -> List[str]:
         if self._available_models is None:
@@ -41,7 +98,7 @@ class OllamaService:
     def get_best_model(self) -> Optional[str]:
         """Get the best available model optimized for memory usage"""
         try:
-            response = requests.get("http://localhost:8000/get_best_model/")
+            response = requests.get("http://localhost:8000/get_best_model/", headers=trace_headers())
             if response.status_code == 200:
                 return response.json()["best_model"]
             return None
@@ -52,15 +109,41 @@ class OllamaService:
             return models[0] if models else None
 
 
+    def summarize(
+        self, text: str, model_name: str, document_id: Optional[str] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Abstractive summary with the local model. Yields the backend events as they
+        arrive: "plan", one "partial" per summarized chunk, one "sentence" per
+        sentence of the summary as it is written, then "summary" or "error".
+        """
+        try:
+            with self._post_document(
+                "http://localhost:8000/summarize_llm/",
+                {"model_name": model_name or self.get_best_model()},
+                text,
+                document_id,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    yield {"event": "error", "detail": f"Summarization unavailable (HTTP {response.status_code})"}
+                    return
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        except Exception as e:
+            print(f"Error summarizing: {e}")
+            yield {"event": "error", "detail": str(e)}
+
     def generate_questions(self, model_name: str, summary: str) -> List[str]:
         # Use best available model if no model specified or model is problematic
         if not model_name:
             model_name = self.get_best_model()
             
         try:
-            response = requests.post(
+            response = self._post(
                 "http://localhost:8000/generate_questions/", 
-                json={"model_name": model_name, "content": summary}
+                {"model_name": model_name, "content": summary}
             )
             
             if response.status_code == 200:
@@ -70,9 +153,9 @@ class OllamaService:
                 # If the request failed, try with the best available model
                 best_model = self.get_best_model()
                 if best_model and best_model != model_name:
-                    response = requests.post(
+                    response = self._post(
                         "http://localhost:8000/generate_questions/", 
-                        json={"model_name": best_model, "content": summary}
+                        {"model_name": best_model, "content": summary}
                     )
                     if response.status_code == 200:
                         return response.json()["questions"]
@@ -97,45 +180,85 @@ class OllamaService:
         self,
         question: str,
         relevant_chunks: List[str],
-        model_name: str
+        model_name: str,
+        retrieval_seconds: Optional[float] = None,
+        request_id: Optional[str] = None
     ) -> Generator[StreamResponse, None, None]:
+        """
+        Stream the answer as the backend generates it. Closing the generator closes
+        the connection, which stops the generation on the backend; cancel(request_id)
+        stops it from another run of the script.
+        """
         # Use best available model if no model specified
         if not model_name:
             model_name = self.get_best_model()
-            
+
+        payload = {
+            "question": question,
+            "relevant_chunks": relevant_chunks,
+            "model_name": model_name,
+            "retrieval_seconds": retrieval_seconds,
+            "stream": True,
+            "request_id": request_id
+        }
         try:
-            response = requests.post(
-                "http://localhost:8000/generate_answer", 
-                json={"question": question, "relevant_chunks": relevant_chunks, "model_name": model_name}
-            )
-            
+            response = self._post("http://localhost:8000/generate_answer/", payload, stream=True)
+
             if response.status_code != 200:
                 # Try with best available model if the request failed
                 best_model = self.get_best_model()
                 if best_model and best_model != model_name:
-                    response = requests.post(
-                        "http://localhost:8000/generate_answer", 
-                        json={"question": question, "relevant_chunks": relevant_chunks, "model_name": best_model}
+                    response.close()
+                    response = self._post(
+                        "http://localhost:8000/generate_answer/",
+                        {**payload, "model_name": best_model, "retrieval_seconds": None},
+                        stream=True
                     )
                 
+                if response.status_code == 429:
+                    response.close()
+                    yield StreamResponse(
+                        content="The assistant is busy answering other questions. Please try again in a moment.",
+                        is_error=True,
+                        error_message="Server busy, please retry later"
+                    )
+                    return
                 if response.status_code != 200:
+                    response.close()
                     yield StreamResponse(
                         content="I apologize, but I'm currently experiencing technical difficulties. Please try again later.",
                         is_error=True,
                         error_message="Model unavailable due to memory constraints"
                     )
                     return
-            
-            stream = response.json()["answer"]
-            
-            first_chunk = True
-            for chunk in stream:
-                if 'content' in chunk['message']:
-                    response = StreamResponse(content=chunk['message']['content'])
-                    if first_chunk:
-                        response.relevant_chunks = relevant_chunks
-                        first_chunk = False
-                    yield response
+
+            with response:
+                first_chunk = True
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "retry_after" in chunk:
+                        # The queue filled up after the backend admitted the request
+                        yield StreamResponse(
+                            content="The assistant is busy answering other questions. Please try again in a moment.",
+                            is_error=True,
+                            error_message=f"Server busy, please retry in {chunk['retry_after']}s"
+                        )
+                        return
+                    if "error" in chunk:
+                        yield StreamResponse(
+                            content="I apologize, but I encountered an error while generating the answer. Please try again.",
+                            is_error=True,
+                            error_message=chunk["error"]
+                        )
+                        return
+                    if 'message' in chunk and chunk['message']['content']:
+                        response_chunk = StreamResponse(content=chunk['message']['content'])
+                        if first_chunk:
+                            response_chunk.relevant_chunks = relevant_chunks
+                            first_chunk = False
+                        yield response_chunk
                     
         except Exception as e:
             print(f"Error generating answer: {e}")
@@ -143,4 +266,13 @@ class OllamaService:
                 content="I apologize, but I encountered an error while generating the answer. Please try again.",
                 is_error=True,
                 error_message=str(e)
-            )
\ No newline at end of file
+            )
+
+    def cancel(self, request_id: str) -> bool:
+        """Stop a generation still running on the backend"""
+        try:
+            response = requests.post(f"http://localhost:8000/cancel/{request_id}", headers=trace_headers(), timeout=5)
+            return response.status_code == 200 and response.json()["cancelled"]
+        except requests.exceptions.RequestException as e:
+            print(f"Error cancelling generation: {e}")
+            return False
\ No newline at end of file
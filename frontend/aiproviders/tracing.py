@@ -0,0 +1,150 @@
+import json
+import time
+import queue
+import secrets
+import threading
+import contextvars
+import requests
+
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .config import TRACE_EXPORTER, TRACE_JSONL_PATH, TRACE_OTLP_ENDPOINT
+
+TRACE_SERVICE_NAME = "knowledge-frontend"
+TRACE_FLUSH_INTERVAL = 1.0  # Seconds between exports, spans are written off the page run
+
+# (trace_id, span_id, action) of the user action being handled
+_current_action: contextvars.ContextVar = contextvars.ContextVar("trace_action", default=None)
+
+
+def trace_headers() -> Dict[str, str]:
+    """
+    Headers propagating the current user action to the backend, using the
+    W3C traceparent format so the backend spans join the same trace.
+    """
+    context = _current_action.get()
+    if context is None:
+        return {}
+    trace_id, span_id, action = context
+    return {"traceparent": f"00-{trace_id}-{span_id}-01", "X-Trace-Action": action}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Encode span records, the lines of the JSONL export, as an OTLP/HTTP JSON
+    export request. The same encoder as the backend's, the frontend runs
+    apart from the backend package so it has its own copy.
+    """
+    services: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        services.setdefault(s["service"], []).append(s)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+            "scopeSpans": [{
+                "scope": {"name": "knowledge"},
+                "spans": [{
+                    "traceId": s["trace_id"],
+                    "spanId": s["span_id"],
+                    "parentSpanId": s["parent_span_id"] or "",
+                    "name": s["name"],
+                    "kind": 1,
+                    "startTimeUnixNano": str(s["start_time_unix_nano"]),
+                    "endTimeUnixNano": str(s["end_time_unix_nano"]),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                    "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+                } for s in records],
+            }],
+        } for service, records in services.items()]
+    }
+
+
+class _SpanExporter:
+    """Writes finished spans from a background thread, so a page run never waits for the collector"""
+
+    def __init__(self):
+        self._spans: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+        self._spans.put(span)
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        spans = [self._spans.get()]
+        deadline = time.monotonic() + TRACE_FLUSH_INTERVAL
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                spans.append(self._spans.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return spans
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        try:
+            if TRACE_EXPORTER == "otlp":
+                requests.post(TRACE_OTLP_ENDPOINT, json=to_otlp(spans), timeout=5)
+            else:
+                with open(TRACE_JSONL_PATH, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(s, default=str) + "\n" for s in spans)
+        except Exception as e:
+            print(f"Failed to export {len(spans)} spans: {e}")
+
+    def _run(self) -> None:
+        while True:
+            self._write(self._drain())
+
+
+_exporter = _SpanExporter()
+
+
+@contextmanager
+def traced_action(action: str):
+    """
+    Start a new trace for a user action. Every backend request made inside
+    the block carries its trace id, and the action itself is exported as the root span.
+    """
+    if TRACE_EXPORTER not in ("jsonl", "otlp"):
+        yield None
+        return
+
+    trace_id, span_id = secrets.token_hex(16), secrets.token_hex(8)
+    token = _current_action.set((trace_id, span_id, action))
+    start = time.time_ns()
+    error = None
+    try:
+        yield trace_id
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_action.reset(token)
+        end = time.time_ns()
+        _exporter.export({
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_span_id": None,
+            "name": f"action.{action}",
+            "service": TRACE_SERVICE_NAME,
+            "start_time_unix_nano": start,
+            "end_time_unix_nano": end,
+            "duration_ms": round((end - start) / 1e6, 3),
+            "attributes": {"user.action": action},
+            "error": error,
+        })
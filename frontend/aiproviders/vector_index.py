@@ -0,0 +1,293 @@
+from typing import List, Dict, Optional
+import os
+import tempfile
+import numpy as np
+
+# Rows converted to float32 at a time when scoring a float16 or int8 matrix,
+# numpy has no fast matrix product for them so a whole-matrix product would crawl
+BLOCK_ROWS = 4096
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def truncate_embeddings(vectors: np.ndarray, dimensions: Optional[int]) -> np.ndarray:
+    """
+    Matryoshka truncation as documented for nomic-embed-text v1.5: layer norm
+    over the full vector, keep the first dimensions, then normalize again.
+    """
+    if not dimensions or dimensions >= vectors.shape[1]:
+        return vectors
+    mean = vectors.mean(axis=1, keepdims=True)
+    std = vectors.std(axis=1, keepdims=True)
+    std[std == 0] = 1.0
+    return ((vectors - mean) / std)[:, :dimensions]
+
+
+class NumpyIndex:
+    """
+    Exact nearest-neighbor search over normalized embeddings kept in one
+    contiguous matrix. Scoring every chunk is a single matrix product, which
+    for a document of a few thousand chunks is faster than an ANN index query.
+
+    The matrix can be stored compactly: float16, or int8 with one scale per
+    vector, and truncated to fewer dimensions. The full-precision vectors are
+    then kept in a memory-mapped file, read back only to rerank the best
+    rerank_candidates chunks and when moving the vectors to another index.
+    """
+    name = "numpy"
+
+    def __init__(
+        self,
+        precision: str = "float32",
+        dimensions: Optional[int] = None,
+        rerank_candidates: int = 0,
+        directory: Optional[str] = None
+    ):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision}, expected one of {PRECISIONS}")
+        self.precision = precision
+        self.dimensions = dimensions
+        self.rerank_candidates = rerank_candidates
+        self.directory = directory
+        self.compact = precision != "float32" or bool(dimensions)
+        self.matrix: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.full: Optional[np.memmap] = None
+        self._full_path: Optional[str] = None
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        # Row of each id, to replace a chunk added again instead of storing it twice
+        self._rows: Dict[str, int] = {}
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _compress(self, vectors: np.ndarray):
+        """Stored form of normalized full vectors, with the int8 scales"""
+        vectors = self._normalize(truncate_embeddings(vectors, self.dimensions))
+        if self.precision == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(self.precision), None
+
+    def _append_full(self, vectors: np.ndarray) -> None:
+        if self._full_path is None:
+            handle, self._full_path = tempfile.mkstemp(prefix="vectors-", suffix=".f32", dir=self.directory)
+            os.close(handle)
+        with open(self._full_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        rows = len(self.ids) + len(vectors)
+        self.full = np.memmap(self._full_path, dtype=np.float32, mode="r", shape=(rows, vectors.shape[1]))
+
+    def _replace_full(self, rows: List[int], vectors: np.ndarray) -> None:
+        full = np.memmap(self._full_path, dtype=np.float32, mode="r+", shape=self.full.shape)
+        full[rows] = vectors
+        full.flush()
+
+    def add(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: Optional[List[Dict]] = None
+    ) -> None:
+        """Add the chunks, replacing those whose id is already there like a Chroma upsert"""
+        if not ids:
+            return
+        metadatas = metadatas or [{} for _ in ids]
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        stored, scales = self._compress(vectors)
+
+        # An id repeated in the batch keeps its last chunk
+        last = {chunk_id: position for position, chunk_id in enumerate(ids)}
+        replaced = [(position, self._rows[chunk_id]) for chunk_id, position in last.items() if chunk_id in self._rows]
+        new = [position for chunk_id, position in last.items() if chunk_id not in self._rows]
+        if replaced:
+            positions, rows = [p for p, _ in replaced], [r for _, r in replaced]
+            self.matrix[rows] = stored[positions]
+            if scales is not None:
+                self.scales[rows] = scales[positions]
+            if self.full is not None:
+                self._replace_full(rows, vectors[positions])
+            for position, row in replaced:
+                self.documents[row] = documents[position]
+                self.metadatas[row] = metadatas[position]
+        if not new:
+            return
+
+        vectors, stored = vectors[new], stored[new]
+        scales = None if scales is None else scales[new]
+        if self.compact:
+            self._append_full(vectors)
+        if self.matrix is None:
+            self.matrix = np.ascontiguousarray(stored)
+            self.scales = scales
+        else:
+            self.matrix = np.concatenate([self.matrix, stored])
+            self.scales = None if scales is None else np.concatenate([self.scales, scales])
+        for position in new:
+            self._rows[ids[position]] = len(self.ids)
+            self.ids.append(ids[position])
+            self.documents.append(documents[position])
+            self.metadatas.append(metadatas[position])
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        """Column indices of the k best scores of each row, best first"""
+        k = min(k, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(k), (scores.shape[0], 1))
+        # Only the k selected chunks are sorted
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+        return np.take_along_axis(top, order, axis=1)
+
+    def query(self, query_embeddings: List[List[float]], k: int) -> List[List[str]]:
+        """Documents of the k most similar chunks for each query, most similar first"""
+        return [[self.documents[i] for i in row] for row in self.query_indices(query_embeddings, k)]
+
+    def query_indices(self, query_embeddings: List[List[float]], k: int) -> List[List[int]]:
+        if self.matrix is None or k <= 0:
+            return [[] for _ in query_embeddings]
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        compact_queries = self._normalize(truncate_embeddings(queries, self.dimensions))
+        # Cosine similarity, which ranks like the L2 distance on normalized vectors
+        scores = self._scores(compact_queries)
+        if not (self.compact and self.rerank_candidates > k):
+            return self._top(scores, k).tolist()
+
+        candidates = self._top(scores, self.rerank_candidates)
+        results = []
+        for query, rows in zip(queries, candidates):
+            # Only the candidate rows are read from the memory-mapped file, in file order
+            rows = np.sort(rows)
+            exact = self.full[rows] @ query
+            results.append(rows[np.argsort(-exact, kind="stable")[:k]].tolist())
+        return results
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        scores = np.empty((queries.shape[0], self.matrix.shape[0]), dtype=np.float32)
+        for start in range(0, self.matrix.shape[0], BLOCK_ROWS):
+            block = self.matrix[start:start + BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + BLOCK_ROWS] = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def get(self) -> Dict[str, List]:
+        """Everything stored, with the full-precision embeddings"""
+        if self.matrix is None:
+            embeddings = []
+        elif self.full is not None:
+            embeddings = np.asarray(self.full).tolist()
+        else:
+            embeddings = self.matrix.astype(np.float32).tolist()
+        return {"ids": list(self.ids), "embeddings": embeddings, "documents": list(self.documents), "metadatas": list(self.metadatas)}
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get_ids(self) -> List[str]:
+        return list(self.ids)
+
+    def delete(self, ids: List[str]) -> None:
+        """Remove the chunks with these ids, the others keep their order"""
+        removed = set(ids)
+        keep = np.array([i not in removed for i in self.ids], dtype=bool)
+        if keep.all():
+            return
+        if not keep.any():
+            self.clear()
+            return
+        kept_ids = [i for i, k in zip(self.ids, keep) if k]
+        self.documents = [d for d, k in zip(self.documents, keep) if k]
+        self.metadatas = [m for m, k in zip(self.metadatas, keep) if k]
+        self.matrix = np.ascontiguousarray(self.matrix[keep])
+        if self.scales is not None:
+            self.scales = self.scales[keep]
+        if self.full is not None:
+            # The memory-mapped file is rewritten without the removed rows
+            full = np.array(self.full[keep])
+            self.full = None
+            os.remove(self._full_path)
+            self._full_path, self.ids = None, []
+            self._append_full(full)
+        self.ids = kept_ids
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(kept_ids)}
+
+    def clear(self) -> None:
+        self.matrix, self.scales, self.full = None, None, None
+        if self._full_path is not None:
+            os.remove(self._full_path)
+            self._full_path = None
+        self.ids, self.documents, self.metadatas = [], [], []
+        self._rows = {}
+
+    def memory_bytes(self) -> int:
+        """Bytes of the in-memory matrix, the memory-mapped full vectors stay on disk"""
+        if self.matrix is None:
+            return 0
+        return self.matrix.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def __del__(self):
+        if getattr(self, "_full_path", None) and os.path.exists(self._full_path):
+            os.remove(self._full_path)
+
+
+class ChromaIndex:
+    """Approximate (HNSW) search through a ChromaDB collection, for large indexes"""
+    name = "chroma"
+
+    def __init__(self, client, collection):
+        self.collection = collection
+        self.max_batch_size = client.get_max_batch_size()
+
+    def add(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: Optional[List[Dict]] = None
+    ) -> None:
+        if not ids:
+            return
+        # Chroma rejects empty metadata dictionaries
+        metadatas = None if not metadatas or not any(metadatas) else metadatas
+        step = self.max_batch_size
+        for i in range(0, len(ids), step):
+            # Upsert, so adding chunks again after an interrupted ingestion does not duplicate them
+            self.collection.upsert(
+                ids=ids[i:i + step],
+                embeddings=embeddings[i:i + step],
+                documents=documents[i:i + step],
+                metadatas=metadatas[i:i + step] if metadatas else None
+            )
+
+    def query(self, query_embeddings: List[List[float]], k: int) -> List[List[str]]:
+        results = self.collection.query(query_embeddings=query_embeddings, n_results=k)
+        return results["documents"]
+
+    def get(self) -> Dict[str, List]:
+        return self.collection.get(include=["embeddings", "documents", "metadatas"])
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get_ids(self) -> List[str]:
+        return self.collection.get(include=[])["ids"]
+
+    def delete(self, ids: List[str]) -> None:
+        for i in range(0, len(ids), self.max_batch_size):
+            self.collection.delete(ids=ids[i:i + self.max_batch_size])
+
+    def clear(self) -> None:
+        all_ids = self.collection.get()["ids"]
+        if all_ids:
+            self.collection.delete(ids=all_ids)
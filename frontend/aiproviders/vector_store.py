@@ -1,7 +1,7 @@
 from typing import List, Dict, Optional
-import chromadb
-from chromadb.config import Settings
-import ollama
+import hashlib
+import requests
+import threading
 import uuid
 
 # Try to import the text splitter with fallback
@@ -51,8 +51,67 @@ from .config import (
     CHUNK_OVERLAP,
     EMBEDDING_MODEL,
     CHROMA_PERSIST_DIRECTORY,
-    SEPARATORS
+    SEPARATORS,
+    HNSW_SPACE,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF,
+    VECTOR_BACKEND,
+    NUMPY_MAX_CHUNKS,
+    EMBEDDING_PRECISION,
+    EMBEDDING_DIMENSIONS,
+    RERANK_CANDIDATES,
+    VECTOR_CACHE_DIRECTORY,
+    TABLE_CHUNK_SIZE
 )
+from .tracing import trace_headers
+from .vector_index import NumpyIndex, ChromaIndex
+
+def hnsw_metadata(
+    space: str = HNSW_SPACE,
+    m: int = HNSW_M,
+    construction_ef: int = HNSW_CONSTRUCTION_EF,
+    search_ef: int = HNSW_SEARCH_EF
+) -> Dict:
+    """ChromaDB collection metadata configuring its HNSW index"""
+    return {
+        "hnsw:space": space,
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+    }
+
+def content_ids(chunks: List[str]) -> List[str]:
+    """Ids derived from the chunk text, repeated chunks are numbered"""
+    ids, seen = [], {}
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk.encode()).hexdigest()[:32]
+        seen[digest] = seen.get(digest, -1) + 1
+        ids.append(f"{digest}-{seen[digest]}")
+    return ids
+
+
+def table_chunks(rows: List[List[str]], header_rows: List[int] = (), chunk_size: int = TABLE_CHUNK_SIZE) -> List[str]:
+    """
+    A table as chunks of whole rows, one line per row with the cells separated
+    by pipes. Each chunk starts with the header rows, so it can be understood
+    and retrieved on its own.
+    """
+    lines = [" | ".join(cell.replace("\n", " ") for cell in row) for row in rows]
+    header = [lines[i] for i in header_rows]
+    body = [line for i, line in enumerate(lines) if i not in set(header_rows)]
+    header_size = sum(len(line) + 1 for line in header)
+    chunks, current, size = [], [], header_size
+    for line in body:
+        if current and size + len(line) + 1 > chunk_size:
+            chunks.append("\n".join(header + current))
+            current, size = [], header_size
+        current.append(line)
+        size += len(line) + 1
+    if current or not chunks:
+        chunks.append("\n".join(header + current))
+    return chunks
+
 
 class VectorStoreError(Exception):
     """Base exception class for vector store operations"""
@@ -67,38 +126,99 @@ class ChromaDBInitializationError(VectorStoreError):
     pass
 
 class VectorStore:
-    def __init__(self, persist_directory: str = CHROMA_PERSIST_DIRECTORY):
+    def __init__(
+        self,
+        persist_directory: str = CHROMA_PERSIST_DIRECTORY,
+        backend: str = VECTOR_BACKEND,
+        persistent: bool = False,
+        collection_name: str = "document_chunks"
+    ):
         """
-        Initialize the vector store with ChromaDB for storage.
-        Creates a new collection if it doesn't exist, or uses existing one.
+        Initialize the vector store. ChromaDB takes about a second to import,
+        its client and collection are only created once the chroma backend is
+        used, right away for backend="chroma", on migration for "auto".
         
         Args:
             persist_directory: Directory where ChromaDB will store its data
+            backend: "numpy" for exact in-process search, "chroma" for the HNSW
+                index, or "auto" to use numpy up to NUMPY_MAX_CHUNKS chunks
+            persistent: Write the Chroma collection to persist_directory, so it
+                outlives the process (the bulk ingestion writes its index there)
+            collection_name: Name of the Chroma collection
+        """
+        self.persist_directory = persist_directory
+        self.persistent = persistent
+        self.collection_name = collection_name
+        self.backend = backend
+        self._chroma_index: Optional[ChromaIndex] = None
+        # Documents of a batch are embedded in parallel, only adding them to the index is serialized
+        self._lock = threading.Lock()
+        self.numpy_index = NumpyIndex(
+            EMBEDDING_PRECISION, EMBEDDING_DIMENSIONS, RERANK_CANDIDATES, VECTOR_CACHE_DIRECTORY
+        )
+        self.index = self.chroma_index if backend == "chroma" else self.numpy_index
+        
+        # Initialize text splitter with configured parameters
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=SEPARATORS
+        )
+
+    @property
+    def chroma_index(self) -> ChromaIndex:
+        """The ChromaDB index, created on first use"""
+        if self._chroma_index is None:
+            try:
+                import chromadb
+                from chromadb.config import Settings
+
+                # Initialize ChromaDB client with persistence
+                if self.persistent:
+                    client = chromadb.PersistentClient(
+                        path=self.persist_directory, settings=Settings(anonymized_telemetry=False)
+                    )
+                else:
+                    client = chromadb.Client(Settings(
+                        persist_directory=self.persist_directory,
+                        anonymized_telemetry=False
+                    ))
+                
+                # Always use get_or_create_collection instead of separate get/create
+                collection = client.get_or_create_collection(
+                    name=self.collection_name,
+                    metadata={"description": "Document chunks for RAG", **hnsw_metadata()}
+                )
+                self._chroma_index = ChromaIndex(client, collection)
+            except Exception as e:
+                raise ChromaDBInitializationError(f"Failed to initialize ChromaDB: {str(e)}")
+        return self._chroma_index
+
+    def _split(self, text: str) -> List[str]:
+        """Chunks of the text, without the pieces made only of punctuation the splitter leaves"""
+        return [chunk for chunk in self.text_splitter.split_text(text) if any(c.isalnum() for c in chunk)]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts through the backend, which batches them with the
+        requests of other sessions into a single Ollama call.
         """
+        if not texts:
+            return []
         try:
-            # Initialize ChromaDB client with persistence
-            self.client = chromadb.Client(Settings(
-                persist_directory=persist_directory,
-                anonymized_telemetry=False
-            ))
-            
-            # Always use get_or_create_collection instead of separate get/create
-            self.collection = self.client.get_or_create_collection(
-                name="document_chunks",
-                metadata={"description": "Document chunks for RAG"}
+            response = requests.post(
+                "http://localhost:8000/embed/",
+                json={"texts": texts, "model_name": EMBEDDING_MODEL},
+                headers=trace_headers()
             )
-            
-            # Initialize text splitter with configured parameters
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=CHUNK_SIZE,
-                chunk_overlap=CHUNK_OVERLAP,
-                separators=SEPARATORS
-            )
-            
+            response.raise_for_status()
+            return response.json()["embeddings"]
         except Exception as e:
-            raise ChromaDBInitializationError(f"Failed to initialize ChromaDB: {str(e)}")
+            raise EmbeddingModelNotFoundError(
+                f"Failed to generate embeddings with model {EMBEDDING_MODEL}: {str(e)}"
+            )
 
-    def add_document(self, text: str, metadata: Optional[Dict] = None) -> None:
+    def add_document(self, text: str, metadata: Optional[Dict] = None, replace: bool = True) -> None:
         """
         Process a document by splitting it into chunks and storing with embeddings.
         This method handles the entire process of document ingestion:
@@ -109,43 +229,111 @@ class VectorStore:
         Args:
             text: The document text to process
             metadata: Optional metadata to store with the chunks
+            replace: Remove the documents already stored, False adds to them
         """
         try:
             # Split text into chunks
-            chunks = self.text_splitter.split_text(text)
+            chunks = self._split(text)
             
-            # Generate embeddings for each chunk
-            embeddings = []
-            for chunk in chunks:
-                try:
-                    response = ollama.embeddings(
-                        model=EMBEDDING_MODEL,
-                        prompt=chunk
-                    )
-                    embeddings.append(response["embedding"])
-                except Exception as e:
-                    raise EmbeddingModelNotFoundError(
-                        f"Failed to generate embeddings with model {EMBEDDING_MODEL}: {str(e)}"
-                    )
+            # Generate embeddings for all chunks in one batched request
+            embeddings = self.embed(chunks)
             
             # Generate unique IDs for chunks
             ids = [str(uuid.uuid4()) for _ in chunks]
             
-            # Clear existing content before adding new
-            self.delete_all()
-            
-            # Add chunks and embeddings to ChromaDB
-            self.collection.add(
-                embeddings=embeddings,
-                documents=chunks,
-                ids=ids,
-                metadatas=[metadata or {} for _ in chunks]
-            )
+            with self._lock:
+                # Clear existing content before adding new
+                if replace:
+                    self.delete_all()
+                
+                # Add chunks and embeddings to the index
+                self._add(ids, embeddings, chunks, [metadata or {} for _ in chunks])
         except Exception as e:
             if not isinstance(e, VectorStoreError):
                 raise VectorStoreError(f"Failed to add document: {str(e)}")
             raise
 
+    def sync_document(self, text: str, metadata: Optional[Dict] = None, units: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Make the store hold this document only, updating it incrementally.
+        Chunks are identified by their content: the ones already stored are
+        kept with their embeddings, only new chunks are embedded and only the
+        chunks missing from this version are deleted. The splitter only moves
+        the boundaries next to an edit, so uploading a revision of the current
+        document costs in proportion to the edit.
+        
+        Args:
+            text: The document text
+            metadata: Optional metadata stored with the new chunks
+            units: Chunks stored as they are, like the rows of a table, instead of being split
+        
+        Returns:
+            Number of chunks added, removed and kept
+        """
+        try:
+            chunks = self._split(text) + [unit for unit in units or [] if unit.strip()]
+            ids = content_ids(chunks)
+            with self._lock:
+                stored = set(self.index.get_ids())
+            new = [(i, chunk) for i, chunk in zip(ids, chunks) if i not in stored]
+            removed = list(stored - set(ids))
+            
+            # Only the new chunks are embedded
+            embeddings = self.embed([chunk for _, chunk in new])
+            
+            with self._lock:
+                if removed:
+                    self.index.delete(removed)
+                self._add(
+                    [i for i, _ in new], embeddings, [chunk for _, chunk in new], [metadata or {} for _ in new]
+                )
+            return {"added": len(new), "removed": len(removed), "kept": len(ids) - len(new)}
+        except Exception as e:
+            if not isinstance(e, VectorStoreError):
+                raise VectorStoreError(f"Failed to update document: {str(e)}")
+            raise
+
+    def add_chunks(
+        self,
+        ids: List[str],
+        chunks: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict]
+    ) -> None:
+        """
+        Add chunks that were split and embedded by the caller, for bulk
+        ingestion which batches the embedding requests of many documents.
+        Chunks already stored under the same ids are overwritten.
+        """
+        try:
+            with self._lock:
+                self._add(ids, embeddings, chunks, metadatas)
+        except Exception as e:
+            raise VectorStoreError(f"Failed to add chunks: {str(e)}")
+
+    def delete_chunks(self, ids: List[str]) -> None:
+        """Delete chunks by id, the ones not stored are ignored"""
+        if not ids:
+            return
+        try:
+            with self._lock:
+                self.index.delete(ids)
+        except Exception as e:
+            raise VectorStoreError(f"Failed to delete chunks: {str(e)}")
+
+    def _add(self, ids: List[str], embeddings: List[List[float]], chunks: List[str], metadatas: List[Dict]) -> None:
+        """Add to the current index, moving to Chroma once an auto index outgrows NUMPY_MAX_CHUNKS"""
+        if (
+            self.backend == "auto"
+            and self.index is self.numpy_index
+            and self.numpy_index.count() + len(ids) > NUMPY_MAX_CHUNKS
+        ):
+            existing = self.numpy_index.get()
+            self.chroma_index.add(existing["ids"], existing["embeddings"], existing["documents"], existing["metadatas"])
+            self.numpy_index.clear()
+            self.index = self.chroma_index
+        self.index.add(ids, embeddings, chunks, metadatas)
+
     def get_relevant_chunks(self, query: str, k: int = 3) -> List[str]:
         """
         Retrieve the most relevant chunks for a query using embedding similarity.
@@ -161,20 +349,23 @@ class VectorStore:
         Returns:
             List of relevant text chunks, ordered by relevance
         """
+        return self.get_relevant_chunks_batch([query], k)[0]
+
+    def get_relevant_chunks_batch(self, queries: List[str], k: int = 3) -> List[List[str]]:
+        """
+        Retrieve the most relevant chunks for several queries at once:
+        one embedding request and one index search for all of them.
+        
+        Args:
+            queries: The search queries
+            k: Number of chunks to retrieve per query
+        
+        Returns:
+            For each query, the list of relevant text chunks ordered by relevance
+        """
         try:
-            # Generate embedding for the query
-            query_embedding = ollama.embeddings(
-                model=EMBEDDING_MODEL,
-                prompt=query
-            )["embedding"]
-            
-            # Query ChromaDB for similar chunks
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=k
-            )
-            
-            return results["documents"][0]  # Return the text of the chunks
+            query_embeddings = self.embed(queries)
+            return self.index.query(query_embeddings, k)
             
         except Exception as e:
             if not isinstance(e, VectorStoreError):
@@ -183,17 +374,16 @@ class VectorStore:
 
     def delete_all(self) -> None:
         """
-        Remove all documents from the collection.
-        This method first retrieves all document IDs and then deletes them,
-        which is the proper way to clear a ChromaDB collection.
+        Remove all documents from the index.
+        An auto store starts over with the numpy index.
         """
         try:
-            # Get all document IDs in the collection
-            all_ids = self.collection.get()["ids"]
-            
-            # If there are any documents, delete them
-            if all_ids:
-                self.collection.delete(ids=all_ids)
+            self.numpy_index.clear()
+            # A Chroma index that was never created has nothing to clear
+            if self._chroma_index is not None and self._chroma_index.count():
+                self._chroma_index.clear()
+            if self.backend == "auto":
+                self.index = self.numpy_index
         except Exception as e:
             raise VectorStoreError(f"Failed to clear vector store: {str(e)}")
 
@@ -208,20 +398,17 @@ class VectorStore:
     def health_check(self) -> bool:
         """
         Check if the vector store is healthy and operational.
-        Verifies that both ChromaDB and the embedding model are working.
+        Verifies that both the index and the embedding model are working.
         
         Returns:
             True if everything is working, raises exception otherwise
         """
         try:
-            # Check if ChromaDB is responsive
-            self.collection.count()
+            # Check if the index is responsive
+            self.index.count()
             
             # Check if embedding model is available
-            ollama.embeddings(
-                model=EMBEDDING_MODEL,
-                prompt="test"
-            )
+            self.embed(["test"])
             
             return True
         except Exception as e:
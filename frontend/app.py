@@ -1,3 +1,4 @@
+import uuid
 import streamlit as st
 from aiproviders import DocumentProcessor, OllamaService
 from ui.components.header import HeaderComponent
@@ -17,8 +18,11 @@ class KnowlEdgeApp:
 
     def __init__(self):
         """Initialize core components of the application."""
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = str(uuid.uuid4())
+
         self.document_processor = DocumentProcessor()
-        self.ollama_service = OllamaService()
+        self.ollama_service = OllamaService(session_id=st.session_state.session_id)
         
         # Initialize services
         self.state_manager = StateManager(self.document_processor, self.ollama_service)
@@ -42,6 +46,18 @@ class KnowlEdgeApp:
         HeaderComponent.render()
         self.state_manager.initialize_session_state()
 
+        # Wait for the backend to preload the models instead of letting the first question pay for it
+        if not st.session_state.backend_ready:
+            if st.session_state.ready_checked:
+                # Waited once already, the later reruns only check without blocking the page
+                st.session_state.backend_ready = self.ollama_service.is_ready()
+            else:
+                with st.spinner("Loading models..."):
+                    st.session_state.backend_ready = self.ollama_service.wait_until_ready()
+                st.session_state.ready_checked = True
+            if not st.session_state.backend_ready:
+                st.warning("The backend is still loading models, the first answers may be slower.")
+
         # Model selection
         available_models = self.ollama_service.available_models
         if available_models:
@@ -54,15 +70,25 @@ class KnowlEdgeApp:
             st.warning("No Ollama models found. Please ensure Ollama is running and models are installed.")
             return
 
-        # File upload
-        uploaded_file = st.file_uploader(
-            "Upload a pdf, docx, or txt file",
-            type=["pdf", "docx", "txt"],
-            key="file_uploader"
-        )
+        # File upload, several files are extracted and summarized concurrently by the backend
+        if st.toggle("Upload several files", key="batch_mode"):
+            uploaded_files = st.file_uploader(
+                "Upload pdf, docx, or txt files",
+                type=["pdf", "docx", "txt"],
+                accept_multiple_files=True,
+                key="batch_file_uploader"
+            )
+            if uploaded_files:
+                self.ui_coordinator.handle_batch_upload(uploaded_files)
+        else:
+            uploaded_file = st.file_uploader(
+                "Upload a pdf, docx, or txt file",
+                type=["pdf", "docx", "txt"],
+                key="file_uploader"
+            )
 
-        if uploaded_file is not None:
-            self.ui_coordinator.handle_file_upload(uploaded_file)
+            if uploaded_file is not None:
+                self.ui_coordinator.handle_file_upload(uploaded_file)
 
         # Display content if document is loaded
         if st.session_state.processor.document_text and st.session_state.selected_model:
@@ -70,9 +96,8 @@ class KnowlEdgeApp:
             col1, col2 = st.columns(2)
             self.document_viewer.display_text_and_summary(col1, col2)
 
-            if st.session_state.processor.summary and not st.session_state.summary_in_progress:
-                st.subheader("Suggested Questions")
-                self.question_suggestions.display_suggested_questions()
+            st.subheader("Suggested Questions")
+            self.question_suggestions.display_suggested_questions()
 
             st.subheader("Chat")
             self.chat_interface.handle_chat_interaction()
@@ -0,0 +1,295 @@
+"""
+Bulk ingestion of a directory of documents into the persistent Chroma index.
+
+Text is extracted locally (PyPDF2, python-docx) in a process pool, and only
+PDFs without a text layer, the scans, are sent to Azure Document Intelligence
+through the backend. Chunks of many documents are embedded together through
+the backend /embed/ endpoint and written to a persistent Chroma collection.
+Finished documents are recorded in a checkpoint file, so an interrupted run
+picks up where it stopped. Usage, from the repository root with the backend
+running:
+
+    python frontend/ingest.py ./reports
+    python frontend/ingest.py ./reports --workers 4 --collection reports --restart
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from aiproviders.config import (
+    CHROMA_PERSIST_DIRECTORY, CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS,
+    INGEST_COLLECTION, INGEST_EMBED_BATCH, INGEST_MIN_CHARS_PER_PAGE
+)
+
+logger = logging.getLogger("ingest")
+
+FILE_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".txt": "text/plain",
+}
+
+_splitter = None
+
+
+def _split(text: str) -> List[str]:
+    global _splitter
+    if _splitter is None:
+        from aiproviders.vector_store import RecursiveCharacterTextSplitter
+        _splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS
+        )
+    return _splitter.split_text(text)
+
+
+def extract_text(path: str, min_chars_per_page: int = INGEST_MIN_CHARS_PER_PAGE) -> Optional[str]:
+    """Text of the document from its local parser, None when it needs OCR"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".txt":
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+    if extension == ".docx":
+        import docx
+
+        return "\n".join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+
+    from PyPDF2 import PdfReader
+
+    pages = [page.extract_text() or "" for page in PdfReader(path).pages]
+    # A scan has no text layer, or only a few stray characters per page
+    if sum(len(page.strip()) for page in pages) < min_chars_per_page * max(1, len(pages)):
+        return None
+    return "\n\n".join(pages)
+
+
+def parse_document(path: str) -> Tuple[str, Optional[List[str]], float]:
+    """Process pool task: extract and chunk a document, chunks are None when it needs OCR"""
+    start = time.perf_counter()
+    text = extract_text(path)
+    chunks = None if text is None else _split(text)
+    return path, chunks, time.perf_counter() - start
+
+
+def chunk_document(path: str, text: str) -> Tuple[str, List[str], float]:
+    """Process pool task: chunk the OCR text of a scan"""
+    start = time.perf_counter()
+    return path, _split(text), time.perf_counter() - start
+
+
+def chunk_ids(path: str, count: int) -> List[str]:
+    """Stable ids, re-ingesting a document overwrites its chunks instead of duplicating them"""
+    prefix = hashlib.sha1(path.encode()).hexdigest()[:16]
+    return [f"{prefix}:{i}" for i in range(count)]
+
+
+class Checkpoint:
+    """Documents already written to a collection, keyed by absolute path"""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.done: Dict[str, Dict] = {}
+        self.failed: Dict[str, str] = {}
+        # Chunks last written per document, kept on a restart too, their collection is not emptied
+        self.chunk_counts: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            # Checkpoints written before the counts had their own map only have them in "done"
+            self.chunk_counts = {p: entry.get("chunks", 0) for p, entry in state.get("done", {}).items()}
+            self.chunk_counts.update(state.get("chunks", {}))
+            if not restart:
+                self.done = state.get("done", {})
+
+    @staticmethod
+    def signature(path: str) -> Dict:
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def is_done(self, path: str) -> bool:
+        entry = self.done.get(path)
+        return entry is not None and {k: entry[k] for k in ("size", "mtime")} == self.signature(path)
+
+    def mark_done(self, path: str, chunks: int) -> None:
+        self.done[path] = {**self.signature(path), "chunks": chunks}
+        self.chunk_counts[path] = chunks
+
+    def save(self) -> None:
+        # Written aside then renamed, an interruption never leaves a truncated checkpoint
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"done": self.done, "failed": self.failed, "chunks": self.chunk_counts}, f)
+        os.replace(temporary, self.path)
+
+
+class Stats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.documents = 0
+        self.chunks = 0
+        self.ocr_documents = 0
+        self.failed = 0
+        self.seconds = {"parse": 0.0, "ocr": 0.0, "embed": 0.0, "write": 0.0}
+
+    def report(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.seconds.items())
+        return (
+            f"{self.documents} documents ({self.ocr_documents} with OCR, {self.failed} failed), "
+            f"{self.chunks} chunks in {elapsed:.1f}s: {self.documents / elapsed:.2f} docs/s, "
+            f"{self.chunks / elapsed:.1f} chunks/s [{stages}]"
+        )
+
+
+class Ingestion:
+    def __init__(self, args):
+        from aiproviders import DocumentProcessor
+        from aiproviders.vector_store import VectorStore
+
+        self.args = args
+        self.root = os.path.abspath(args.directory)
+        self.processor = DocumentProcessor()
+        self.store = VectorStore(args.persist_directory, backend="chroma", persistent=True, collection_name=args.collection)
+        # Next to the index it describes, a new index starts from scratch
+        os.makedirs(args.persist_directory, exist_ok=True)
+        checkpoint = args.checkpoint or os.path.join(args.persist_directory, f"{args.collection}_ingest_checkpoint.json")
+        self.checkpoint = Checkpoint(checkpoint, args.restart)
+        self.stats = Stats()
+        self.pending: List[Tuple[str, List[str]]] = []
+        self.pending_chunks = 0
+
+    def discover(self) -> List[str]:
+        paths = []
+        for directory, _, names in os.walk(self.root):
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                if os.path.splitext(name)[1].lower() in FILE_TYPES and not self.checkpoint.is_done(path):
+                    paths.append(path)
+        return sorted(paths)
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _ocr(self, path: str) -> Tuple[str, Optional[str], float]:
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            text = self.processor.extract_text_ocr(os.path.basename(path), FILE_TYPES[".pdf"], f)
+        return path, text, time.perf_counter() - start
+
+    def _fail(self, path: str, error: BaseException) -> None:
+        logger.error(f"Failed to ingest {path}: {error}")
+        self.checkpoint.failed[path] = str(error)
+        self.stats.failed += 1
+
+    def _queue(self, path: str, chunks: List[str]) -> None:
+        self.pending.append((path, chunks))
+        self.pending_chunks += len(chunks)
+        if self.pending_chunks >= self.args.embed_batch:
+            self.flush()
+
+    def flush(self) -> None:
+        """Embed the queued documents in one request, write them, then checkpoint them"""
+        if not self.pending:
+            return
+        texts = [chunk for _, chunks in self.pending for chunk in chunks]
+        start = time.perf_counter()
+        embeddings = self.store.embed(texts)
+        self.stats.seconds["embed"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        ids, metadatas = [], []
+        timestamp = datetime.now().isoformat()
+        for path, chunks in self.pending:
+            extension = os.path.splitext(path)[1].lower()
+            ids.extend(chunk_ids(path, len(chunks)))
+            metadatas.extend({"source": self._relative(path), "type": FILE_TYPES[extension], "timestamp": timestamp} for _ in chunks)
+        # A new version with fewer chunks leaves the last ones of the previous version behind
+        stale = [
+            i for path, chunks in self.pending
+            for i in chunk_ids(path, self.checkpoint.chunk_counts.get(path, 0))[len(chunks):]
+        ]
+        self.store.delete_chunks(stale)
+        self.store.add_chunks(ids, texts, embeddings, metadatas)
+        self.stats.seconds["write"] += time.perf_counter() - start
+
+        for path, chunks in self.pending:
+            self.checkpoint.mark_done(path, len(chunks))
+        self.checkpoint.save()
+        self.stats.documents += len(self.pending)
+        self.stats.chunks += len(texts)
+        self.pending, self.pending_chunks = [], 0
+        logger.info(self.stats.report())
+
+    def run(self) -> Stats:
+        paths = self.discover()
+        logger.info(f"{len(paths)} documents to ingest, {len(self.checkpoint.done)} already done")
+        window = self.args.workers * 4
+        with ProcessPoolExecutor(max_workers=self.args.workers) as pool, \
+                ThreadPoolExecutor(max_workers=self.args.ocr_workers) as ocr_pool:
+            # Future -> (stage, path), a scan goes through parse, ocr then chunk
+            running: Dict[Future, Tuple[str, str]] = {}
+            remaining = iter(paths)
+
+            def submit_next():
+                # Keep a bounded number of documents in flight, their chunks wait in memory
+                while len(running) < window:
+                    path = next(remaining, None)
+                    if path is None:
+                        return
+                    running[pool.submit(parse_document, path)] = ("parse", path)
+
+            submit_next()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, path = running.pop(future)
+                    try:
+                        _, result, seconds = future.result()
+                    except Exception as e:
+                        self._fail(path, e)
+                        continue
+                    self.stats.seconds["ocr" if stage == "ocr" else "parse"] += seconds
+                    if stage == "parse" and result is None:
+                        # No text layer, the scan goes to Document Intelligence
+                        running[ocr_pool.submit(self._ocr, path)] = ("ocr", path)
+                    elif stage == "ocr":
+                        self.stats.ocr_documents += 1
+                        if result:
+                            running[pool.submit(chunk_document, path, result)] = ("chunk", path)
+                        else:
+                            self._fail(path, RuntimeError("Document Intelligence returned no text"))
+                    else:
+                        self._queue(path, result)
+                submit_next()
+        self.flush()
+        self.checkpoint.save()
+        return self.stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory walked for pdf, docx and txt files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes parsing and chunking")
+    parser.add_argument("--ocr-workers", type=int, default=2, help="Scans sent to Document Intelligence at once")
+    parser.add_argument("--embed-batch", type=int, default=INGEST_EMBED_BATCH, help="Chunks per /embed/ request")
+    parser.add_argument("--persist-directory", default=CHROMA_PERSIST_DIRECTORY)
+    parser.add_argument("--collection", default=INGEST_COLLECTION)
+    parser.add_argument("--checkpoint", help="Checkpoint file, next to the collection in --persist-directory by default")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and ingest everything again")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    stats = Ingestion(args).run()
+    print(stats.report())
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
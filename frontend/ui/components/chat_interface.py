@@ -1,6 +1,7 @@
+import uuid
 import streamlit as st
 from datetime import datetime
-from aiproviders import Message, OllamaService
+from aiproviders import Message, OllamaService, traced_action
 
 class ChatInterface:
     def __init__(self, ollama_service: OllamaService):
@@ -10,6 +11,13 @@ class ChatInterface:
         """
         Handle individual questions using RAG-enhanced answer generation.
         """
+        # A question asked while the previous answer is still generating replaces it,
+        # the previous generation is stopped so it does not hold the model
+        if st.session_state.answer_request_id:
+            self.ollama_service.cancel(st.session_state.answer_request_id)
+        request_id = str(uuid.uuid4())
+        st.session_state.answer_request_id = request_id
+
         timestamp = datetime.now()
         st.session_state.processor.messages.append(Message("user", question, timestamp))
 
@@ -50,7 +58,9 @@ class ChatInterface:
                     for response in self.ollama_service.generate_answer(
                         question,
                         relevant_chunks_for_display,
-                        st.session_state.selected_model
+                        st.session_state.selected_model,
+                        retrieval_seconds=st.session_state.processor.last_retrieval_seconds,
+                        request_id=request_id
                     ):
                         if response.is_error:
                             st.error(response.error_message)
@@ -67,6 +77,8 @@ class ChatInterface:
 
                 except Exception as e:
                     st.error(f"Error generating answer: {e}")
+                # Not reached when a rerun interrupts the answer, the next question then cancels it
+                st.session_state.answer_request_id = None
 
             # Correctly set context_displayed to True only after expander is rendered
             if relevant_chunks_for_display:
@@ -103,9 +115,11 @@ class ChatInterface:
 
         # Handle new question or input
         if st.session_state.needs_answer and st.session_state.current_question:
-            self._handle_question(st.session_state.current_question)
+            with traced_action("ask"):
+                self._handle_question(st.session_state.current_question)
             st.session_state.current_question = None
             st.session_state.needs_answer = False
 
         if prompt := st.chat_input("Ask a question about the document:"):
-            self._handle_question(prompt)
\ No newline at end of file
+            with traced_action("ask"):
+                self._handle_question(prompt)
\ No newline at end of file
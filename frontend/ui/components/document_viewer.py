@@ -1,7 +1,6 @@
-import time
 import streamlit as st
 from aiproviders import OllamaService
-import requests
+from aiproviders.config import SUMMARY_MODES, PIPELINE_POLL_INTERVAL
 
 class DocumentViewer:
     def __init__(self, ollama_service: OllamaService):
@@ -9,74 +8,129 @@ class DocumentViewer:
 
     def display_text_and_summary(self, col1, col2):
         """
-        Display the document text and generate/display its summary.
-        Shows the original text in one column and its summary in another,
-        handling token estimation and summary generation.
+        Display the document text and its summary.
+        Shows the original text in one column and its summary in another.
+        Both are filled by the document pipeline, each section refreshes
+        itself until its stages are done.
         """
+        pipeline = st.session_state.pipeline
         with col1:
-            if st.session_state.processor.token_count is None and st.session_state.processor.document_text:
-                estimated_tokens = self.ollama_service._estimate_tokens(
-                    st.session_state.processor.document_text
-                )
-                st.session_state.processor.token_count = estimated_tokens
-
-            with st.expander("Extracted Text" + (
-                f" (Estimated tokens: {st.session_state.processor.token_count:,})"
-                if st.session_state.processor.token_count is not None else ""
-            ), expanded=True):
-                if st.session_state.extracting_text:
-                    st.info("Azure Document Intelligence is extracting content...")
-                else:
-                    st.text_area(
-                        "",
-                        st.session_state.processor.document_text,
-                        height=300,
-                        key="extracted_text"
-                    )
+            pending = pipeline is not None and (pipeline.running("tokens") or pipeline.running("index"))
+            st.fragment(self._display_text, run_every=PIPELINE_POLL_INTERVAL if pending else None)(pending)
 
         with col2:
+            st.radio(
+                "Summary mode",
+                list(SUMMARY_MODES),
+                horizontal=True,
+                key="summary_mode",
+                on_change=self._restart_summary,
+                disabled=st.session_state.summary_in_progress
+            )
+            pending = pipeline is not None and pipeline.running("summary")
             with st.expander("Summary", expanded=True):
-                if not st.session_state.processor.summary and not st.session_state.summary_in_progress:
-                    text_area_placeholder = st.empty()
-                    with st.spinner("Azure Text Analytics Summary is running..."):
-                        st.session_state.summary_in_progress = True
-                        full_response = ""
+                st.fragment(self._display_summary, run_every=PIPELINE_POLL_INTERVAL if pending else None)(pending)
+
+    def _display_text(self, polling: bool):
+        pipeline = st.session_state.pipeline
+        if polling and not (pipeline.running("tokens") or pipeline.running("index")):
+            # Done, the page is rerun to stop refreshing this section
+            st.rerun()
+        with st.expander("Extracted Text" + (
+            f" (Estimated tokens: {st.session_state.processor.token_count:,})"
+            if st.session_state.processor.token_count is not None else ""
+        ), expanded=True):
+            if st.session_state.extracting_text:
+                st.info("Azure Document Intelligence is extracting content...")
+            else:
+                st.text_area(
+                    "",
+                    st.session_state.processor.document_text,
+                    height=300,
+                    key="extracted_text"
+                )
+        if pipeline is None:
+            return
+        sync = st.session_state.processor.last_sync
+        if pipeline.running("index"):
+            st.caption("Indexing the document for the chat...")
+        elif pipeline.error("index"):
+            st.warning(f"Indexing failed, it is retried with the first question: {pipeline.error('index')}")
+        elif sync and sync["kept"]:
+            st.caption(
+                f"File updated: {sync['added']} chunks embedded, {sync['removed']} removed, "
+                f"{sync['kept']} unchanged"
+            )
 
-                        try:
-                            text_content = st.session_state.processor.document_text
-                            text_summary = requests.post("http://localhost:8000/summarize/", json={"content": text_content})
-                            response = str(text_summary.json()["summary"])
+    def _display_summary(self, polling: bool):
+        pipeline = st.session_state.pipeline
+        if pipeline is not None and pipeline.running("summary"):
+            st.session_state.summary_in_progress = True
+            self._display_summary_progress(pipeline.summary_events)
+            return
+        st.session_state.summary_in_progress = False
+        if polling:
+            # The summary just arrived, the page is rerun to stop refreshing and enable the summary mode
+            st.rerun()
 
-                            for response in response.split():
-                                full_response += response + " "
-                                text_area_placeholder.text_area(
-                                    "",
-                                    value=full_response,
-                                    height=300,
-                                    key=f"summary_stream_{st.session_state.update_counter}"
-                                )
-                                st.session_state.update_counter += 1
-                                time.sleep(0.05)
+        if pipeline is not None and pipeline.error("summary"):
+            st.error(f"Summarization failed: {pipeline.error('summary')}")
+        st.text_area(
+            "",
+            value=st.session_state.processor.summary or "",
+            height=300,
+            key="summary_display"
+        )
 
-                            st.session_state.processor.summary = full_response
-                        finally:
-                            st.session_state.summary_in_progress = False
-                else:
-                    st.text_area(
-                        "",
-                        value=st.session_state.processor.summary or "",
-                        height=300,
-                        key="summary_display"
-                    )
+        if st.session_state.processor.summary:
+            if st.button("Regenerate Summary"):
+                self._restart_summary()
+                st.rerun()
+            st.download_button(
+                label="Download Summary",
+                data=st.session_state.processor.summary,
+                file_name="summary.txt",
+                mime="text/plain"
+            )
+
+    @staticmethod
+    def _display_summary_progress(events):
+        """
+        The summary as far as it is written, after the partial summaries of
+        a long document while its chunks are summarized by the local model.
+        Redrawn at each refresh of the section, not at each event, so a long
+        summary costs a few redraws rather than one per sentence.
+        """
+        partials = {}
+        sentences = []
+        progress = None
+        for event in list(events):
+            if event["event"] == "plan" and event["chunks"] > 1:
+                progress = (0.0, f"Summarizing {event['chunks']} parts...")
+            elif event["event"] == "partial":
+                # The first level summarizes the chunks, the next ones combine them
+                stage = "Summarizing parts" if event["level"] == 0 else "Combining summaries"
+                progress = (event["done"] / event["total"], f"{stage}: {event['done']}/{event['total']}")
+                if event["level"] == 0:
+                    partials[event["index"]] = event["summary"]
+            elif event["event"] == "sentence":
+                sentences.append(event["text"])
+        if sentences:
+            st.info("Writing the summary...")
+        elif progress is not None:
+            st.progress(progress[0], text=progress[1])
+        else:
+            running = "Azure Text Analytics Summary" if SUMMARY_MODES[st.session_state.summary_mode] == "azure" else "The summary"
+            st.info(f"{running} is running...")
+        text = "".join(sentences) or "\n\n".join(partials[i] for i in sorted(partials))
+        if text:
+            # Not a widget, a text area would be a new widget at each redraw
+            with st.container(height=300):
+                st.markdown(text)
 
-                if st.session_state.processor.summary:
-                    if st.button("Regenerate Summary"):
-                        st.session_state.processor.summary = None
-                        st.session_state.summary_in_progress = False
-                        st.rerun()
-                    st.download_button(
-                        label="Download Summary",
-                        data=st.session_state.processor.summary,
-                        file_name="summary.txt",
-                        mime="text/plain"
-                    )
\ No newline at end of file
+    @staticmethod
+    def _restart_summary():
+        pipeline = st.session_state.pipeline
+        if pipeline is not None:
+            pipeline.summarize(st.session_state.selected_model, SUMMARY_MODES[st.session_state.summary_mode])
+            st.session_state.summary_in_progress = True
@@ -1,5 +1,6 @@
 import streamlit as st
 from aiproviders import OllamaService
+from aiproviders.config import PIPELINE_POLL_INTERVAL
 
 class QuestionSuggestions:
     def __init__(self, ollama_service: OllamaService):
@@ -7,33 +8,37 @@ class QuestionSuggestions:
 
     def display_suggested_questions(self):
         """
-        Generate and display suggested questions about the document.
+        Display the questions suggested about the document. They are
+        generated by the document pipeline once the summary is there, the
+        section refreshes itself until then.
         """
-        if not st.session_state.questions_generated:
-            if not st.session_state.processor.suggested_questions and not st.session_state.summary_in_progress:
-                with st.spinner("Generating suggested questions..."):
-                    try:
-                        questions = self.ollama_service.generate_questions(
-                            st.session_state.selected_model,
-                            summary=st.session_state.processor.summary
-                        )
-                        st.session_state.processor.suggested_questions = questions
-                        st.session_state.questions_generated = True
-                    except Exception as e:
-                        st.error(f"Error generating questions: {e}")
-                        return
+        pipeline = st.session_state.pipeline
+        pending = pipeline is not None and pipeline.running("questions")
+        st.fragment(self._display_questions, run_every=PIPELINE_POLL_INTERVAL if pending else None)(pending)
+
+    def _display_questions(self, polling: bool):
+        pipeline = st.session_state.pipeline
+        if pipeline is not None and pipeline.running("questions"):
+            if st.session_state.summary_in_progress or pipeline.running("summary"):
+                st.info("Please wait for the summary to be generated before generating questions.")
+            else:
+                st.info("Generating suggested questions...")
+            return
+        if pipeline is not None and pipeline.error("questions"):
+            st.error(f"Error generating questions: {pipeline.error('questions')}")
+            return
+        st.session_state.questions_generated = True
+        if polling:
+            # The questions just arrived, the page is rerun to stop refreshing this section
+            st.rerun()
 
         # Display logic
-        if st.session_state.questions_generated and st.session_state.processor.suggested_questions:
+        if st.session_state.processor.suggested_questions:
             for i, question in enumerate(st.session_state.processor.suggested_questions):
                 if question and st.button(f"📝 {question}", key=f"question_button_{i}"):
                     st.session_state.current_question = question
                     st.session_state.needs_answer = True
                     st.session_state.display_chunks = True
                     st.rerun()
-        elif st.session_state.questions_generated and not st.session_state.processor.suggested_questions:
+        elif st.session_state.processor.summary:
             st.info("No suggested questions were generated.")
-        elif not st.session_state.questions_generated and not st.session_state.summary_in_progress:
-            st.info("Generating suggested questions...")
-        elif st.session_state.summary_in_progress:
-            st.info("Please wait for the summary to be generated before generating questions.")
\ No newline at end of file
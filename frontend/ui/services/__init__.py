@@ -1,7 +1,9 @@
 from .state_manager import StateManager
+from .document_pipeline import DocumentPipeline
 from .ui_coordinator import UICoordinator
 
 __all__ = [
     'StateManager',
+    'DocumentPipeline',
     'UICoordinator'
 ]
\ No newline at end of file
@@ -0,0 +1,149 @@
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from aiproviders import DocumentProcessor, OllamaService, traced_action
+
+STAGES = ("tokens", "index", "summary", "questions", "retrieval")
+
+
+class DocumentPipeline:
+    """
+    The work that follows the extraction of a document, started at once
+    instead of one page section after the other:
+
+    - tokens: the token estimate, when /analyze/ did not return it;
+    - index: the embedding of the chunks, needed by the chat;
+    - summary: the extractive or abstractive summary;
+    - questions: the suggested questions, once the summary is there;
+    - retrieval: the chunks of the suggested questions, once they and the
+      index are there, so asking one of them skips the query embedding.
+
+    Each stage runs in a thread and only talks to the backend and fills the
+    processor. The page sections poll their stage and show its result as
+    soon as it is there, so the document is usable after the slowest stage
+    instead of the sum of them.
+    """
+
+    def __init__(self, processor: DocumentProcessor, ollama_service: OllamaService):
+        self.processor = processor
+        self.ollama_service = ollama_service
+        # Events of the running summary, read by the viewer while it is generated
+        self.summary_events: List[Dict[str, Any]] = []
+        # Seconds from the start of the pipeline to the end of each stage
+        self.timings: Dict[str, float] = {}
+        self._futures: Dict[str, Future] = {}
+        self._cancelled = threading.Event()
+        self._started = time.perf_counter()
+        # One thread per stage, the stages waiting for another one hold theirs
+        self._executor = ThreadPoolExecutor(max_workers=len(STAGES) + 1, thread_name_prefix="pipeline")
+
+    def start(self, model_name: str, summary_mode: str) -> None:
+        self._started = time.perf_counter()
+        if self.processor.token_count is None:
+            self._submit("tokens", self._count_tokens)
+        self._submit("index", self.processor.index_document)
+        # Batch uploads come with their summaries
+        if not self.processor.summary:
+            self._submit("summary", self._summarize, model_name, summary_mode, self.summary_events)
+        self._submit("questions", self._suggest_questions, model_name, self.summary_events)
+        self._submit("retrieval", self._prefetch_chunks, self.summary_events)
+
+    def summarize(self, model_name: str, summary_mode: str) -> None:
+        """
+        (Re)start the summary and the questions that follow it, the results of
+        the previous summary and of its questions are dropped
+        """
+        self.processor.summary = None
+        self.processor.suggested_questions = None
+        self.summary_events = []
+        self._submit("summary", self._summarize, model_name, summary_mode, self.summary_events)
+        self._submit("questions", self._suggest_questions, model_name, self.summary_events)
+        self._submit("retrieval", self._prefetch_chunks, self.summary_events)
+
+    def running(self, stage: str) -> bool:
+        future = self._futures.get(stage)
+        return future is not None and not future.done()
+
+    def error(self, stage: str) -> Optional[BaseException]:
+        future = self._futures.get(stage)
+        if future is None or not future.done() or future.cancelled():
+            return None
+        return future.exception()
+
+    def wait(self, stage: str, timeout: Optional[float] = None) -> None:
+        """Wait for a stage to finish, also when it is restarted meanwhile"""
+        while True:
+            future = self._futures.get(stage)
+            if future is None:
+                return
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+            if future is self._futures.get(stage):
+                return
+
+    def cancel(self) -> None:
+        """Drop the results of the stages still running, the document was replaced"""
+        self._cancelled.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, stage: str, fn: Callable, *args) -> None:
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                if not self._cancelled.is_set():
+                    self.timings[stage] = time.perf_counter() - self._started
+
+        self._futures[stage] = self._executor.submit(run)
+
+    def _count_tokens(self) -> None:
+        with traced_action("estimate_tokens"):
+            nb_tokens = self.ollama_service.estimate_tokens(self.processor.document_text, self.processor.document_id)
+        if not self._cancelled.is_set():
+            self.processor.token_count = nb_tokens
+
+    def _summarize(self, model_name: str, summary_mode: str, events: List[Dict[str, Any]]) -> None:
+        if summary_mode == "llm":
+            with traced_action("summarize_llm"):
+                for event in self.ollama_service.summarize(
+                    self.processor.document_text, model_name, self.processor.document_id
+                ):
+                    if self._cancelled.is_set() or events is not self.summary_events:
+                        return
+                    events.append(event)
+                    if event["event"] == "summary":
+                        self.processor.summary = event["summary"]
+                    elif event["event"] == "error":
+                        raise RuntimeError(event["detail"])
+        else:
+            with traced_action("summarize"):
+                summary = self.ollama_service.extractive_summary(
+                    self.processor.document_text, self.processor.document_id
+                )
+            if not self._cancelled.is_set() and events is self.summary_events:
+                self.processor.summary = summary
+
+    def _stale(self, events: List[Dict[str, Any]]) -> bool:
+        """The document was replaced or its summary restarted since the stage was submitted"""
+        return self._cancelled.is_set() or events is not self.summary_events
+
+    def _suggest_questions(self, model_name: str, events: List[Dict[str, Any]]) -> None:
+        self.wait("summary")
+        if self._stale(events) or not self.processor.summary:
+            return
+        with traced_action("suggest_questions"):
+            questions = self.ollama_service.generate_questions(model_name, summary=self.processor.summary)
+        if not self._stale(events):
+            self.processor.suggested_questions = questions
+
+    def _prefetch_chunks(self, events: List[Dict[str, Any]]) -> None:
+        self.wait("index")
+        self.wait("questions")
+        if self._stale(events) or not self.processor.suggested_questions or self.error("index"):
+            return
+        with traced_action("prefetch_chunks"):
+            self.processor.prefetch_chunks(self.processor.suggested_questions)
@@ -1,5 +1,7 @@
 import streamlit as st
 from aiproviders import DocumentProcessor, OllamaService
+from aiproviders.config import SUMMARY_MODES
+from .document_pipeline import DocumentPipeline
 
 class StateManager:
     def __init__(self, document_processor: DocumentProcessor, ollama_service: OllamaService):
@@ -17,12 +19,17 @@ class StateManager:
             'needs_answer': False,
             'current_question': None,
             'uploaded_file_name': None,
+            'uploaded_file_id': None,
             'summary_in_progress': False,
             'questions_generated': False,
-            'update_counter': 0,
             'display_chunks': False,
             'chat_history_with_context': [],
-            'extracting_text': False
+            'extracting_text': False,
+            'answer_request_id': None,
+            'backend_ready': False,
+            'ready_checked': False,
+            'summary_mode': next(iter(SUMMARY_MODES)),
+            'pipeline': None
         }
 
         for key, initial_value in initial_states.items():
@@ -31,8 +38,20 @@ class StateManager:
 
     def reset_document_states(self):
         """Reset states for new document processing"""
-        st.session_state.update_counter = 0
         st.session_state.summary_in_progress = False
         st.session_state.questions_generated = False
         st.session_state.processor.suggested_questions = None
-        st.session_state.chat_history_with_context = []
\ No newline at end of file
+        st.session_state.chat_history_with_context = []
+
+    def stop_pipeline(self):
+        """Drop the results still coming for the previous document"""
+        if st.session_state.pipeline is not None:
+            st.session_state.pipeline.cancel()
+            st.session_state.pipeline = None
+
+    def start_pipeline(self):
+        """Start the summary, embedding and suggested questions of the document just extracted, side by side"""
+        self.stop_pipeline()
+        pipeline = DocumentPipeline(st.session_state.processor, self.ollama_service)
+        pipeline.start(st.session_state.selected_model, SUMMARY_MODES[st.session_state.summary_mode])
+        st.session_state.pipeline = pipeline
\ No newline at end of file
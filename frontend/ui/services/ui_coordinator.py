@@ -1,34 +1,80 @@
 import streamlit as st
+from aiproviders import traced_action
 
 class UICoordinator:
     def __init__(self, state_manager):
         self.state_manager = state_manager
 
-    def process_new_document(self, file_name: str, file_type: str, file_bytes: bytes):
+    def process_new_document(self, file_name: str, file_type: str, file):
         """
         Process a new document and reset relevant application state.
         Handles document processing and initializes RAG components.
         """
         st.session_state.extracting_text = True
+        self.state_manager.stop_pipeline()
         try:
             with st.spinner("Azure Document Intelligence is extracting content..."):
-                st.session_state.processor.process_new_document(file_name, file_type, file_bytes)
+                with traced_action("upload"):
+                    # Embedded by the pipeline, alongside the summary
+                    st.session_state.processor.process_new_document(file_name, file_type, file, index=False)
                 st.session_state.uploaded_file_name = file_name
-                st.success("New file uploaded and processed!")
+                # Streamlit gives a new id to every upload, even of a file with the same name
+                st.session_state.uploaded_file_id = getattr(file, "file_id", None)
+                st.success("New file uploaded, summarizing and indexing it...")
 
             # Reset states for new document
             self.state_manager.reset_document_states()
+            self.state_manager.start_pipeline()
 
         except Exception as e:
             st.error(f"Error processing file: {e}")
         finally:
             st.session_state.extracting_text = False
 
+    def process_batch(self, uploaded_files):
+        """
+        Process several documents at once, reporting each one as the backend finishes it.
+        """
+        st.session_state.extracting_text = True
+        self.state_manager.stop_pipeline()
+        progress = st.progress(0.0, text=f"Extracting and summarizing {len(uploaded_files)} files...")
+        try:
+            files = [(f.name, f.type, f) for f in uploaded_files]
+            with traced_action("batch_upload"):
+                for done, result in enumerate(st.session_state.processor.process_batch(files), start=1):
+                    if result.get("error"):
+                        st.warning(f"{result['file_name']}: {result['error']}")
+                    progress.progress(
+                        done / len(files),
+                        text=f"{result['file_name']} done in {result['seconds']:.1f}s ({done}/{len(files)})"
+                    )
+            st.session_state.uploaded_file_name = self._batch_name(uploaded_files)
+            st.success(f"{len(st.session_state.processor.documents)} files uploaded and processed!")
+
+            # Reset states for new document
+            self.state_manager.reset_document_states()
+            self.state_manager.start_pipeline()
+
+        except Exception as e:
+            st.error(f"Error processing files: {e}")
+        finally:
+            st.session_state.extracting_text = False
+
+    @staticmethod
+    def _batch_name(uploaded_files) -> str:
+        return "|".join(sorted(f.name for f in uploaded_files))
+
+    def handle_batch_upload(self, uploaded_files):
+        """Handle a multi-file upload, processed again only when the selection changes."""
+        if self._batch_name(uploaded_files) != st.session_state.uploaded_file_name:
+            self.process_batch(uploaded_files)
+
     def handle_file_upload(self, uploaded_file):
         """Handle file upload and document processing."""
-        if uploaded_file.name != st.session_state.uploaded_file_name:
+        # A revised version of the current file has the same name but a new file id
+        if uploaded_file.file_id != st.session_state.uploaded_file_id:
             self.process_new_document(
                 uploaded_file.name,
                 uploaded_file.type,
-                uploaded_file.getvalue()
+                uploaded_file  # Read in blocks while it is sent, getvalue() would copy it
             )
\ No newline at end of file
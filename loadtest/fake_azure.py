@@ -0,0 +1,195 @@
+"""
+Local stand-in for the Document Intelligence and Language disconnected containers.
+
+Both long-running operations behave like the real containers: the job is accepted
+with 202 and an Operation-Location header, and polling reports it as running
+until the configured latency has elapsed.
+
+    python -m loadtest.fake_azure --port 5050 --ocr-seconds 3 --summary-seconds 4
+    AZURE_DOCUMENT_ANALYSIS_ENDPOINT=http://localhost:5050 LANGUAGE_ENDPOINT=http://localhost:5050 ...
+"""
+import re
+import time
+import uuid
+import asyncio
+import argparse
+
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+class Settings:
+    ocr_seconds = 2.0  # Analysis time of one document
+    ocr_seconds_per_mb = 1.0  # Additional analysis time per MB uploaded
+    summary_queue_seconds = 0.5  # Time a Language job stays notStarted
+    summary_seconds = 3.0  # Time a Language job stays running
+    capacity = 4  # Jobs processed at once, the others wait in the queue
+    max_jobs = 0  # Jobs accepted at once (queued or running) before answering 429, 0 for no limit
+    retry_after = 1  # Seconds advertised in the Retry-After of a 429
+    scanned_sentences = 2000  # Upper bound on the text returned for a binary upload
+
+
+app = FastAPI()
+_jobs: Dict[str, Dict[str, Any]] = {}
+_capacity: Optional[asyncio.Semaphore] = None
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _capacity
+    if _capacity is None:
+        _capacity = asyncio.Semaphore(Settings.capacity)
+    return _capacity
+
+
+async def _run_job(job_id: str, queue_seconds: float, run_seconds: float) -> None:
+    await asyncio.sleep(queue_seconds)
+    async with _semaphore():
+        _jobs[job_id]["status"] = "running"
+        await asyncio.sleep(run_seconds)
+    _jobs[job_id]["status"] = "succeeded"
+
+
+def _overloaded() -> Optional[Response]:
+    """429 when the container already holds max_jobs unfinished jobs, like a saturated container"""
+    active = sum(1 for job in _jobs.values() if job["status"] in ("notStarted", "running"))
+    if Settings.max_jobs and active >= Settings.max_jobs:
+        return JSONResponse(
+            {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+            status_code=429,
+            headers={"Retry-After": str(Settings.retry_after)}
+        )
+    return None
+
+
+def _document_text(body: bytes) -> str:
+    """The uploaded text for text files, otherwise readable fragments standing in for OCR output"""
+    text = body.decode("utf-8", errors="ignore")
+    fragments = re.findall(r"[A-Za-z][A-Za-z ,.;:'\-]{20,}", text)
+    if fragments:
+        return "\n\n".join(fragments)
+    # OCR output of a scan is small next to the images, keep it bounded like a real one
+    return "Scanned document content. " * min(Settings.scanned_sentences, max(1, len(body) // 2000))
+
+
+def _analyze_result(model_id: str, content: str) -> Dict[str, Any]:
+    paragraphs, offset = [], 0
+    for paragraph in content.split("\n\n"):
+        paragraphs.append({"content": paragraph, "spans": [{"offset": offset, "length": len(paragraph)}]})
+        offset += len(paragraph) + 2
+    words, lines, position = [], [], 0
+    for match in re.finditer(r"\S+", content):
+        words.append({
+            "content": match.group(), "confidence": 0.99,
+            "span": {"offset": match.start(), "length": len(match.group())},
+        })
+        position = match.end()
+    # Ten words per line, like a dense scanned page
+    for i in range(0, len(words), 10):
+        first, last = words[i]["span"], words[min(i + 10, len(words)) - 1]["span"]
+        end = last["offset"] + last["length"]
+        lines.append({"content": content[first["offset"]:end], "polygon": [], "spans": [{"offset": first["offset"], "length": end - first["offset"]}]})
+    return {
+        "apiVersion": "2023-07-31", "modelId": model_id, "stringIndexType": "textElements",
+        "content": content,
+        "pages": [{
+            "pageNumber": 1, "angle": 0, "width": 8.5, "height": 11, "unit": "inch",
+            "spans": [{"offset": 0, "length": position}], "words": words, "lines": lines,
+        }],
+        "paragraphs": paragraphs, "tables": [], "styles": [],
+    }
+
+
+@app.post("/formrecognizer/documentModels/{model_operation}")
+async def analyze_document(model_operation: str, request: Request):
+    model_id = model_operation.split(":")[0]
+    body = await request.body()
+    if (refused := _overloaded()) is not None:
+        return refused
+    job_id = str(uuid.uuid4())
+    _jobs[job_id] = {
+        "status": "notStarted",
+        "created": time.time(),
+        "result": _analyze_result(model_id, _document_text(body)),
+    }
+    run_seconds = Settings.ocr_seconds + Settings.ocr_seconds_per_mb * len(body) / 1e6
+    asyncio.create_task(_run_job(job_id, 0, run_seconds))
+    location = f"{request.base_url}formrecognizer/documentModels/{model_id}/analyzeResults/{job_id}?api-version=2023-07-31"
+    return Response(status_code=202, headers={"Operation-Location": location, "retry-after-ms": "200"})
+
+
+@app.get("/formrecognizer/documentModels/{model_id}/analyzeResults/{job_id}")
+async def get_analyze_result(model_id: str, job_id: str):
+    job = _jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": {"code": "NotFound", "message": "Result not found"}}, status_code=404)
+    response = {"status": job["status"], "createdDateTime": "2024-01-01T00:00:00Z", "lastUpdatedDateTime": "2024-01-01T00:00:00Z"}
+    if job["status"] == "succeeded":
+        response["analyzeResult"] = job["result"]
+    return JSONResponse(response, headers={"retry-after-ms": "200"})
+
+
+def _sentences(text: str, count: int) -> List[Dict[str, Any]]:
+    sentences = re.findall(r"[^.!?]+[.!?]", text)[:count]
+    return [{"text": s.strip() + " ", "rankScore": 1.0, "offset": 0, "length": len(s)} for s in sentences]
+
+
+@app.post("/language/analyze-text/jobs")
+async def submit_language_job(request: Request):
+    body = await request.json()
+    if (refused := _overloaded()) is not None:
+        return refused
+    text = body["analysisInput"]["documents"][0]["text"]
+    count = body["tasks"][0]["parameters"].get("sentenceCount", 3)
+    job_id = str(uuid.uuid4())
+    _jobs[job_id] = {
+        "status": "notStarted",
+        "result": {"items": [{
+            "kind": "ExtractiveSummarizationLROResults", "status": "succeeded",
+            "results": {"documents": [{"id": "1", "sentences": _sentences(text, count)}], "errors": []},
+        }]},
+    }
+    asyncio.create_task(_run_job(job_id, Settings.summary_queue_seconds, Settings.summary_seconds))
+    location = f"{request.base_url}language/analyze-text/jobs/{job_id}?api-version=2023-04-01"
+    return Response(status_code=202, headers={"Operation-Location": location})
+
+
+@app.get("/language/analyze-text/jobs/{job_id}")
+async def get_language_job(job_id: str):
+    job = _jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": {"code": "NotFound"}}, status_code=404)
+    response = {"jobId": job_id, "status": job["status"], "tasks": {"completed": 0, "failed": 0, "inProgress": 1, "total": 1}}
+    if job["status"] == "succeeded":
+        response["tasks"] = {"completed": 1, "failed": 0, "inProgress": 0, "total": 1, **job["result"]}
+    return response
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Azure AI containers for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--ocr-seconds", type=float, default=Settings.ocr_seconds)
+    parser.add_argument("--ocr-seconds-per-mb", type=float, default=Settings.ocr_seconds_per_mb)
+    parser.add_argument("--summary-queue-seconds", type=float, default=Settings.summary_queue_seconds)
+    parser.add_argument("--summary-seconds", type=float, default=Settings.summary_seconds)
+    parser.add_argument("--capacity", type=int, default=Settings.capacity)
+    parser.add_argument("--max-jobs", type=int, default=Settings.max_jobs, help="Answer 429 above this many unfinished jobs")
+    parser.add_argument("--retry-after", type=int, default=Settings.retry_after)
+    args = parser.parse_args(argv)
+
+    Settings.ocr_seconds = args.ocr_seconds
+    Settings.ocr_seconds_per_mb = args.ocr_seconds_per_mb
+    Settings.summary_queue_seconds = args.summary_queue_seconds
+    Settings.summary_seconds = args.summary_seconds
+    Settings.capacity = args.capacity
+    Settings.max_jobs = args.max_jobs
+    Settings.retry_after = args.retry_after
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
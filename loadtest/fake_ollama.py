@@ -0,0 +1,276 @@
+"""
+Local stand-in for the Ollama server, for load tests without real models.
+
+Implements the endpoints used by the backend (chat, generate, embed, embeddings,
+tags, ps, show) with configurable speed. Like Ollama on a CPU-only box, each
+model serves a bounded number of requests at a time and the others wait.
+
+    python -m loadtest.fake_ollama --port 11435 --tokens-per-second 15
+    OLLAMA_HOST=http://localhost:11435 uvicorn backend.main:app --port 8000
+"""
+import json
+import asyncio
+import hashlib
+import argparse
+
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+
+EMBEDDING_DIM = 768
+# kv_bytes_per_token: f16 KV cache, 2 * layers * KV heads * head size * 2 bytes
+FAKE_MODELS = {
+    "phi3:latest": {"family": "phi3", "parameter_size": "3.8B", "quantization_level": "Q4_0", "size": 2_176_178_913,
+                    "kv_bytes_per_token": 393_216},
+    "llama3.2:1b": {"family": "llama", "parameter_size": "1.2B", "quantization_level": "Q8_0", "size": 1_321_098_329,
+                    "kv_bytes_per_token": 32_768},
+    "nomic-embed-text:latest": {"family": "nomic-bert", "parameter_size": "137M", "quantization_level": "F16", "size": 274_302_450,
+                                "kv_bytes_per_token": 0},
+}
+ANSWER_TEXT = (
+    "Based on the provided context, the document describes the deployment of the platform on edge "
+    "devices, the main risks identified during the pilot and the mitigation plan agreed with the "
+    "vendor. The context does not state the final budget, but it lists the hardware requirements "
+    "and the schedule for the next quarter."
+)
+QUESTIONS = [
+    "What are the main risks identified during the pilot deployment?",
+    "How does the mitigation plan address the hardware requirements?",
+    "What is the schedule agreed with the vendor for the next quarter?",
+]
+
+
+class Settings:
+    tokens_per_second = 15.0  # Generation speed per request
+    prompt_tokens_per_second = 200.0  # Prompt evaluation speed
+    load_seconds = 2.0  # Time to load a model that is not resident yet
+    embed_seconds_per_text = 0.01
+    embed_seconds_per_call = 0.02
+    parallel = 1  # Requests served at once per model, like OLLAMA_NUM_PARALLEL
+    default_num_ctx = 4096  # Context of a request that does not set num_ctx
+
+
+app = FastAPI()
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+_loaded: Dict[str, datetime] = {}
+# Options a model was loaded with, like Ollama a request with other ones reloads it
+_runners: Dict[str, Dict[str, Any]] = {}
+RUNNER_OPTIONS = ("num_ctx", "num_batch", "num_thread")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _details(name: str) -> Dict[str, Any]:
+    info = FAKE_MODELS.get(name, FAKE_MODELS["phi3:latest"])
+    return {
+        "parent_model": "", "format": "gguf", "family": info["family"], "families": [info["family"]],
+        "parameter_size": info["parameter_size"], "quantization_level": info["quantization_level"],
+    }
+
+
+def _model_entry(name: str) -> Dict[str, Any]:
+    return {
+        "name": name, "model": name, "modified_at": _now(), "size": FAKE_MODELS[name]["size"],
+        "digest": hashlib.sha256(name.encode()).hexdigest(), "details": _details(name),
+    }
+
+
+def _runner(body: Dict[str, Any]) -> Dict[str, Any]:
+    options = body.get("options") or {}
+    runner = {key: options.get(key) for key in RUNNER_OPTIONS}
+    runner["num_ctx"] = runner["num_ctx"] or Settings.default_num_ctx
+    return runner
+
+
+async def _acquire(model: str, runner: Optional[Dict[str, Any]] = None) -> Tuple[asyncio.Semaphore, float]:
+    """Wait for a slot of the model, loading it first if needed. Returns the slot and the load time"""
+    semaphore = _semaphores.setdefault(model, asyncio.Semaphore(Settings.parallel))
+    await semaphore.acquire()
+    runner = runner or _runners.get(model) or {"num_ctx": Settings.default_num_ctx}
+    load_seconds = 0.0
+    if model not in _loaded or _runners.get(model) != runner:
+        load_seconds = Settings.load_seconds
+        await asyncio.sleep(load_seconds)
+        _runners[model] = runner
+    _loaded[model] = datetime.now(timezone.utc)
+    return semaphore, load_seconds
+
+
+def _tokens(body: Dict[str, Any]) -> List[str]:
+    prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+    if body.get("format"):
+        text = json.dumps({"questions": QUESTIONS})
+    elif "questions" in prompt.lower() and "answer the following question" not in prompt.lower():
+        text = "\n".join(f"{i}. {q}" for i, q in enumerate(QUESTIONS, 1))
+    else:
+        text = ANSWER_TEXT
+    # Roughly one token per word piece, keeping the separators so the text is rebuilt exactly
+    tokens = [piece + " " for piece in text.split(" ")]
+    tokens[-1] = tokens[-1].rstrip()
+    num_predict = (body.get("options") or {}).get("num_predict")
+    return tokens[:num_predict] if num_predict and num_predict > 0 else tokens
+
+
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", [])) + str(body.get("prompt") or "")
+    return max(1, len(prompt) // 4)
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [_model_entry(name) for name in FAKE_MODELS]}
+
+
+@app.get("/api/ps")
+async def ps():
+    expires = (datetime.now(timezone.utc) + timedelta(minutes=30)).isoformat()
+    # The size of a loaded model includes its KV cache, which grows with num_ctx
+    return {"models": [
+        {
+            **_model_entry(name),
+            "size": FAKE_MODELS[name]["size"] + _runners[name]["num_ctx"] * FAKE_MODELS[name]["kv_bytes_per_token"],
+            "expires_at": expires, "size_vram": 0, "context_length": _runners[name]["num_ctx"],
+        }
+        for name in _loaded if name in FAKE_MODELS
+    ]}
+
+
+@app.post("/api/show")
+async def show(request: Request):
+    body = await request.json()
+    name = body.get("model") or body.get("name")
+    if name not in FAKE_MODELS:
+        return JSONResponse({"error": f"model '{name}' not found"}, status_code=404)
+    return {
+        "modelfile": "", "parameters": "", "template": "{{ .Prompt }}", "details": _details(name),
+        "model_info": {"general.parameter_count": int(float(FAKE_MODELS[name]["parameter_size"][:-1]) * 1e9),
+                       f"{FAKE_MODELS[name]['family']}.context_length": 131072},
+        "capabilities": ["embedding"] if "embed" in name else ["completion"],
+    }
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    model = body["model"]
+    if body.get("keep_alive") in (0, "0"):
+        # Unloads the model, like Ollama
+        _loaded.pop(model, None)
+        _runners.pop(model, None)
+        return {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "unload"}
+    semaphore, _ = await _acquire(model, _runner(body))
+    try:
+        # An empty prompt only loads the model, which is what the warm-up does
+        return {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "load"}
+    finally:
+        semaphore.release()
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    model = body["model"]
+    if model not in FAKE_MODELS:
+        return JSONResponse({"error": f"model '{model}' not found"}, status_code=404)
+    tokens = _tokens(body)
+    runner = _runner(body)
+    # A prompt longer than the context is truncated, Ollama keeps its end
+    prompt_tokens = min(_prompt_tokens(body), runner["num_ctx"])
+
+    def final(eval_duration: float, load_seconds: float) -> Dict[str, Any]:
+        return {
+            "model": model, "created_at": _now(), "message": {"role": "assistant", "content": ""},
+            "done": True, "done_reason": "stop", "total_duration": int((eval_duration + load_seconds) * 1e9),
+            "load_duration": int(load_seconds * 1e9), "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_tokens / Settings.prompt_tokens_per_second * 1e9),
+            "eval_count": len(tokens), "eval_duration": int(eval_duration * 1e9),
+        }
+
+    async def stream():
+        semaphore, load_seconds = await _acquire(model, runner)
+        try:
+            await asyncio.sleep(prompt_tokens / Settings.prompt_tokens_per_second)
+            for token in tokens:
+                await asyncio.sleep(1 / Settings.tokens_per_second)
+                yield json.dumps({
+                    "model": model, "created_at": _now(),
+                    "message": {"role": "assistant", "content": token}, "done": False
+                }) + "\n"
+            yield json.dumps(final(len(tokens) / Settings.tokens_per_second, load_seconds)) + "\n"
+        finally:
+            semaphore.release()
+
+    if body.get("stream", True):
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    content = []
+    async for line in stream():
+        content.append(json.loads(line))
+    response = content[-1]
+    response["message"]["content"] = "".join(c["message"]["content"] for c in content)
+    return response
+
+
+def _embedding(text: str) -> List[float]:
+    """Deterministic unit vector derived from the text"""
+    digest = hashlib.sha256(text.encode()).digest()
+    values = [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(EMBEDDING_DIM)]
+    norm = sum(v * v for v in values) ** 0.5
+    return [v / norm for v in values]
+
+
+async def _embed(model: str, texts: List[str]) -> List[List[float]]:
+    semaphore, _ = await _acquire(model)
+    try:
+        await asyncio.sleep(Settings.embed_seconds_per_call + Settings.embed_seconds_per_text * len(texts))
+        return [_embedding(text) for text in texts]
+    finally:
+        semaphore.release()
+
+
+@app.post("/api/embed")
+async def embed(request: Request):
+    body = await request.json()
+    texts = body.get("input") or []
+    texts = [texts] if isinstance(texts, str) else texts
+    embeddings = await _embed(body["model"], texts)
+    return {"model": body["model"], "embeddings": embeddings, "total_duration": 0, "prompt_eval_count": len(texts)}
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    embedding = (await _embed(body["model"], [body.get("prompt") or ""]))[0]
+    return {"embedding": embedding}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-second", type=float, default=Settings.tokens_per_second)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=Settings.prompt_tokens_per_second)
+    parser.add_argument("--load-seconds", type=float, default=Settings.load_seconds)
+    parser.add_argument("--embed-seconds-per-text", type=float, default=Settings.embed_seconds_per_text)
+    parser.add_argument("--parallel", type=int, default=Settings.parallel)
+    parser.add_argument("--default-num-ctx", type=int, default=Settings.default_num_ctx,
+                        help="Context of requests without num_ctx, 2048 before Ollama 0.6, sized from the VRAM since 0.12")
+    args = parser.parse_args(argv)
+
+    Settings.tokens_per_second = args.tokens_per_second
+    Settings.prompt_tokens_per_second = args.prompt_tokens_per_second
+    Settings.load_seconds = args.load_seconds
+    Settings.embed_seconds_per_text = args.embed_seconds_per_text
+    Settings.parallel = args.parallel
+    Settings.default_num_ctx = args.default_num_ctx
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Replay concurrent user sessions against the backend and report latencies.
+
+A session follows the Streamlit flow: upload a document, estimate its tokens,
+summarize it, suggest questions, then ask a few questions, each one embedded
+for retrieval and answered by the model. Usage, with the backend running
+against the fakes of this package or a real deployment:
+
+    python -m loadtest.load_generator --sessions 50 --concurrency 10 --turns 3
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import corpora  # noqa: E402
+
+DEFAULT_BACKEND = "http://localhost:8000"
+DEFAULT_MODEL = "phi3:latest"
+QUESTION_TEMPLATES = [
+    "What does the document say about the {}?",
+    "Which {} issues are mentioned in the report?",
+    "Summarize the {} section.",
+    "Who is responsible for the {}?",
+]
+TOPICS = ["deployment", "budget", "security", "schedule", "vendor", "hardware", "maintenance"]
+
+
+class Recorder:
+    """Latencies per endpoint, plus the time to first token of the answers"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.ttft: List[float] = []
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(elapsed)
+        return response
+
+    async def stream(self, client: httpx.AsyncClient, name: str, url: str, **kwargs) -> Optional[bytes]:
+        """POST reading the body as it arrives, the first chunk gives the time to first token"""
+        start = time.perf_counter()
+        first_chunk = None
+        body = b""
+        try:
+            async with client.stream("POST", url, **kwargs) as response:
+                async for chunk in response.aiter_bytes():
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    body += chunk
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - start)
+        if first_chunk is not None:
+            self.ttft.append(first_chunk)
+        return body
+
+
+async def run_session(client: httpx.AsyncClient, recorder: Recorder, args, rng: random.Random) -> None:
+    session_id = str(uuid.uuid4())
+    headers = {"X-Session-Id": session_id}
+    document = corpora.make_text(args.document_size, seed=rng.randrange(2**32))
+
+    files = {"file": (f"{session_id}.txt", document.encode(), "text/plain")}
+    response = await recorder.call(client, "analyze", "POST", "/analyze/", files=files, headers=headers)
+    result = response.json() if response is not None else {"text": document}
+    text = result["text"]
+    # The text stored by /analyze/ is referenced by its id, like the app does
+    reference = {"document_id": result["document_id"]} if "document_id" in result else {"content": text}
+
+    await recorder.call(client, "estimate_tokens", "POST", "/estimate_tokens/", json=reference, headers=headers)
+    response = await recorder.call(client, "summarize", "POST", "/summarize/", json=reference, headers=headers)
+    summary = response.json()["summary"] if response is not None else text[:2000]
+    await recorder.call(
+        client, "generate_questions", "POST", "/generate_questions/",
+        json={"content": summary, "model_name": args.model}, headers=headers
+    )
+
+    chunks = [text[i:i + 500] for i in range(0, min(len(text), 1500), 500)]
+    for _ in range(args.turns):
+        await asyncio.sleep(rng.uniform(0, args.think_time))
+        question = rng.choice(QUESTION_TEMPLATES).format(rng.choice(TOPICS))
+        await recorder.call(client, "embed", "POST", "/embed/", json={"texts": [question]}, headers=headers)
+        await recorder.stream(
+            client, "generate_answer", "/generate_answer/",
+            json={"question": question, "relevant_chunks": chunks, "model_name": args.model, "stream": True},
+            headers=headers
+        )
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(recorder: Recorder, elapsed: float, sessions: int) -> Dict:
+    rows = {}
+    for name, values in list(recorder.latencies.items()) + [("time_to_first_token", recorder.ttft)]:
+        if not values:
+            continue
+        rows[name] = {
+            "count": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "throughput_rps": len(values) / elapsed,
+            "mean_s": statistics.fmean(values),
+            "p50_s": percentile(values, 0.50),
+            "p95_s": percentile(values, 0.95),
+            "p99_s": percentile(values, 0.99),
+        }
+    for name, errors in recorder.errors.items():
+        rows.setdefault(name, {"count": 0, "errors": errors})
+
+    print(f"{sessions} sessions in {elapsed:.1f}s, {sessions / elapsed:.2f} sessions/s")
+    print(f"{'endpoint':<22} {'count':>6} {'errors':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, row in rows.items():
+        if not row["count"]:
+            print(f"{name:<22} {0:>6} {row['errors']:>6}")
+            continue
+        print(f"{name:<22} {row['count']:>6} {row['errors']:>6} {row['throughput_rps']:>7.2f} "
+              f"{row['p50_s']:>7.2f}s {row['p95_s']:>7.2f}s {row['p99_s']:>7.2f}s")
+    return {"elapsed_s": elapsed, "sessions": sessions, "endpoints": rows}
+
+
+async def run(args) -> Dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=args.backend, timeout=timeout, limits=limits) as client:
+        async def bounded(session_rng: random.Random):
+            async with semaphore:
+                await run_session(client, recorder, args, session_rng)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(random.Random(rng.random())) for _ in range(args.sessions)))
+        elapsed = time.perf_counter() - start
+    return report(recorder, elapsed, args.sessions)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions to replay in total")
+    parser.add_argument("--concurrency", type=int, default=5, help="Sessions running at the same time")
+    parser.add_argument("--turns", type=int, default=3, help="Questions asked per session")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Maximum pause before each question, in seconds")
+    parser.add_argument("--document-size", type=int, default=20_000, help="Characters of the uploaded document")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=corpora.SEED)
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import io
+import json
+import time
+import asyncio
+import unittest
+
+from unittest import mock
+
+from fastapi import UploadFile
+
+from backend.helpers import batch_helper
+
+
+def fake_ocr(file):
+    text = file.read().decode()
+    if text == "broken":
+        raise ValueError("unreadable")
+    time.sleep(float(text))
+    return f"slept {text}"
+
+
+async def collect(files):
+    return [json.loads(line) async for line in batch_helper.analyze_documents(files, summarize=False)]
+
+
+class TestAnalyzeDocuments(unittest.TestCase):
+
+    @mock.patch.object(batch_helper, "get_result", side_effect=fake_ocr)
+    def test_results_stream_in_completion_order(self, _):
+        files = [UploadFile(io.BytesIO(d.encode()), filename=f"{i}.pdf") for i, d in enumerate(["0.3", "0.1", "broken"])]
+
+        start = time.perf_counter()
+        results = asyncio.run(collect(files))
+
+        self.assertEqual([r["file_name"] for r in results], ["2.pdf", "1.pdf", "0.pdf"])
+        self.assertEqual(results[0]["error"], "unreadable")
+        self.assertEqual(results[2]["text"], "slept 0.3")
+        # Extracted concurrently, not one after another
+        self.assertLess(time.perf_counter() - start, 0.38)
+
+
+if __name__ == '__main__':
+    unittest.main()
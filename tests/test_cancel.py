@@ -0,0 +1,91 @@
+import time
+import asyncio
+import threading
+import unittest
+
+from backend.helpers.cancel_helper import CancelRegistry, stream_until_disconnected
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+class Generation:
+    """Blocking token generator recording how far it went and whether it was closed"""
+
+    def __init__(self, tokens=100, seconds_per_token=0.01, first_token_seconds=0.0):
+        self.tokens = tokens
+        self.seconds_per_token = seconds_per_token
+        self.first_token_seconds = first_token_seconds
+        self.generated = 0
+        self.closed = threading.Event()
+
+    def __call__(self):
+        try:
+            time.sleep(self.first_token_seconds)
+            for i in range(self.tokens):
+                time.sleep(self.seconds_per_token)
+                self.generated += 1
+                yield f"{i}\n"
+        finally:
+            self.closed.set()
+
+
+class TestCancellation(unittest.TestCase):
+
+    def test_closing_the_response_stops_the_generation(self):
+        generation = Generation()
+
+        async def read_three():
+            lines = stream_until_disconnected(FakeRequest(), generation, threading.Event())
+            received = [await lines.__anext__() for _ in range(3)]
+            await lines.aclose()
+            return received
+
+        self.assertEqual(asyncio.run(read_three()), ["0\n", "1\n", "2\n"])
+        self.assertTrue(generation.closed.wait(1))
+        self.assertLess(generation.generated, 10)
+
+
+    def test_cancel_ends_the_stream(self):
+        registry = CancelRegistry()
+        cancelled = registry.register("abc")
+        generation = Generation()
+
+        async def read_all():
+            received = []
+            async for line in stream_until_disconnected(FakeRequest(), generation, cancelled):
+                received.append(line)
+                if len(received) == 3:
+                    self.assertTrue(registry.cancel("abc"))
+            return received
+
+        received = asyncio.run(read_all())
+
+        self.assertLess(len(received), 10)
+        self.assertTrue(generation.closed.wait(1))
+        registry.unregister("abc", cancelled)
+        self.assertFalse(registry.cancel("abc"))
+
+
+    def test_disconnect_before_the_first_token_is_detected(self):
+        request = FakeRequest()
+        request.disconnected = True
+        cancelled = threading.Event()
+        generation = Generation(first_token_seconds=0.6)
+
+        async def read_all():
+            return [line async for line in stream_until_disconnected(request, generation, cancelled)]
+
+        self.assertEqual(asyncio.run(read_all()), [])
+        self.assertTrue(cancelled.is_set())
+        self.assertTrue(generation.closed.wait(2))
+        self.assertLess(generation.generated, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import gzip
+import unittest
+
+from backend.helpers import store_helper
+from backend.helpers.store_helper import DocumentStore, DocumentNotFoundError, encode_body, resolve_text
+
+
+class TestDocumentStore(unittest.TestCase):
+
+    def test_same_text_same_id(self):
+        store = DocumentStore()
+        document_id = store.put("alpha beta")
+
+        self.assertEqual(store.put("alpha beta"), document_id)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get(document_id), "alpha beta")
+        self.assertEqual(store.nb_tokens(document_id), 2)
+
+
+    def test_least_recently_used_documents_are_evicted(self):
+        store = DocumentStore(max_bytes=25)
+        first, second = store.put("a" * 10), store.put("b" * 10)
+        store.get(first)
+        store.put("c" * 10)
+
+        self.assertEqual(store.get(first), "a" * 10)
+        with self.assertRaises(DocumentNotFoundError):
+            store.get(second)
+
+
+    def test_content_is_used_before_the_document_id(self):
+        self.assertEqual(resolve_text("posted", "unknown"), "posted")
+        with self.assertRaises(DocumentNotFoundError):
+            resolve_text(None, "unknown")
+
+
+    def test_body_is_compressed_with_an_accepted_encoding(self):
+        body = b"word " * 1000
+
+        compressed, encoding = encode_body(body, "gzip, deflate")
+        self.assertEqual(encoding, "gzip")
+        self.assertEqual(gzip.decompress(compressed), body)
+        self.assertLess(len(compressed), len(body) // 10)
+
+        self.assertEqual(encode_body(body, "gzip;q=0, identity"), (body, None))
+        self.assertEqual(encode_body(body, None), (body, None))
+        self.assertEqual(encode_body(b"short", "gzip"), (b"short", None))
+
+
+    @unittest.skipIf(store_helper.zstandard is None, "zstandard is not installed")
+    def test_zstd_is_preferred_when_accepted(self):
+        body = b"word " * 1000
+
+        compressed, encoding = encode_body(body, "gzip, zstd")
+
+        self.assertEqual(encoding, "zstd")
+        self.assertEqual(store_helper.zstandard.decompress(compressed), body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import threading
+
+from backend.helpers.embedding_helper import EmbeddingBatcher
+
+
+class TestEmbeddingBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        def fake_embed(model_name, texts):
+            self.calls.append(list(texts))
+            return [[float(len(text))] for text in texts]
+
+        self.fake_embed = fake_embed
+
+
+    def test_concurrent_callers_share_one_call(self):
+        batcher = EmbeddingBatcher("fake", window_ms=200, max_batch_size=64, embed_fn=self.fake_embed)
+        results = {}
+
+        def worker(text):
+            results[text] = batcher.embed([text])[0]
+
+        threads = [threading.Thread(target=worker, args=("x" * i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(results["xxx"], [3.0])
+
+
+    def test_batches_are_capped(self):
+        batcher = EmbeddingBatcher("fake", window_ms=50, max_batch_size=4, embed_fn=self.fake_embed)
+        embeddings = batcher.embed(["a"] * 10)
+
+        self.assertEqual(len(embeddings), 10)
+        self.assertTrue(all(len(batch) <= 4 for batch in self.calls))
+
+
+
+    def test_missing_embeddings_fail_every_caller(self):
+        batcher = EmbeddingBatcher("fake", window_ms=50, max_batch_size=4, embed_fn=lambda model, texts: [[1.0]])
+
+        with self.assertRaises(ValueError):
+            batcher.embed(["a", "b", "c"], timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import time
+import threading
+import unittest
+
+from backend.helpers.governor_helper import ConcurrencyGovernor, retry_after_seconds
+
+
+class TestConcurrencyGovernor(unittest.TestCase):
+
+    def test_in_flight_requests_never_exceed_the_limit(self):
+        governor = ConcurrencyGovernor("test", max_limit=3, initial_limit=3)
+        in_flight, peak = [0], [0]
+        lock = threading.Lock()
+
+        def work():
+            with governor.slot():
+                with lock:
+                    in_flight[0] += 1
+                    peak[0] = max(peak[0], in_flight[0])
+                time.sleep(0.02)
+                with lock:
+                    in_flight[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak[0], 3)
+        self.assertEqual(governor.snapshot()["queued"], 0)
+
+
+    def test_limit_is_halved_on_overload_and_grows_back_additively(self):
+        governor = ConcurrencyGovernor("test", max_limit=8, initial_limit=8)
+
+        governor.on_overload(retry_after=0)
+        self.assertEqual(governor.limit, 4)
+
+        # One more slot after a limit's worth of successes
+        for _ in range(4):
+            governor.on_success()
+        self.assertEqual(governor.limit, 4)
+        governor.on_success()
+        self.assertEqual(governor.limit, 5)
+
+
+    def test_retry_after_pauses_new_requests(self):
+        governor = ConcurrencyGovernor("test", max_limit=4, initial_limit=4)
+        governor.on_overload(retry_after=0.2)
+
+        start = time.monotonic()
+        with governor.slot():
+            waited = time.monotonic() - start
+
+        self.assertGreaterEqual(waited, 0.15)
+        self.assertEqual(governor.snapshot()["overloads"], 1)
+
+
+    def test_retry_after_header_formats(self):
+        self.assertEqual(retry_after_seconds({"retry-after-ms": "250"}), 0.25)
+        self.assertEqual(retry_after_seconds({"Retry-After": "3"}), 3.0)
+        self.assertEqual(retry_after_seconds({}, default=1.5), 1.5)
+        self.assertEqual(retry_after_seconds({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
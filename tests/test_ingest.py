@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"))
+
+import ingest  # noqa: E402
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def test_resume_skips_unchanged_documents_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            document = os.path.join(directory, "a.txt")
+            with open(document, "w") as f:
+                f.write("first version")
+            checkpoint = ingest.Checkpoint(os.path.join(directory, "checkpoint.json"))
+            checkpoint.mark_done(document, chunks=1)
+            checkpoint.save()
+
+            self.assertTrue(ingest.Checkpoint(checkpoint.path).is_done(document))
+            self.assertFalse(ingest.Checkpoint(checkpoint.path, restart=True).is_done(document))
+
+            with open(document, "w") as f:
+                f.write("second, longer version")
+            self.assertFalse(ingest.Checkpoint(checkpoint.path).is_done(document))
+
+
+    def test_chunk_ids_are_stable(self):
+        self.assertEqual(ingest.chunk_ids("/docs/a.pdf", 2), ingest.chunk_ids("/docs/a.pdf", 2))
+        self.assertNotEqual(ingest.chunk_ids("/docs/a.pdf", 1), ingest.chunk_ids("/docs/b.pdf", 1))
+
+
+
+class FakeStore:
+    def __init__(self):
+        self.chunks = {}
+
+    def embed(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def add_chunks(self, ids, chunks, embeddings, metadatas):
+        self.chunks.update(zip(ids, chunks))
+
+    def delete_chunks(self, ids):
+        for i in ids:
+            self.chunks.pop(i, None)
+
+
+class TestIngestion(unittest.TestCase):
+
+    def test_reingested_shorter_document_leaves_no_stale_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            document = os.path.join(directory, "a.txt")
+            other = os.path.join(directory, "b.txt")
+            for path in (document, other):
+                with open(path, "w") as f:
+                    f.write("text")
+            store = FakeStore()
+
+            def ingest_chunks(chunks_by_path, restart=False):
+                ingestion = ingest.Ingestion.__new__(ingest.Ingestion)
+                ingestion.args = SimpleNamespace(embed_batch=1000)
+                ingestion.root = directory
+                ingestion.store = store
+                ingestion.checkpoint = ingest.Checkpoint(os.path.join(directory, "checkpoint.json"), restart)
+                ingestion.stats = ingest.Stats()
+                ingestion.pending, ingestion.pending_chunks = [], 0
+                for path, chunks in chunks_by_path.items():
+                    ingestion._queue(path, chunks)
+                ingestion.flush()
+
+            ingest_chunks({document: ["one", "two", "three"], other: ["other"]})
+            ingest_chunks({document: ["new one"]})
+            self.assertEqual(sorted(store.chunks.values()), ["new one", "other"])
+
+            # The previous counts are still known when the checkpoint is restarted
+            ingest_chunks({other: []}, restart=True)
+            self.assertEqual(list(store.chunks.values()), ["new one"])
+
+
+    def test_interrupted_restart_keeps_the_chunk_counts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = os.path.join(directory, "a.txt")
+            second = os.path.join(directory, "b.txt")
+            for path in (first, second):
+                with open(path, "w") as f:
+                    f.write("text")
+            store = FakeStore()
+            checkpoint_path = os.path.join(directory, "checkpoint.json")
+
+            def ingest_chunks(chunks_by_path, restart=False):
+                ingestion = ingest.Ingestion.__new__(ingest.Ingestion)
+                ingestion.args = SimpleNamespace(embed_batch=1000)
+                ingestion.root = directory
+                ingestion.store = store
+                ingestion.checkpoint = ingest.Checkpoint(checkpoint_path, restart)
+                ingestion.stats = ingest.Stats()
+                ingestion.pending, ingestion.pending_chunks = [], 0
+                for path, chunks in chunks_by_path.items():
+                    ingestion._queue(path, chunks)
+                ingestion.flush()
+
+            ingest_chunks({first: ["a1", "a2"], second: ["b1", "b2", "b3"]})
+            # A restart interrupted after the first document, the second one is still to redo
+            ingest_chunks({first: ["a1", "a2"]}, restart=True)
+            self.assertFalse(ingest.Checkpoint(checkpoint_path).is_done(second))
+
+            # Resumed with a shorter second document
+            ingest_chunks({second: ["b1"]})
+            self.assertEqual(sorted(store.chunks.values()), ["a1", "a2", "b1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
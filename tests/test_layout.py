@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "frontend")]
+
+from benchmarks import corpora  # noqa: E402
+from backend.helpers import doc_helper  # noqa: E402
+from aiproviders.vector_store import table_chunks  # noqa: E402
+
+
+def span(offset, length):
+    return SimpleNamespace(offset=offset, length=length)
+
+
+def cell(row, column, content, kind="content"):
+    return SimpleNamespace(row_index=row, column_index=column, content=content, kind=kind, bounding_regions=[])
+
+
+TABLE = SimpleNamespace(
+    row_count=3, column_count=2, spans=[span(100, 40)],
+    bounding_regions=[SimpleNamespace(page_number=2, polygon=[])],
+    cells=[
+        cell(0, 0, "Site", "columnHeader"), cell(0, 1, "Budget", "columnHeader"),
+        cell(1, 0, "Lyon"), cell(1, 1, "12 k"),
+        cell(2, 0, "Oslo"),
+    ],
+)
+
+
+class TestLayout(unittest.TestCase):
+
+    def test_word_index_matches_the_span_scan(self):
+        page = corpora.make_ocr_page(nb_words=300, words_per_line=7)
+        index = doc_helper.WordIndex(page.words)
+
+        for line in page.lines:
+            expected = [word for word in page.words if doc_helper._in_span(word, line.spans)]
+            self.assertEqual(doc_helper.get_words(page, line, index), expected)
+
+
+    def test_tables_are_returned_as_rows(self):
+        table = doc_helper.get_table(0, TABLE)
+
+        self.assertEqual(table["rows"], [["Site", "Budget"], ["Lyon", "12 k"], ["Oslo", ""]])
+        self.assertEqual(table["header_rows"], [0])
+        self.assertEqual(table["page_numbers"], [2])
+        self.assertEqual(table["text"], "Site | Budget\nLyon | 12 k\nOslo | ")
+        self.assertTrue(doc_helper.analyze_table(0, TABLE).startswith("Table # 0 has 3 rows"))
+
+
+    def test_span_index(self):
+        handwritten = doc_helper.SpanIndex([span(10, 5), span(40, 10)])
+
+        self.assertTrue(handwritten.overlaps([span(0, 11)]))
+        self.assertTrue(handwritten.overlaps([span(45, 20)]))
+        self.assertFalse(handwritten.overlaps([span(15, 25)]))
+        self.assertTrue(handwritten.covers(span(41, 5)))
+        self.assertFalse(handwritten.covers(span(38, 5)))
+
+
+    def test_table_chunks_keep_whole_rows_under_the_header(self):
+        rows = [["Site", "Budget"]] + [[f"Site {i}", f"{i} k"] for i in range(50)]
+
+        chunks = table_chunks(rows, [0], chunk_size=200)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            lines = chunk.split("\n")
+            self.assertEqual(lines[0], "Site | Budget")
+            self.assertLessEqual(len(chunk), 200)
+        self.assertEqual(sum(len(chunk.split("\n")) - 1 for chunk in chunks), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
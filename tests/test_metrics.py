@@ -0,0 +1,81 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.helpers import metrics_helper
+from backend.helpers.metrics_helper import Counter, Gauge, Histogram, InFlightMiddleware, IN_FLIGHT_REQUESTS, render_metrics
+
+
+class TestRenderMetrics(unittest.TestCase):
+
+    def _register(self, metric):
+        self.addCleanup(metrics_helper._registry.remove, metric)
+        return metric
+
+
+    def test_prometheus_text_format(self):
+        counter = self._register(Counter("test_requests_total", "Requests served"))
+        gauge = self._register(Gauge("test_queue_depth", "Waiting requests"))
+        counter.inc(kind="chat", model="phi3")
+        counter.inc(2, model="phi3", kind="chat")
+        gauge.set(4)
+        gauge.dec()
+
+        text = render_metrics()
+
+        self.assertTrue(text.endswith("\n"))
+        self.assertIn(
+            "# HELP test_requests_total Requests served\n"
+            "# TYPE test_requests_total counter\n"
+            'test_requests_total{kind="chat",model="phi3"} 3\n',
+            text
+        )
+        self.assertIn("# TYPE test_queue_depth gauge\ntest_queue_depth 3\n", text)
+
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self._register(Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1, 10)))
+        for value in (0.05, 0.1, 0.5, 5, 50):
+            histogram.observe(value, endpoint="/a")
+
+        lines = [line for line in render_metrics().splitlines() if line.startswith("test_latency_seconds")]
+
+        self.assertEqual(lines, [
+            'test_latency_seconds_bucket{endpoint="/a",le="0.1"} 2',
+            'test_latency_seconds_bucket{endpoint="/a",le="1.0"} 3',
+            'test_latency_seconds_bucket{endpoint="/a",le="10.0"} 4',
+            'test_latency_seconds_bucket{endpoint="/a",le="+Inf"} 5',
+            'test_latency_seconds_sum{endpoint="/a"} 55.65',
+            'test_latency_seconds_count{endpoint="/a"} 5',
+        ])
+
+
+class TestInFlightMiddleware(unittest.TestCase):
+
+    def test_requests_are_labelled_by_route_template(self):
+        app = FastAPI()
+        seen = []
+
+        @app.post("/cancel/{request_id}")
+        async def cancel(request_id: str):
+            seen.append(dict(IN_FLIGHT_REQUESTS._values))
+            return {}
+
+        app.add_middleware(InFlightMiddleware)
+        client = TestClient(app)
+        for request_id in ("first", "second"):
+            client.post(f"/cancel/{request_id}")
+        client.get("/random/path/123")
+        client.get("/cancel/first")
+
+        labels = {dict(key).get("endpoint") for key in IN_FLIGHT_REQUESTS._values}
+        self.assertIn("/cancel/{request_id}", labels)
+        self.assertIn("other", labels)
+        self.assertFalse({"/cancel/first", "/cancel/second", "/random"} & labels)
+        self.assertEqual(seen[0][(("endpoint", "/cancel/{request_id}"),)], 1)
+        self.assertEqual(IN_FLIGHT_REQUESTS._values[(("endpoint", "/cancel/{request_id}"),)], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
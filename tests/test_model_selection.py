@@ -0,0 +1,66 @@
+import unittest
+
+from unittest import mock
+
+from backend.helpers import ollama_helper
+
+GIB = 1024 ** 3
+FOOTPRINTS = {
+    "llama3.2:1b": {"parameters": 1.2e9, "quantization": "Q8_0", "weights_bytes": int(1.3 * GIB)},
+    "phi3:latest": {"parameters": 3.8e9, "quantization": "Q4_0", "weights_bytes": int(2.2 * GIB)},
+    "llama3.1:8b": {"parameters": 8.0e9, "quantization": "Q4_K_M", "weights_bytes": int(4.9 * GIB)},
+}
+
+
+def select(available_gib, loaded=(), exclude=()):
+    memory = {"total": 32 * GIB, "available": int(available_gib * GIB)}
+    with mock.patch.object(ollama_helper, "get_model_footprints", return_value=FOOTPRINTS), \
+            mock.patch.object(ollama_helper, "get_loaded_models", return_value={name: 0 for name in loaded}), \
+            mock.patch.object(ollama_helper, "get_memory_info", return_value=memory):
+        return ollama_helper.get_best_available_model(exclude)
+
+
+class TestModelSelection(unittest.TestCase):
+
+    def test_largest_model_that_fits_with_headroom(self):
+        self.assertEqual(select(16), "llama3.1:8b")
+        # 5.4 GB needed, 80% of 6 GB is not enough
+        self.assertEqual(select(6), "phi3:latest")
+        self.assertEqual(select(3), "llama3.2:1b")
+
+
+    def test_smallest_model_when_none_fits(self):
+        with self.assertLogs("backend.helpers.ollama_helper", "WARNING"):
+            self.assertEqual(select(1), "llama3.2:1b")
+
+
+    def test_loaded_model_is_preferred(self):
+        self.assertEqual(select(16, loaded=["phi3:latest", "nomic-embed-text:latest"]), "phi3:latest")
+
+
+    def test_excluded_model_is_skipped(self):
+        self.assertEqual(select(16, exclude=("llama3.1:8b",)), "phi3:latest")
+
+
+    def test_memory_check_does_not_load_the_model(self):
+        memory = {"total": 8 * GIB, "available": 3 * GIB}
+        with mock.patch.object(ollama_helper, "get_model_footprints", return_value=FOOTPRINTS), \
+                mock.patch.object(ollama_helper, "get_loaded_models", return_value={"llama3.1:8b": 0}), \
+                mock.patch.object(ollama_helper, "get_memory_info", return_value=memory), \
+                mock.patch("ollama.chat") as chat:
+            self.assertTrue(ollama_helper.test_model_memory("phi3:latest"))
+            self.assertTrue(ollama_helper.test_model_memory("llama3.1:8b"))
+            with self.assertLogs("backend.helpers.ollama_helper", "WARNING"):
+                memory["available"] = 2 * GIB
+                self.assertFalse(ollama_helper.test_model_memory("phi3:latest"))
+        chat.assert_not_called()
+
+
+    def test_parameter_size(self):
+        self.assertEqual(ollama_helper.parse_parameter_size("3.8B"), 3.8e9)
+        self.assertEqual(ollama_helper.parse_parameter_size("137M"), 137e6)
+        self.assertIsNone(ollama_helper.parse_parameter_size(""))
+
+
+if __name__ == '__main__':
+    unittest.main()
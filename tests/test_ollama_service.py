@@ -18,6 +18,14 @@ class TestOllamaService(unittest.TestCase):
         self.assertIsInstance(available_models, list)
 
 
+    def test_ready(self):
+        response = requests.get("http://localhost:8000/ready")
+        readiness = response.json()
+
+        self.assertIn(response.status_code, (200, 503))
+        self.assertIsInstance(readiness["models"], dict)
+
+
     def test_generate_questions(self):
         model_name = "phi3.5:latest"
         text = "FastAPI will use this response_model to do all the data documentation, validation, etc"
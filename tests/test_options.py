@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from backend.helpers.options_helper import OptionsPlanner, MIN_NUM_CTX
+from backend.helpers.system_helper import get_cpu_info, get_memory_info
+
+GIB = 1024 ** 3
+CPU = {"logical": 8, "physical": 4}
+MEMORY = {"total": 16 * GIB, "available": 8 * GIB}
+
+# Two cores with two hyper-threads each
+CPUINFO = "".join(
+    f"processor\t: {i}\nphysical id\t: 0\ncore id\t\t: {i // 2}\n\n" for i in range(4)
+)
+
+
+class TestOptionsPlanner(unittest.TestCase):
+
+    def test_context_fits_the_prompt_and_is_reused(self):
+        planner = OptionsPlanner(CPU, MEMORY)
+
+        short = planner.plan("model", "answer", prompt_tokens=300, max_predict=1000)
+        self.assertEqual(short, {"num_ctx": MIN_NUM_CTX, "num_predict": 1000, "num_batch": 512, "num_thread": 4})
+
+        long = planner.plan("model", "summary", prompt_tokens=2500, max_predict=300)
+        self.assertEqual(long["num_ctx"], 4096)
+
+        # A smaller context would make Ollama reload the model
+        self.assertEqual(planner.plan("model", "answer", prompt_tokens=300, max_predict=1000)["num_ctx"], 4096)
+        self.assertEqual(planner.plan("other", "answer", prompt_tokens=300, max_predict=1000)["num_ctx"], MIN_NUM_CTX)
+
+
+    def test_long_words_are_counted_by_characters(self):
+        planner = OptionsPlanner(CPU, MEMORY)
+
+        options = planner.plan("model", "summary", prompt_tokens=1000, max_predict=300, prompt_chars=16_000)
+
+        self.assertEqual(options["num_ctx"], 8192)
+
+
+    def test_context_is_capped_by_the_available_memory(self):
+        planner = OptionsPlanner(CPU, {"total": 4 * GIB, "available": 2 * GIB})
+
+        with self.assertLogs("backend.helpers.options_helper", "WARNING"):
+            options = planner.plan("model", "summary", prompt_tokens=5000, max_predict=300)
+
+        # A quarter of 2 GB at 128 KB per token
+        self.assertEqual(options["num_ctx"], 4096)
+        self.assertEqual(options["num_batch"], 256)
+
+
+    def test_answer_length_is_what_the_context_leaves(self):
+        planner = OptionsPlanner(CPU, {"total": 16 * GIB, "available": 1 * GIB})
+
+        options = planner.plan("model", "answer", prompt_tokens=1500, max_predict=1000)
+
+        self.assertEqual(options["num_ctx"], 2048)
+        self.assertEqual(options["num_predict"], 2048 - (1500 * 5 // 4 + 64))
+
+
+class TestSystemInfo(unittest.TestCase):
+
+    def test_physical_cores_from_cpuinfo(self):
+        with tempfile.NamedTemporaryFile("w", suffix="cpuinfo", delete=False) as f:
+            f.write(CPUINFO)
+        try:
+            cpu = get_cpu_info(f.name)
+        finally:
+            os.unlink(f.name)
+
+        self.assertLessEqual(cpu["physical"], 2)
+        self.assertGreaterEqual(cpu["logical"], 1)
+
+
+    def test_memory_from_meminfo(self):
+        with tempfile.NamedTemporaryFile("w", suffix="meminfo", delete=False) as f:
+            f.write("MemTotal:       16384000 kB\nMemFree:         1024000 kB\nMemAvailable:    8192000 kB\n")
+        try:
+            memory = get_memory_info(f.name)
+        finally:
+            os.unlink(f.name)
+
+        self.assertEqual(memory, {"total": 16384000 * 1024, "available": 8192000 * 1024})
+        self.assertIsNone(get_memory_info("/nonexistent/meminfo"))
+
+
+if __name__ == '__main__':
+    unittest.main()
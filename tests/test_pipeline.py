@@ -0,0 +1,205 @@
+import io
+import os
+import sys
+import json
+import time
+import unittest
+
+from types import SimpleNamespace
+from typing import List
+from unittest import mock
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"))
+
+from aiproviders import DocumentProcessor, document  # noqa: E402
+from ui.services.document_pipeline import DocumentPipeline  # noqa: E402
+
+DELAY = 0.2
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.batches = []
+
+    def sync_document(self, text, metadata=None, units=None):
+        time.sleep(DELAY)
+        return {"added": 2, "removed": 0, "kept": 0}
+
+    def get_relevant_chunks_batch(self, queries, k=3):
+        self.batches.append(list(queries))
+        return [[f"chunk of {query}"] for query in queries]
+
+    def get_relevant_chunks(self, query, k=3):
+        return self.get_relevant_chunks_batch([query], k)[0]
+
+
+class FakeOllamaService:
+    def extractive_summary(self, text, document_id=None):
+        time.sleep(DELAY)
+        return f"summary of {document_id}"
+
+    def summarize(self, text, model_name, document_id=None):
+        yield {"event": "plan", "chunks": 1}
+        time.sleep(DELAY)
+        yield {"event": "summary", "summary": f"{model_name} summary"}
+
+    def generate_questions(self, model_name, summary):
+        time.sleep(DELAY / 2)
+        self.questions_for = getattr(self, "questions_for", []) + [summary]
+        return [f"question about {summary}?"]
+
+    def estimate_tokens(self, text, document_id=None):
+        time.sleep(DELAY)
+        return len(text.split())
+
+
+def make_processor(token_count=None):
+    processor = DocumentProcessor()
+    processor._vector_store = FakeVectorStore()
+    processor.document_text = "some extracted text"
+    processor.document_id = "doc"
+    processor.token_count = token_count
+    processor._pending_index = (processor.document_text, {}, None)
+    return processor
+
+
+class TestDocumentPipeline(unittest.TestCase):
+
+    def test_stages_run_side_by_side(self):
+        processor = make_processor()
+        pipeline = DocumentPipeline(processor, FakeOllamaService())
+
+        start = time.perf_counter()
+        pipeline.start("model", "azure")
+        pipeline.wait("retrieval")
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(processor.token_count, 3)
+        self.assertEqual(processor.last_sync["added"], 2)
+        self.assertEqual(processor.summary, "summary of doc")
+        self.assertEqual(processor.suggested_questions, ["question about summary of doc?"])
+        # The summary and the questions one after the other, the tokens and the index alongside
+        self.assertLess(elapsed, DELAY * 2.2)
+        self.assertLess(pipeline.timings["index"], DELAY * 1.5)
+
+
+    def test_suggested_questions_are_retrieved_ahead(self):
+        processor = make_processor(token_count=3)
+        pipeline = DocumentPipeline(processor, FakeOllamaService())
+
+        pipeline.start("model", "azure")
+        pipeline.wait("retrieval")
+        question = processor.suggested_questions[0]
+
+        self.assertEqual(processor.get_relevant_chunks(question), [f"chunk of {question}"])
+        self.assertEqual(processor.get_relevant_chunks("other"), ["chunk of other"])
+        self.assertEqual(processor._vector_store.batches, [[question], ["other"]])
+        self.assertNotIn("tokens", pipeline.timings)
+
+
+    def test_restarted_summary_replaces_the_running_one(self):
+        processor = make_processor(token_count=3)
+        pipeline = DocumentPipeline(processor, FakeOllamaService())
+
+        pipeline.start("model", "azure")
+        pipeline.summarize("model", "llm")
+        pipeline.wait("retrieval")
+
+        self.assertEqual(processor.summary, "model summary")
+        self.assertEqual(processor.suggested_questions, ["question about model summary?"])
+        self.assertEqual([event["event"] for event in pipeline.summary_events], ["plan", "summary"])
+        # The questions of the dropped summary are not generated
+        self.assertEqual(pipeline.ollama_service.questions_for, ["model summary"])
+
+
+    def test_restarted_summary_suggests_new_questions(self):
+        processor = make_processor(token_count=3)
+        service = FakeOllamaService()
+        pipeline = DocumentPipeline(processor, service)
+
+        pipeline.start("model", "azure")
+        pipeline.wait("retrieval")
+        pipeline.summarize("model", "llm")
+        self.assertIsNone(processor.suggested_questions)
+        pipeline.wait("retrieval")
+
+        self.assertEqual(service.questions_for, ["summary of doc", "model summary"])
+        self.assertEqual(processor.suggested_questions, ["question about model summary?"])
+        # The new question was retrieved ahead too
+        self.assertEqual(processor._vector_store.batches[-1], ["question about model summary?"])
+
+
+    def test_cancelled_pipeline_leaves_the_processor(self):
+        processor = make_processor(token_count=3)
+        pipeline = DocumentPipeline(processor, FakeOllamaService())
+
+        pipeline.start("model", "azure")
+        pipeline.cancel()
+        time.sleep(DELAY * 2)
+
+        self.assertIsNone(processor.summary)
+        self.assertIsNone(processor.suggested_questions)
+
+
+    def test_batch_summary_is_kept(self):
+        processor = make_processor(token_count=3)
+        processor.summary = "a.pdf: batch summary"
+        processor._pending_index = None
+
+        pipeline = DocumentPipeline(processor, SimpleNamespace(
+            generate_questions=lambda model_name, summary: ["What is in a.pdf?"]
+        ))
+        pipeline.start("model", "azure")
+        pipeline.wait("retrieval")
+
+        self.assertEqual(processor.summary, "a.pdf: batch summary")
+        self.assertEqual(processor.suggested_questions, ["What is in a.pdf?"])
+
+
+class TestBatchUpload(unittest.TestCase):
+
+    def test_files_with_the_same_name_are_kept_apart(self):
+        processor = DocumentProcessor()
+        processor._vector_store = mock.Mock()
+        files = [("report.pdf", "application/pdf", io.BytesIO(b"first")), ("report.pdf", "application/pdf", io.BytesIO(b"second"))]
+        # Completion order, the second file is done first
+        results = [
+            {"index": 1, "file_name": "report.pdf", "text": "second text", "summary": "second", "nb_tokens": 2},
+            {"index": 0, "file_name": "report.pdf", "text": "first text", "summary": "first", "nb_tokens": 3},
+        ]
+        response = mock.MagicMock()
+        response.__enter__.return_value.iter_lines.return_value = [json.dumps(r).encode() for r in results]
+
+        with mock.patch.object(document.requests, "post", return_value=response):
+            list(processor.process_batch(files))
+
+        self.assertEqual(sorted(processor.documents), [0, 1])
+        self.assertEqual(processor.document_text, "# report.pdf\n\nfirst text\n\n# report.pdf\n\nsecond text")
+        self.assertEqual(processor.summary, "report.pdf: first\n\nreport.pdf: second")
+        self.assertEqual(processor.token_count, 5)
+        self.assertEqual(processor._vector_store.add_document.call_count, 2)
+
+
+    def test_file_names_cannot_inject_headers(self):
+        app = FastAPI()
+
+        @app.post("/upload/")
+        async def upload(files: List[UploadFile] = File(...)):
+            return [{"name": f.filename, "type": f.content_type, "content": (await f.read()).decode()} for f in files]
+
+        name = 'a"\r\nContent-Type: text/evil\r\n\r\nb.pdf'
+        body = document.MultipartUpload([("files", name, "application/pdf", io.BytesIO(b"content"))])
+        response = TestClient(app).post("/upload/", content=body.read(), headers={"Content-Type": body.content_type})
+
+        self.assertEqual(response.json(), [{
+            "name": "a%22%0D%0AContent-Type: text/evil%0D%0A%0D%0Ab.pdf",
+            "type": "application/pdf",
+            "content": "content",
+        }])
+
+
+if __name__ == '__main__':
+    unittest.main()
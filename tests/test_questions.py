@@ -0,0 +1,69 @@
+import json
+import sys
+import unittest
+
+from unittest import mock
+
+from backend.helpers import ollama_helper
+
+QUESTIONS = [
+    "What risks were found during the pilot?",
+    "How does the plan address the \"edge\" hardware?",
+    "When is the next milestone?",
+]
+
+
+def token_stream(text):
+    """Ollama-like stream of one chunk per 4 characters, recording how far it was consumed"""
+    token_stream.consumed = 0
+    token_stream.closed = False
+    try:
+        for i in range(0, len(text), 4):
+            token_stream.consumed = i + 4
+            yield {"message": {"content": text[i:i + 4]}, "done": False}
+        yield {"message": {"content": ""}, "done": True}
+    finally:
+        token_stream.closed = True
+
+
+class TestGenerateQuestions(unittest.TestCase):
+
+    def test_parse_questions_only_returns_complete_strings(self):
+        content = json.dumps({"questions": QUESTIONS})
+
+        self.assertEqual(ollama_helper.parse_questions(content), QUESTIONS)
+        self.assertEqual(ollama_helper.parse_questions(content[:content.index("When")]), QUESTIONS[:2])
+        self.assertEqual(ollama_helper.parse_questions('{"questions'), [])
+
+
+    @mock.patch.object(ollama_helper, "test_model_memory", return_value=True)
+    def test_generation_stops_after_the_third_question(self, _):
+        # A model that keeps going after the array, the trailing tokens are never read
+        output = json.dumps({"questions": QUESTIONS}) + " " * 400
+        chat = mock.Mock(return_value=token_stream(output))
+
+        with mock.patch.dict(sys.modules, {"ollama": mock.Mock(chat=chat)}):
+            questions = ollama_helper.generate_questions("llama3.2:1b", "A summary.")
+
+        self.assertEqual(questions, QUESTIONS)
+        self.assertTrue(token_stream.closed)
+        self.assertLess(token_stream.consumed, len(output) - 400)
+        self.assertEqual(chat.call_args.kwargs["format"], ollama_helper.QUESTIONS_SCHEMA)
+
+
+
+    @mock.patch.object(ollama_helper, "test_model_memory", return_value=True)
+    def test_stopping_early_is_not_a_span_error(self, _):
+        output = json.dumps({"questions": QUESTIONS}) + " " * 400
+        chat = mock.Mock(return_value=token_stream(output))
+        chat_span = mock.Mock()
+
+        with mock.patch.dict(sys.modules, {"ollama": mock.Mock(chat=chat)}), \
+                mock.patch.object(ollama_helper, "start_span", return_value=chat_span):
+            ollama_helper.generate_questions("llama3.2:1b", "A summary.")
+
+        chat_span.end.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import time
+import unittest
+import threading
+
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.helpers.scheduler_helper import OllamaScheduler, Priority, SchedulerBusyError, SchedulerCancelledError
+
+
+class TestOllamaScheduler(unittest.TestCase):
+
+    def _queue_behind_busy_slot(self, scheduler, requests):
+        """Hold the only slot, queue the given requests, then release and record grant order"""
+        order = []
+        scheduler.acquire("phi3", Priority.INTERACTIVE, "owner")
+
+        def worker(priority, session_id, label):
+            with scheduler.slot("phi3", priority, session_id):
+                order.append(label)
+
+        threads = []
+        for priority, session_id, label in requests:
+            thread = threading.Thread(target=worker, args=(priority, session_id, label), daemon=True)
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.02)  # Keep the arrival order deterministic
+
+        scheduler.release("phi3")
+        for thread in threads:
+            thread.join(timeout=5)
+        return order
+
+
+    def test_priority_order(self):
+        scheduler = OllamaScheduler(max_concurrency_per_model=1, max_total_concurrency=1)
+        order = self._queue_behind_busy_slot(scheduler, [
+            (Priority.PREFETCH, "a", "prefetch"),
+            (Priority.QUESTIONS, "a", "questions"),
+            (Priority.INTERACTIVE, "a", "answer"),
+        ])
+
+        self.assertEqual(order, ["answer", "questions", "prefetch"])
+
+
+    def test_round_robin_between_sessions(self):
+        scheduler = OllamaScheduler(max_concurrency_per_model=1, max_total_concurrency=1)
+        order = self._queue_behind_busy_slot(scheduler, [
+            (Priority.QUESTIONS, "a", "a1"),
+            (Priority.QUESTIONS, "a", "a2"),
+            (Priority.QUESTIONS, "a", "a3"),
+            (Priority.QUESTIONS, "b", "b1"),
+        ])
+
+        self.assertEqual(order, ["a1", "b1", "a2", "a3"])
+
+
+    def test_waiter_is_woken_when_other_models_have_room(self):
+        # The model limit is reached before the total one, the grant must still wake the waiter
+        scheduler = OllamaScheduler(max_concurrency_per_model=1, max_total_concurrency=2)
+        order = self._queue_behind_busy_slot(scheduler, [
+            (Priority.QUESTIONS, "a", "questions"),
+            (Priority.INTERACTIVE, "b", "answer"),
+        ])
+
+        self.assertEqual(order, ["answer", "questions"])
+
+
+    def test_full_queue_is_rejected(self):
+        scheduler = OllamaScheduler(
+            max_concurrency_per_model=1,
+            max_total_concurrency=1,
+            queue_limits={priority: 0 for priority in Priority}
+        )
+        scheduler.acquire("phi3", Priority.INTERACTIVE)
+
+        with self.assertRaises(SchedulerBusyError) as context:
+            scheduler.acquire("phi3", Priority.PREFETCH)
+        self.assertGreaterEqual(context.exception.retry_after, 1)
+
+
+    def test_cancelled_request_leaves_the_queue(self):
+        scheduler = OllamaScheduler(max_concurrency_per_model=1, max_total_concurrency=1)
+        scheduler.acquire("phi3", Priority.INTERACTIVE, "owner")
+        cancelled = threading.Event()
+        errors = []
+
+        def worker():
+            try:
+                scheduler.acquire("phi3", Priority.INTERACTIVE, "a", cancelled)
+            except SchedulerCancelledError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(scheduler.snapshot()["phi3"]["queued"]["interactive"], 1)
+
+        cancelled.set()
+        thread.join(timeout=5)
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(scheduler.snapshot()["phi3"]["queued"]["interactive"], 0)
+        # The slot freed by the owner is not granted to the cancelled request
+        scheduler.release("phi3")
+        self.assertEqual(scheduler.snapshot()["phi3"]["running"], 0)
+
+
+    def test_request_waiting_past_the_deadline_is_rejected(self):
+        scheduler = OllamaScheduler(max_concurrency_per_model=1, max_total_concurrency=1)
+        scheduler.acquire("phi3", Priority.INTERACTIVE, "owner")
+
+        with self.assertRaises(SchedulerBusyError):
+            scheduler.acquire("phi3", Priority.QUESTIONS, "a", timeout=0.1)
+        self.assertEqual(scheduler.snapshot()["phi3"]["queued"]["questions"], 0)
+
+
+    def test_busy_streamed_answer_is_rejected_with_retry_after(self):
+        scheduler = OllamaScheduler(
+            max_concurrency_per_model=1,
+            max_total_concurrency=1,
+            queue_limits={priority: 0 for priority in Priority}
+        )
+        scheduler.acquire("phi3", Priority.INTERACTIVE)
+
+        with mock.patch.object(main, "ollama_scheduler", scheduler), \
+                mock.patch.object(main, "generate_answer") as generate:
+            response = TestClient(main.app).post("/generate_answer/", json={
+                "question": "What?", "relevant_chunks": ["context"], "model_name": "phi3",
+                "stream": True, "request_id": "busy"
+            })
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        generate.assert_not_called()
+        self.assertFalse(main.cancel_registry.cancel("busy"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import time
+import unittest
+
+from unittest import mock
+
+from backend.helpers import summary_helper
+from backend.helpers.scheduler_helper import OllamaScheduler
+
+
+def fake_summary(model_name, text, kind):
+    time.sleep(0.1)
+    return f"{kind} of {len(text)} chars"
+
+
+def fake_summary_stream(model_name, text, kind):
+    for word in f"{kind} of {len(text)} chars. Written word by word.".split(" "):
+        yield word + " "
+
+
+def collect(text, concurrency=4):
+    return [json.loads(line) for line in summary_helper.summarize_document(text, "llama3.2:1b", concurrency=concurrency)]
+
+
+class TestSummarizeDocument(unittest.TestCase):
+
+    @mock.patch.object(summary_helper, "generate_summary_stream", side_effect=fake_summary_stream)
+    @mock.patch.object(summary_helper, "generate_summary", side_effect=fake_summary)
+    def test_short_document_is_summarized_in_one_call(self, generate, generate_stream):
+        events = collect("A short document. " * 20)
+
+        self.assertEqual([e["event"] for e in events], ["plan", "sentence", "sentence", "summary"])
+        self.assertEqual(generate.call_count, 0)
+        self.assertEqual(generate_stream.call_count, 1)
+        self.assertEqual(generate_stream.call_args.args[2], "document")
+        self.assertEqual(events[1]["text"], "document of 360 chars. ")
+        self.assertEqual(events[-1]["summary"], "document of 360 chars. Written word by word.")
+
+
+    @mock.patch.object(summary_helper, "ollama_scheduler", OllamaScheduler(max_concurrency_per_model=4, max_total_concurrency=4))
+    @mock.patch.object(summary_helper, "LLM_SUMMARY_CHUNK_CHARS", 2000)
+    @mock.patch.object(summary_helper, "generate_summary_stream", side_effect=fake_summary_stream)
+    @mock.patch.object(summary_helper, "generate_summary", side_effect=fake_summary)
+    def test_long_document_is_mapped_concurrently_then_reduced(self, generate, _):
+        text = "\n\n".join(f"Paragraph {i} of a long report. " * 30 for i in range(16))
+
+        start = time.perf_counter()
+        events = collect(text)
+        elapsed = time.perf_counter() - start
+
+        plan = events[0]
+        partials = [e for e in events if e["event"] == "partial" and e["level"] == 0]
+        self.assertGreater(plan["chunks"], 4)
+        self.assertEqual(sorted(e["index"] for e in partials), list(range(plan["chunks"])))
+        self.assertEqual(events[-1]["event"], "summary")
+        self.assertTrue(events[-1]["summary"].startswith("combine"))
+        # Four chunks at a time, not one after another
+        self.assertLess(elapsed, 0.1 * plan["chunks"])
+
+
+    @mock.patch.object(summary_helper, "generate_summary_stream", side_effect=RuntimeError("model not found"))
+    def test_failure_ends_the_stream_with_an_error(self, _):
+        events = collect("A short document.")
+
+        self.assertEqual(events[-1], {"event": "error", "detail": "model not found"})
+
+
+    def test_sentences_are_yielded_as_soon_as_they_end(self):
+        text = 'A first sentence. "A quoted one!" A list:\n- one\n- two\nAn unfinished one'
+
+        for size in (1, 3, 8):
+            pieces = [text[i:i + size] for i in range(0, len(text), size)]
+            sentences = list(summary_helper.split_sentences(pieces))
+
+            self.assertEqual("".join(sentences), text)
+            self.assertEqual(sentences, [
+                "A first sentence. ", '"A quoted one!" ', "A list:\n", "- one\n", "- two\n", "An unfinished one"
+            ])
+
+
+    def test_group_summaries_always_shortens_the_level(self):
+        summaries = ["word " * 2000] * 5
+
+        groups = summary_helper.group_summaries(summaries, max_tokens=2500)
+
+        self.assertLess(len(groups), len(summaries))
+        self.assertTrue(all(len(group) >= 2 for group in groups))
+        self.assertEqual(sum(groups, []), summaries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"))
+
+from aiproviders import tracing as frontend_tracing  # noqa: E402
+from backend.helpers import tracing_helper  # noqa: E402
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def record(name="GET /", service="knowledge-backend", parent_span_id=None, error=None):
+    return {
+        "trace_id": "a" * 32,
+        "span_id": "b" * 16,
+        "parent_span_id": parent_span_id,
+        "name": name,
+        "service": service,
+        "start_time_unix_nano": 1000,
+        "end_time_unix_nano": 3000,
+        "duration_ms": 0.002,
+        "attributes": {"http.status_code": 200, "cached": True, "http.path": "/"},
+        "error": error,
+    }
+
+
+class TestTraceContext(unittest.TestCase):
+
+    def test_parse_traceparent(self):
+        header = f"00-{'a' * 32}-{'b' * 16}-01"
+
+        self.assertEqual(tracing_helper.parse_traceparent(header), ("a" * 32, "b" * 16))
+        self.assertEqual(tracing_helper.parse_traceparent(f" {header} "), ("a" * 32, "b" * 16))
+        self.assertIsNone(tracing_helper.parse_traceparent(None))
+        self.assertIsNone(tracing_helper.parse_traceparent("00-short-span-01"))
+        self.assertIsNone(tracing_helper.parse_traceparent(f"00-{'a' * 32}-01"))
+
+
+    def test_frontend_action_is_continued_by_the_backend(self):
+        exporter = CollectingExporter()
+        backend_exporter = CollectingExporter()
+
+        async def app(scope, receive, send):
+            with tracing_helper.span("ollama.chat"):
+                pass
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            pass
+
+        with mock.patch.object(frontend_tracing, "TRACE_EXPORTER", "jsonl"), \
+                mock.patch.object(frontend_tracing, "_exporter", exporter), \
+                mock.patch.object(tracing_helper, "TRACING_ENABLED", True), \
+                mock.patch.object(tracing_helper, "_exporter", backend_exporter):
+            with frontend_tracing.traced_action("ask_question") as trace_id:
+                headers = frontend_tracing.trace_headers()
+                scope = {
+                    "type": "http", "method": "POST", "path": "/generate_answer/",
+                    "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+                }
+                asyncio.run(tracing_helper.TracingMiddleware(app)(scope, None, send))
+            self.assertEqual(frontend_tracing.trace_headers(), {})
+
+        action = exporter.spans[0]
+        child, root = backend_exporter.spans
+        self.assertEqual(action["trace_id"], trace_id)
+        self.assertEqual(action["name"], "action.ask_question")
+        self.assertEqual((root.trace_id, root.parent_span_id), (trace_id, action["span_id"]))
+        self.assertEqual(root.attributes["user.action"], "ask_question")
+        self.assertEqual(root.attributes["http.status_code"], 200)
+        self.assertEqual((child.trace_id, child.parent_span_id), (trace_id, root.span_id))
+
+
+    def test_spans_nest_and_record_errors(self):
+        exporter = CollectingExporter()
+        with mock.patch.object(tracing_helper, "TRACING_ENABLED", True), \
+                mock.patch.object(tracing_helper, "_exporter", exporter):
+            with tracing_helper.span("outer") as outer:
+                with self.assertRaises(ValueError):
+                    with tracing_helper.span("inner", attempt=1):
+                        raise ValueError("bad chunk")
+                with tracing_helper.span("sibling"):
+                    pass
+            self.assertIsNone(tracing_helper.get_trace_context())
+
+        inner, sibling, exported_outer = exporter.spans
+        self.assertIs(exported_outer, outer)
+        self.assertIsNone(outer.parent_span_id)
+        self.assertEqual({inner.parent_span_id, sibling.parent_span_id}, {outer.span_id})
+        self.assertEqual({inner.trace_id, sibling.trace_id}, {outer.trace_id})
+        self.assertEqual(inner.error, "ValueError: bad chunk")
+        self.assertIsNone(outer.error)
+
+
+    def test_disabled_tracing_exports_nothing(self):
+        exporter = CollectingExporter()
+        with mock.patch.object(tracing_helper, "TRACING_ENABLED", False), \
+                mock.patch.object(tracing_helper, "_exporter", exporter):
+            with tracing_helper.span("ignored") as ignored:
+                ignored.set_attribute("key", "value")
+
+        self.assertIsNone(ignored.context)
+        self.assertEqual(exporter.spans, [])
+
+
+class TestSpanExport(unittest.TestCase):
+
+    def test_otlp_encoding(self):
+        request = tracing_helper.to_otlp([
+            record(),
+            record("action.ask_question", "knowledge-frontend", error="ValueError: bad"),
+            record("ollama.chat", parent_span_id="c" * 16),
+        ])
+
+        services = {
+            resource["resource"]["attributes"][0]["value"]["stringValue"]: resource["scopeSpans"][0]["spans"]
+            for resource in request["resourceSpans"]
+        }
+        root, chat = services["knowledge-backend"]
+        self.assertEqual(root["parentSpanId"], "")
+        self.assertEqual(chat["parentSpanId"], "c" * 16)
+        self.assertEqual((root["startTimeUnixNano"], root["endTimeUnixNano"]), ("1000", "3000"))
+        self.assertEqual(root["attributes"], [
+            {"key": "http.status_code", "value": {"intValue": "200"}},
+            {"key": "cached", "value": {"boolValue": True}},
+            {"key": "http.path", "value": {"stringValue": "/"}},
+        ])
+        self.assertEqual(root["status"], {"code": 1})
+        self.assertEqual(services["knowledge-frontend"][0]["status"], {"code": 2, "message": "ValueError: bad"})
+
+
+    def test_frontend_and_backend_encode_alike(self):
+        spans = [record(), record("action.summarize", "knowledge-frontend", error="Timeout: slow")]
+
+        self.assertEqual(frontend_tracing.to_otlp(spans), tracing_helper.to_otlp(spans))
+
+
+    def test_jsonl_output(self):
+        span = tracing_helper.Span("GET /", {"http.path": "/"})
+        span.end_ns = span.start_ns + 2_000_000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces.jsonl")
+            with mock.patch.object(tracing_helper, "TRACE_EXPORTER", "jsonl"), \
+                    mock.patch.object(tracing_helper, "TRACE_JSONL_PATH", path):
+                tracing_helper._SpanExporter()._write([span, span])
+            with open(path, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["span_id"], span.span_id)
+        self.assertEqual(lines[0]["duration_ms"], 2.0)
+        self.assertEqual(lines[0]["attributes"], {"http.path": "/"})
+
+
+    def test_frontend_action_is_exported_off_the_page_run(self):
+        exporter = frontend_tracing._SpanExporter()
+        posted = threading.Event()
+
+        def slow_post(url, json, timeout):
+            time.sleep(0.3)
+            posted.payload = json
+            posted.set()
+
+        with mock.patch.object(frontend_tracing, "TRACE_EXPORTER", "otlp"), \
+                mock.patch.object(frontend_tracing, "TRACE_FLUSH_INTERVAL", 0.01), \
+                mock.patch.object(frontend_tracing, "_exporter", exporter), \
+                mock.patch.object(frontend_tracing.requests, "post", side_effect=slow_post):
+            start = time.perf_counter()
+            with frontend_tracing.traced_action("upload"):
+                pass
+            elapsed = time.perf_counter() - start
+            self.assertTrue(posted.wait(timeout=5))
+
+        self.assertLess(elapsed, 0.1)
+        span = posted.payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        self.assertEqual(span["name"], "action.upload")
+        self.assertEqual(span["attributes"], [{"key": "user.action", "value": {"stringValue": "upload"}}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from fastapi import FastAPI, UploadFile, File
+from fastapi.testclient import TestClient
+
+from backend.helpers.upload_helper import UploadLimitMiddleware
+
+
+def make_client(max_bytes: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, limits={"/analyze/": max_bytes})
+
+    @app.post("/analyze/")
+    def analyze(file: UploadFile = File(...)):
+        file.file.seek(0, 2)
+        return {"size": file.file.tell()}
+
+    return TestClient(app)
+
+
+class TestUploadLimitMiddleware(unittest.TestCase):
+
+    def test_upload_under_the_limit_is_spooled(self):
+        response = make_client(10_000).post("/analyze/", files={"file": ("a.pdf", b"x" * 5000)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"size": 5000})
+
+
+    def test_declared_length_over_the_limit_is_rejected(self):
+        response = make_client(1000).post("/analyze/", files={"file": ("a.pdf", b"x" * 5000)})
+
+        self.assertEqual(response.status_code, 413)
+
+
+    def test_chunked_body_over_the_limit_is_rejected(self):
+        body = (b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n\r\n"
+                + b"x" * 5000 + b"\r\n--b--\r\n")
+        response = make_client(1000).post(
+            "/analyze/",
+            content=iter([body[:2000], body[2000:]]),
+            headers={"Content-Type": "multipart/form-data; boundary=b"}
+        )
+
+        self.assertEqual(response.status_code, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
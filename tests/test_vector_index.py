@@ -0,0 +1,162 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"))
+
+from aiproviders import vector_store  # noqa: E402
+from aiproviders.vector_index import NumpyIndex  # noqa: E402
+
+
+class TestNumpyIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.standard_normal((500, 64)).astype(np.float32)
+        self.queries = rng.standard_normal((20, 64)).astype(np.float32)
+        self.documents = [f"chunk {i}" for i in range(500)]
+
+    def _exact(self, k):
+        vectors = self.embeddings / np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+        scores = self.queries @ vectors.T
+        return [[self.documents[i] for i in np.argsort(-row)[:k]] for row in scores]
+
+
+    def test_matches_brute_force(self):
+        index = NumpyIndex()
+        index.add([str(i) for i in range(500)], self.embeddings.tolist(), self.documents)
+
+        self.assertEqual(index.query(self.queries.tolist(), k=5), self._exact(5))
+
+
+    def test_float16_keeps_top_result(self):
+        index = NumpyIndex("float16")
+        index.add([str(i) for i in range(500)], self.embeddings.tolist(), self.documents)
+
+        results = index.query(self.queries.tolist(), k=5)
+        self.assertEqual([r[0] for r in results], [r[0] for r in self._exact(5)])
+        self.assertEqual(index.memory_bytes(), 500 * 64 * 2)
+
+
+    def test_int8_mostly_keeps_top_result(self):
+        index = NumpyIndex("int8")
+        index.add([str(i) for i in range(500)], self.embeddings.tolist(), self.documents)
+
+        results = index.query(self.queries.tolist(), k=5)
+        # Quantization may swap near ties, but not often
+        agreement = np.mean([r[0] == e[0] for r, e in zip(results, self._exact(5))])
+        self.assertGreaterEqual(agreement, 0.9)
+        self.assertEqual(index.memory_bytes(), 500 * 64 + 500 * 4)
+
+
+    def test_rerank_restores_full_precision_order(self):
+        index = NumpyIndex("int8", dimensions=16, rerank_candidates=500)
+        index.add([str(i) for i in range(500)], self.embeddings.tolist(), self.documents)
+
+        # With every chunk as a candidate the rerank is an exact search
+        self.assertEqual(index.query(self.queries.tolist(), k=5), self._exact(5))
+        self.assertEqual(len(index.get()["embeddings"][0]), 64)
+        path = index._full_path
+        index.clear()
+        self.assertFalse(os.path.exists(path))
+
+
+    def test_k_larger_than_index(self):
+        index = NumpyIndex()
+        index.add(["a", "b"], [[1.0, 0.0], [0.0, 1.0]], ["first", "second"])
+
+        self.assertEqual(index.query([[0.1, 1.0]], k=5), [["second", "first"]])
+        self.assertEqual(NumpyIndex().query([[0.1, 1.0]], k=5), [[]])
+
+
+    def test_delete_keeps_the_other_chunks_searchable(self):
+        rng = np.random.default_rng(3)
+        embeddings = rng.standard_normal((50, 32)).astype(np.float32)
+        index = NumpyIndex("int8", rerank_candidates=10)
+        index.add([str(i) for i in range(50)], embeddings.tolist(), [f"chunk {i}" for i in range(50)])
+
+        index.delete([str(i) for i in range(0, 50, 2)])
+
+        self.assertEqual(index.count(), 25)
+        self.assertEqual(index.full.shape, (25, 32))
+        self.assertEqual(index.query([embeddings[7].tolist()], k=1), [["chunk 7"]])
+        index.clear()
+
+
+    def test_adding_an_id_again_replaces_its_chunk(self):
+        rng = np.random.default_rng(4)
+        embeddings = rng.standard_normal((10, 32)).astype(np.float32)
+        index = NumpyIndex("int8", rerank_candidates=5)
+        index.add([str(i) for i in range(5)], embeddings[:5].tolist(), [f"chunk {i}" for i in range(5)])
+
+        # Ids 3 and 4 come back with new vectors, 5 and 6 are new
+        index.add([str(i) for i in range(3, 7)], embeddings[5:9].tolist(), [f"new chunk {i}" for i in range(3, 7)])
+
+        self.assertEqual(index.count(), 7)
+        self.assertEqual(index.full.shape, (7, 32))
+        self.assertEqual(index.get_ids(), [str(i) for i in range(7)])
+        self.assertEqual(index.query([embeddings[5].tolist()], k=1), [["new chunk 3"]])
+        self.assertEqual(index.query([embeddings[8].tolist()], k=1), [["new chunk 6"]])
+        self.assertNotIn("chunk 4", index.query([embeddings[4].tolist()], k=7)[0])
+        index.clear()
+
+
+class TestVectorStoreBackend(unittest.TestCase):
+
+    def test_auto_backend_moves_to_chroma_above_threshold(self):
+        store = vector_store.VectorStore(backend="auto")
+        store.delete_all()
+        rng = np.random.default_rng(1)
+        embeddings = rng.standard_normal((6, 8)).tolist()
+        chunks = [f"chunk {i}" for i in range(6)]
+
+        with mock.patch.object(vector_store, "NUMPY_MAX_CHUNKS", 4):
+            store._add([str(i) for i in range(3)], embeddings[:3], chunks[:3], [{"source": "a"}] * 3)
+            self.assertIs(store.index, store.numpy_index)
+
+            store._add([str(i) for i in range(3, 6)], embeddings[3:], chunks[3:], [{"source": "a"}] * 3)
+            self.assertIs(store.index, store.chroma_index)
+            self.assertEqual(store.index.count(), 6)
+            self.assertEqual(store.index.query([embeddings[4]], k=1), [["chunk 4"]])
+
+        store.delete_all()
+        self.assertIs(store.index, store.numpy_index)
+
+
+    def test_chroma_is_only_created_when_needed(self):
+        store = vector_store.VectorStore(backend="auto")
+        store._add(["0"], [[1.0, 0.0]], ["chunk"], [{}])
+        store.delete_all()
+
+        self.assertIsNone(store._chroma_index)
+
+
+class TestIncrementalSync(unittest.TestCase):
+
+    def test_revision_only_embeds_changed_chunks(self):
+        store = vector_store.VectorStore(backend="numpy")
+        embedded = []
+
+        def embed(texts):
+            embedded.append(len(texts))
+            return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+
+        paragraphs = [f"Paragraph {i} " + "about the quarterly report " * 15 for i in range(20)]
+        with mock.patch.object(store, "embed", side_effect=embed):
+            store.sync_document("\n\n".join(paragraphs))
+            paragraphs[10] = "A rewritten paragraph about something else entirely."
+            sync = store.sync_document("\n\n".join(paragraphs))
+
+        # The short rewritten paragraph can merge with its neighbor, nothing further is touched
+        self.assertEqual(embedded[1], sync["added"])
+        self.assertLessEqual(sync["added"], 2)
+        self.assertLessEqual(sync["removed"], 2)
+        self.assertGreaterEqual(sync["kept"], 18)
+        self.assertEqual(store.index.count(), sync["added"] + sync["kept"])
+
+
+if __name__ == '__main__':
+    unittest.main()